@@ -61,6 +61,11 @@ module.exports = {
             .setName('preserve_relevance')
             .setDescription('Keep relevance-based sorting when using other filters')
         )
+        .addBooleanOption(option =>
+          option
+            .setName('all_variants')
+            .setDescription('List every region, revision and prototype instead of one entry per game')
+        )
         .addStringOption(opt =>
           opt
             .setName('mapper')
@@ -171,6 +176,7 @@ module.exports = {
             '• `rumble` - Filter by rumble\n' +
             '• `sort_by` - Sort results by relevance, title, year, or region (search only)\n' +
             '• `preserve_relevance` - Keep relevance-based sorting when using other filters (search only)\n' +
+            '• `all_variants` - List every region, revision and prototype of a game instead of the preferred one (search only)\n' +
             '• `mapper` - Filter by cartridge mapper\n\n' +
             '**Features:**\n' +
             '• Automatic box art thumbnails from libretro-thumbnails\n' +
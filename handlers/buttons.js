@@ -7,7 +7,15 @@ const {
   Constants: { InteractionResponseFlags },
 } = require('discord.js');
 const { extractBaseTitle } = require('../loadRomData');
-const { activeSearches, collectors, updateResultsPage, createRomEmbed } = require('./search');
+const { cleanTitle } = require('../utils/titles');
+const {
+  activeSearches,
+  collectors,
+  updateResultsPage,
+  createRomEmbed,
+  addVariantsButton,
+  getVariants,
+} = require('./search');
 
 /**
  * Handle button interactions
@@ -101,6 +109,18 @@ async function handleButtonInteraction(interaction) {
     return;
   }
 
+  // Handle other versions button: list every variant of the game shown
+  if (buttonId === 'show_variants') {
+    const rom = search.selected;
+    if (rom) {
+      search.results = getVariants(rom);
+      search.currentPage = 1;
+      search.query = rom.displayTitle ?? cleanTitle(extractBaseTitle(rom.filename));
+      await updateResultsPage(interaction, search, search.query);
+    }
+    return;
+  }
+
   // Handle game selection
   if (buttonId.startsWith('select_')) {
     const index = parseInt(buttonId.split('_')[1]) - 1;
@@ -108,6 +128,7 @@ async function handleButtonInteraction(interaction) {
     const selectedRom = search.results[startIdx + index];
 
     if (selectedRom) {
+      search.selected = selectedRom;
       const embed = await createRomEmbed(selectedRom);
 
       // Ensure embed has at least one base field
@@ -130,6 +151,7 @@ async function handleButtonInteraction(interaction) {
           .setLabel('Back to Results')
           .setStyle(ButtonStyle.Secondary)
       );
+      addVariantsButton(buttonRow, selectedRom);
 
       await interaction.update({
         embeds: [embed],
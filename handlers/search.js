@@ -7,13 +7,23 @@ const {
   ButtonStyle,
   MessageFlags,
 } = require('discord.js');
-const { normalizeString, extractBaseTitle, loadRomData } = require('../loadRomData');
+const {
+  normalizeString,
+  extractBaseTitle,
+  loadRomData,
+  refreshRomData,
+  FUSE_OPTIONS,
+} = require('../loadRomData');
 // Import the regions module
-const { pickRegionEmoji } = require('../utils/regions');
+const { pickRegionEmoji, flagMap } = require('../utils/regions');
+const { cleanTitle, getDisplayRegion } = require('../utils/titles');
+const { parseServiceAddress, querySearchService } = require('../utils/searchService');
+const { startUpdateSocket } = require('../utils/updateSocket');
+const fs = require('fs');
 const path = require('path');
 const fetch = require('node-fetch');
 
-// Constants for box art URLs
+// Constants for box art URLs (keep in step with THUMBNAIL_REPOSITORIES in fetch_gb_roms.py)
 const GB_SHA = '9db991096041e2c3476556cb6bd0810cdf1b5a93';
 const GBC_SHA = '2c54e12ed7d9acd3124497bf5a9b107ab69d0d41';
 const GB_BASE_URL = `https://raw.githubusercontent.com/libretro-thumbnails/Nintendo_-_Game_Boy/${GB_SHA}/Named_Boxarts`;
@@ -24,7 +34,16 @@ const SEARCH_EXPIRATION_TIME = 70000; // 70 seconds
 const CACHE_EXPIRATION_TIME = 10 * 60 * 1000; // 10 minutes
 const GAMES_PER_PAGE = 4; // Maximum games per page (Discord allows max 5 action rows)
 const CLEANUP_INTERVAL = 90000; // Run cleanup every 90 seconds
+const ROM_WATCH_INTERVAL = 5000; // Check rom-list.json for updates every 5 seconds
 const DEBUG = true; // Set to true to enable debug logging
+const SEARCH_SERVICE_LIMIT = 100; // Results asked of the search service
+
+// Optional scripts/rom_search.py service ("http://host:port" or "unix:/path/to/socket")
+const searchService = parseServiceAddress(process.env.ROM_SEARCH_SERVICE);
+
+// Optional Unix socket fetch_gb_roms.py --notify announces new databases on
+const updateSocketPath = process.env.ROM_UPDATE_SOCKET;
+let updateSocket = null;
 
 // Global collections for search state
 const activeSearches = new Collection();
@@ -34,52 +53,8 @@ const queryCache = new Map();
 // Initialize ROM data
 let roms = [];
 let fuseIndex = null;
-
-// Region tokens for parsing
-const REGION_TOKENS = [
-  'usa',
-  'europe',
-  'japan',
-  'australia',
-  'spain',
-  'france',
-  'germany',
-  'uk',
-  'italy',
-  'taiwan',
-  'korea',
-  'china',
-  'brazil',
-  'sweden',
-  'netherlands',
-  'belgium',
-  'denmark',
-  'finland',
-  'norway',
-  'portugal',
-  'russia',
-  'poland',
-  'czech',
-  'hungary',
-  'greece',
-  'turkey',
-  'israel',
-  'south africa',
-  'mexico',
-  'canada',
-  'world',
-];
-
-// SGB tokens for parsing
-const SGB_TOKENS = ['sgb enhanced', 'super game boy', 'sgb'];
-
-// Allowed parenthetical content patterns
-const ALLOWED_PARENS = [
-  /^rev\b/i, // e.g. "Rev 2" or "Revision 2"
-  /^v\d+(\.\d+)*$/i, // e.g. "v1.1", "v2"
-  /^prototype$/i,
-  /^beta$/i, // if desired
-];
+let romData = null;
+const romListPath = path.join(__dirname, '..', 'rom-list.json');
 
 // Truncate labels to Discord's 80-char limit
 function truncateLabel(label) {
@@ -88,62 +63,81 @@ function truncateLabel(label) {
 }
 
 /**
- * Extract region tokens from a filename
- * @param {string} filename - The filename to parse
- * @returns {string[]} Array of region tokens found
+ * Every variant of a ROM's game, best first
+ * @param {Object} rom - The ROM object
+ * @param {Object} [data] - Loaded ROM data, the current data by default
+ * @returns {Object[]} The game's variants, or just the ROM for databases without clusters
  */
-function extractRegionTokens(filename) {
-  const matches = filename.match(/\(([^)]+)\)/g) || [];
-  return matches
-    .map(match => match.slice(1, -1).toLowerCase())
-    .flatMap(region => region.split(/[,/]/).map(r => r.trim()))
-    .filter(token => REGION_TOKENS.includes(token));
+function getVariants(rom, data = romData) {
+  const variants = rom.clusterId !== undefined && data && data.variants.get(rom.clusterId);
+  return variants || [rom];
 }
 
 /**
- * Clean title by removing region, SGB, and other non-essential tags
- * @param {string} title - The title to clean
- * @returns {string} Cleaned title
+ * Keep the first ROM listed for each game
+ * @param {Object[]} results - ROMs with each game's variants listed best first
+ * @returns {Object[]} One ROM per game
  */
-function cleanTitle(title) {
-  // Find all parenthetical expressions
-  const matches = title.match(/\(([^)]+)\)/g) || [];
-
-  // Filter out region-only and SGB-only parentheses
-  const nonRemovableMatches = matches.filter(match => {
-    const content = match.slice(1, -1).toLowerCase().trim();
-    const tokens = content.split(/[,/]/).map(t => t.trim());
-
-    // Keep if it's not a region-only tag
-    const isRegionOnly = tokens.every(token => REGION_TOKENS.includes(token));
-    if (!isRegionOnly) {
-      // Keep if it's not an SGB tag
-      const isSGBTag = SGB_TOKENS.includes(content);
-      if (!isSGBTag) {
-        return true;
-      }
-    }
-    return false;
+function oneVariantPerGame(results) {
+  const seen = new Set();
+  return results.filter(rom => {
+    if (rom.clusterId === undefined) return true;
+    if (seen.has(rom.clusterId)) return false;
+    seen.add(rom.clusterId);
+    return true;
   });
+}
 
-  // Replace removable parentheses with empty string
-  let cleaned = title;
-  matches.forEach(match => {
-    if (!nonRemovableMatches.includes(match)) {
-      cleaned = cleaned.replace(match, '').trim();
+/**
+ * Search the loaded ROMs, through the search service when ROM_SEARCH_SERVICE is set
+ *
+ * Fuse.js only indexes the preferred variant of each game; every match is
+ * expanded to all of its game's variants, best first, so filters can pick
+ * the variant that fits. Service results are cut at Fuse.js's threshold.
+ * Falls back to Fuse.js when the service can't be reached, finds nothing
+ * within that threshold (it only matches on shared trigrams, so it misses
+ * typos such as "tetirs"), or has indexed a different rom-list.json than the
+ * one loaded here.
+ * @param {string} query - Search text
+ * @param {Object} filters - Filter options, passed on to the service
+ * @returns {Promise<Object[]>} Matching ROMs with their game's score, lower is better
+ */
+async function searchRoms(query, filters) {
+  const data = romData;
+  let matches = null;
+  if (searchService && data) {
+    try {
+      const response = await querySearchService(searchService, query, filters, SEARCH_SERVICE_LIMIT);
+      if (response.sha256 === data.sha256) {
+        matches = response.results
+          .filter(result => result.score <= FUSE_OPTIONS.threshold)
+          .map(result => ({ rom: data.roms[result.row], score: result.score }));
+        if (matches.length === 0) {
+          if (DEBUG) console.log('Search service found nothing, trying Fuse.js');
+          matches = null;
+        }
+      } else if (DEBUG) {
+        console.log('Search service has a different rom-list.json loaded, using Fuse.js');
+      }
+    } catch (error) {
+      console.error('Search service unavailable, using Fuse.js:', error.message);
     }
-  });
+  }
 
-  // Strip any remaining trailing non-essential parentheses
-  let t = cleaned;
-  while (/\s*\(([^)]+)\)\s*$/.test(t)) {
-    const inside = t.match(/\s*\(([^)]+)\)\s*$/)[1].trim();
-    if (ALLOWED_PARENS.some(rx => rx.test(inside))) break;
-    t = t.replace(/\s*\(([^)]+)\)\s*$/, '').trim();
+  if (matches === null) {
+    matches = fuseIndex.search(query).map(result => ({ rom: result.item, score: result.score }));
   }
-  cleaned = t;
 
-  return cleaned;
+  // The service searches every variant, so a game can match more than once
+  const seen = new Set();
+  return matches.flatMap(({ rom, score }) => {
+    if (rom.clusterId !== undefined) {
+      if (seen.has(rom.clusterId)) return [];
+      seen.add(rom.clusterId);
+    }
+    // Preserve the relevance score
+    return getVariants(rom, data).map(variant => ({ ...variant, score }));
+  });
 }
 
 /**
@@ -152,12 +146,10 @@ function cleanTitle(title) {
  * @returns {Promise<EmbedBuilder>} Discord embed with ROM details
  */
 async function createRomEmbed(rom) {
-  // Extract the base title and clean it
-  const baseTitle = extractBaseTitle(rom.filename);
-  const cleanedTitle = cleanTitle(baseTitle);
-
-  // Use the pickRegionEmoji function
-  const regionEmoji = pickRegionEmoji(rom.filename, rom.region);
+  // fetch_gb_roms.py parses the filename when it builds the database; only
+  // records from older databases are parsed here
+  const cleanedTitle = rom.displayTitle ?? cleanTitle(extractBaseTitle(rom.filename));
+  const regionEmoji = rom.regionFlag ? flagMap[rom.regionFlag] : pickRegionEmoji(rom.filename, rom.region);
 
   // Create the title with emoji and ensure periods are followed by zero-width spaces
   const titleWithEmoji = `${regionEmoji}   ${cleanedTitle.replace(/\./g, '.' + String.fromCharCode(8203))}`;
@@ -168,8 +160,11 @@ async function createRomEmbed(rom) {
     .setDescription(`ROM Title: ${rom.title || 'Unknown'}\nFilename: ${rom.filename || 'Unknown'}`)
     .setTimestamp();
 
-  // Add thumbnail if available
-  if (rom.rom_filename) {
+  // Add thumbnail if available; databases built with --thumbnails have it
+  // resolved already (null when there is none), older ones are probed here
+  if ('thumbnail' in rom) {
+    if (rom.thumbnail) embed.setThumbnail(rom.thumbnail);
+  } else if (rom.rom_filename) {
     const isCGB = /cgb/i.test(rom.cgbFlag);
     const baseURL = isCGB ? GBC_BASE_URL : GB_BASE_URL;
     const pngName = rom.rom_filename.replace(/\.(gb|gbc)$/i, '.png');
@@ -186,13 +181,7 @@ async function createRomEmbed(rom) {
   }
 
   // Handle region display
-  let displayRegion = rom.region;
-  if (rom.region.toLowerCase() === 'non-japanese') {
-    const tokens = extractRegionTokens(rom.filename);
-    if (tokens.length > 0) {
-      displayRegion = tokens.join(', ').toUpperCase();
-    }
-  }
+  const displayRegion = 'displayRegion' in rom ? rom.displayRegion : getDisplayRegion(rom);
 
   // Add ROM details in specified order
   if (displayRegion) {
@@ -232,9 +221,32 @@ async function createRomEmbed(rom) {
     embed.addFields({ name: 'Year', value: rom.year, inline: true });
   }
 
+  const versions = getVariants(rom).length;
+  if (versions > 1) {
+    embed.addFields({ name: 'Versions', value: String(versions), inline: true });
+  }
+
   return embed;
 }
 
+/**
+ * Add a button that lists the other versions of a ROM's game, when it has any
+ * @param {ActionRowBuilder} row - Buttons shown under the ROM's embed
+ * @param {Object} rom - The ROM object
+ * @returns {ActionRowBuilder} The row
+ */
+function addVariantsButton(row, rom) {
+  if (getVariants(rom).length > 1) {
+    row.addComponents(
+      new ButtonBuilder()
+        .setCustomId('show_variants')
+        .setLabel('Other Versions')
+        .setStyle(ButtonStyle.Secondary)
+    );
+  }
+  return row;
+}
+
 /**
  * Update the results page for a paginated search
  * @param {Object} interaction - Discord interaction
@@ -373,12 +385,18 @@ async function handleGameBoyBotSearch(interaction) {
     const rumble = interaction.options.getBoolean('rumble');
     const sortBy = interaction.options.getString('sort_by') || 'relevance';
     const preserveRelevance = interaction.options.getBoolean('preserve_relevance') ?? true;
-
-    // Get results from Fuse.js
-    let results = fuseIndex.search(rawQuery).map(result => ({
-      ...result.item,
-      score: result.score, // Preserve the relevance score
-    }));
+    const allVariants = interaction.options.getBoolean('all_variants') ?? false;
+
+    // Get results from the search service or Fuse.js; the filters below still apply
+    let results = await searchRoms(rawQuery, {
+      region,
+      cgb,
+      sgb,
+      battery,
+      timer,
+      rumble,
+      mapper: interaction.options.getString('mapper'),
+    });
 
     // Apply region filter if specified
     if (region !== 'any') {
@@ -470,6 +488,11 @@ async function handleGameBoyBotSearch(interaction) {
       });
     }
 
+    // One entry per game: its best variant that passed the filters
+    if (!allVariants) {
+      results = oneVariantPerGame(results);
+    }
+
     // Sorting
     if (sortBy === 'relevance' && preserveRelevance) {
       // Keep Fuse.js relevance sorting
@@ -494,12 +517,14 @@ async function handleGameBoyBotSearch(interaction) {
           .setLabel('Back to Results')
           .setStyle(ButtonStyle.Secondary)
       );
+      addVariantsButton(buttonRow, results[0]);
 
       // Store the search state even for single results
       const search = {
         results,
         currentPage: 1,
         query: rawQuery,
+        selected: results[0],
         timestamp: Date.now(),
       };
       activeSearches.set(interaction.user.id, search);
@@ -556,8 +581,9 @@ async function handleRandomGame(interaction) {
       return;
     }
 
-    // Filter roms using the same logic as handleGameBoyBotSearch
-    let filtered = roms.slice();
+    // Filter roms using the same logic as handleGameBoyBotSearch, each
+    // game's variants best first so the pick below is per game
+    let filtered = romData.games.flatMap(game => getVariants(game));
     // Region filter
     if (region !== 'any') {
       filtered = filtered.filter(r => {
@@ -634,6 +660,8 @@ async function handleRandomGame(interaction) {
       });
     }
 
+    filtered = oneVariantPerGame(filtered);
+
     if (filtered.length === 0) {
       await interaction.reply({
         content: 'No games match those filters!',
@@ -652,13 +680,14 @@ async function handleRandomGame(interaction) {
       .setLabel('Share to Channel')
       .setStyle(ButtonStyle.Primary);
 
-    const row = new ActionRowBuilder().addComponents(shareButton);
+    const row = addVariantsButton(new ActionRowBuilder().addComponents(shareButton), randomRom);
 
     // Store search state for random game
     const search = {
       results: [randomRom],
       currentPage: 1,
       query: 'random',
+      selected: randomRom,
       timestamp: Date.now(),
     };
     activeSearches.set(interaction.user.id, search);
@@ -687,12 +716,17 @@ function startCleanupInterval() {
     // Initialize ROM data when starting
     const result = loadRomData();
     if (result.success) {
-      roms = result.roms;
-      fuseIndex = result.fuseIndex;
+      useRomData(result);
       console.log('Game Boy ROM data loaded successfully!');
     } else {
       console.error('Failed to initialize ROM data. Search functionality will be limited.');
     }
+
+    // Pick up database updates (npm run update-roms) without a restart, and
+    // at once when fetch_gb_roms.py --notify sends SIGUSR2 or uses the socket
+    fs.watchFile(romListPath, { interval: ROM_WATCH_INTERVAL }, reloadRomData);
+    if (process.platform !== 'win32') process.on('SIGUSR2', refreshRoms);
+    if (updateSocketPath) updateSocket = startUpdateSocket(updateSocketPath, refreshRoms);
   }
 }
 
@@ -700,15 +734,49 @@ function stopCleanupInterval() {
   if (cleanupIntervalId !== null) {
     clearInterval(cleanupIntervalId);
     cleanupIntervalId = null;
+    fs.unwatchFile(romListPath, reloadRomData);
+    process.removeListener('SIGUSR2', refreshRoms);
+    if (updateSocket) {
+      updateSocket.close();
+      updateSocket = null;
+    }
     console.log('Stopped cleanup interval');
   }
 }
 
+// Swap in new ROM data; searches already running keep the arrays they started with
+function useRomData(result) {
+  romData = result;
+  roms = result.roms;
+  fuseIndex = result.fuseIndex;
+  queryCache.clear();
+}
+
+// Apply the changeset written with the new rom-list.json, or reload it in full
+function refreshRoms() {
+  const result = refreshRomData(romData);
+  if (result === romData) return result;
+  if (result.success) {
+    useRomData(result);
+    console.log('Game Boy ROM data updated.');
+  } else {
+    console.error('Failed to reload ROM data. Keeping the previous data.');
+  }
+  return result;
+}
+
+function reloadRomData(current, previous) {
+  if (current.mtimeMs === previous.mtimeMs || current.nlink === 0) return;
+  refreshRoms();
+}
+
 module.exports = {
   activeSearches,
   collectors,
   queryCache,
   createRomEmbed,
+  addVariantsButton,
+  getVariants,
   updateResultsPage,
   cleanupExpired,
   handleGameBoyBotSearch,
@@ -1,9 +1,60 @@
 // loadRomData.js
 const fs = require('fs');
 const path = require('path');
+const crypto = require('crypto');
 const Fuse = require('fuse.js');
 const { execSync } = require('child_process');
 
+// Compiled database written by scripts/rom_database.py alongside rom-list.json
+const COMPILED_MAGIC = 'GBROMDB1';
+const COMPILED_VERSION = 1;
+const MISSING_STRING = 0xffffffff;
+const MISSING_INT = -0x80000000;
+const MISSING_BOOL = 255;
+
+// Changeset written by fetch_gb_roms.py next to rom-list.json
+const DELTA_VERSION = 1;
+
+// Fuse.js index the bot saves next to rom-list.json, so a restart doesn't rebuild it
+const FUSE_CACHE_FILE = 'rom-list.fuse.json';
+const FUSE_CACHE_VERSION = 1;
+
+// Fuse.js options; a patched index must be built with the same keys
+const FUSE_OPTIONS = {
+  keys: [
+    { name: 'normalizedTitle', weight: 0.8 },
+    // Every title of a game whose variants go by several (scripts/rom_clusters.py)
+    { name: 'clusterTitles', weight: 0.8 },
+    { name: 'filename', weight: 0.5 },
+    { name: 'title', weight: 0.2 },
+    { name: 'region', weight: 0.1 },
+    { name: 'cgbFlag', weight: 0.05 },
+    { name: 'sgbFlag', weight: 0.05 },
+    { name: 'hasTimer', weight: 0.025 },
+    { name: 'hasRumble', weight: 0.025 },
+    { name: 'hasBattery', weight: 0.025 },
+  ],
+  threshold: 0.4, // More permissive fuzzy matching
+  ignoreLocation: true, // Match anywhere in the string
+  minMatchCharLength: 2, // Allow shorter matches
+  includeScore: true,
+  useExtendedSearch: true, // Enable =exact searches
+};
+
+function hashFile(filePath) {
+  return crypto.createHash('sha256').update(fs.readFileSync(filePath)).digest('hex');
+}
+
+// Size and modification time of rom-list.json, to tell whether it changed without reading it
+function sourceStat(filePath) {
+  const stat = fs.statSync(filePath, { bigint: true });
+  return { size: Number(stat.size), mtimeNs: stat.mtimeNs.toString() };
+}
+
+function sameSource(a, b) {
+  return Boolean(a && b) && a.size === b.size && a.mtimeNs === b.mtimeNs;
+}
+
 // Function to normalize strings for better search and caching
 function normalizeString(str) {
   if (!str) return '';
@@ -65,6 +116,160 @@ function normalizeGameTitle(title) {
   );
 }
 
+// Extract and normalize the base title used for searching
+function addNormalizedTitle(rom) {
+  const baseTitle = extractBaseTitle(rom.filename);
+  rom.normalizedTitle = normalizeGameTitle(baseTitle);
+  return rom;
+}
+
+// Whether a ROM is the variant searched for its game; fetch_gb_roms.py ranks
+// each game's variants (scripts/rom_clusters.py), older databases don't
+function isPreferredVariant(rom) {
+  return rom.variantRank === undefined || rom.variantRank === 0;
+}
+
+/**
+ * Group ROM entries into games by clusterId
+ * @param {Object[]} roms - ROM entries
+ * @returns {{games: Object[], variants: Map<string, Object[]>}} The preferred variant of every
+ *   game, in database order, and each game's variants by clusterId, best first
+ */
+function groupVariants(roms) {
+  const games = roms.filter(isPreferredVariant);
+  const variants = new Map();
+  roms.forEach(rom => {
+    if (rom.clusterId === undefined) return;
+    if (!variants.has(rom.clusterId)) variants.set(rom.clusterId, []);
+    variants.get(rom.clusterId).push(rom);
+  });
+  variants.forEach(list => list.sort((a, b) => a.variantRank - b.variantRank));
+  return { games, variants };
+}
+
+/**
+ * Decode ROM entries from the compiled database (rom-list.bin)
+ *
+ * rom-list.json is only read and hashed when its size or mtime differs from
+ * the ones recorded at compile time, e.g. after a copy or checkout.
+ * @param {string} compiledPath - Path to the compiled database
+ * @param {string} romListPath - Path to rom-list.json, used to detect a stale database
+ * @returns {{roms: Object[], sha256: string}|null} ROM entries with normalizedTitle set and the
+ *   SHA-256 of rom-list.json, or null to fall back to JSON
+ */
+function loadCompiledRoms(compiledPath, romListPath) {
+  if (!fs.existsSync(compiledPath)) return null;
+
+  const buf = fs.readFileSync(compiledPath);
+  if (buf.toString('latin1', 0, 8) !== COMPILED_MAGIC) return null;
+
+  const headerLength = buf.readUInt32LE(8);
+  const header = JSON.parse(buf.toString('utf8', 12, 12 + headerLength));
+  if (header.version !== COMPILED_VERSION) return null;
+
+  // Only trust the compiled database if it was built from this exact rom-list.json
+  const source = header.source || {};
+  const fresh =
+    sameSource(source, sourceStat(romListPath)) ||
+    (Boolean(source.sha256) && hashFile(romListPath) === source.sha256);
+  if (!fresh) {
+    console.log('Compiled ROM database is out of date, falling back to rom-list.json');
+    return null;
+  }
+
+  // Strings are decoded on demand; the table also holds index keys the bot doesn't need
+  const stringsOffset = header.strings.offset;
+  const stringsBase = stringsOffset + 4 * (header.strings.count + 1);
+  const strings = new Array(header.strings.count);
+  const getString = id => {
+    if (strings[id] === undefined) {
+      const start = stringsBase + buf.readUInt32LE(stringsOffset + 4 * id);
+      const end = stringsBase + buf.readUInt32LE(stringsOffset + 4 * (id + 1));
+      strings[id] = buf.toString('utf8', start, end);
+    }
+    return strings[id];
+  };
+
+  const readValue = (column, row) => {
+    if (column.type === 'bool') {
+      const value = buf[column.offset + row];
+      return value === MISSING_BOOL ? undefined : value === 1;
+    }
+    if (column.type === 'int') {
+      const value = buf.readInt32LE(column.offset + 4 * row);
+      return value === MISSING_INT ? undefined : value;
+    }
+    const id = buf.readUInt32LE(column.offset + 4 * row);
+    if (id === MISSING_STRING) return undefined;
+    return column.type === 'json' ? JSON.parse(getString(id)) : getString(id);
+  };
+
+  const recordColumns = header.columns.filter(column => !column.derived);
+  const normalizedColumn = header.columns.find(column => column.name === 'normalizedTitle');
+  // baseTitle is also a record field in databases fetch_gb_roms.py parses filenames for
+  const baseTitleColumn = header.columns.find(column => column.name === 'baseTitle');
+
+  const roms = new Array(header.count);
+  for (let row = 0; row < header.count; row++) {
+    const rom = {};
+    for (const column of recordColumns) {
+      const value = readValue(column, row);
+      if (value !== undefined) rom[column.name] = value;
+    }
+    if (rom.baseTitle === undefined) rom.baseTitle = readValue(baseTitleColumn, row);
+    rom.normalizedTitle = readValue(normalizedColumn, row);
+    roms[row] = rom;
+  }
+
+  return { roms, sha256: source.sha256 };
+}
+
+/**
+ * Create the Fuse.js search over games, reusing the index saved for this rom-list.json
+ * @param {Object[]} games - The ROM entries to index
+ * @param {string} sha256 - SHA-256 of the rom-list.json the games come from
+ * @returns {Fuse} The search
+ */
+function createFuseIndex(games, sha256) {
+  const cachePath = path.join(__dirname, FUSE_CACHE_FILE);
+  try {
+    if (fs.existsSync(cachePath)) {
+      const cache = JSON.parse(fs.readFileSync(cachePath, 'utf8'));
+      if (
+        cache.version === FUSE_CACHE_VERSION &&
+        cache.sha256 === sha256 &&
+        JSON.stringify(cache.keys) === JSON.stringify(FUSE_OPTIONS.keys) &&
+        cache.index.records.length === games.length
+      ) {
+        return new Fuse(games, FUSE_OPTIONS, Fuse.parseIndex(cache.index));
+      }
+    }
+  } catch (error) {
+    console.error('Error reading the saved search index, rebuilding it:', error);
+  }
+
+  const fuseIndex = new Fuse(games, FUSE_OPTIONS);
+  saveFuseIndex(fuseIndex, sha256);
+  return fuseIndex;
+}
+
+// Save a Fuse.js index for the next start; a failure only costs that start a rebuild
+function saveFuseIndex(fuseIndex, sha256) {
+  const cachePath = path.join(__dirname, FUSE_CACHE_FILE);
+  const cache = {
+    version: FUSE_CACHE_VERSION,
+    sha256,
+    keys: FUSE_OPTIONS.keys,
+    index: fuseIndex.getIndex().toJSON(),
+  };
+  try {
+    fs.writeFileSync(`${cachePath}.tmp`, JSON.stringify(cache));
+    fs.renameSync(`${cachePath}.tmp`, cachePath);
+  } catch (error) {
+    console.error('Could not save the search index:', error.message);
+  }
+}
+
 // Load ROM data and create search index
 function loadRomData() {
   try {
@@ -77,7 +282,7 @@ function loadRomData() {
       console.log('rom-list.json not found. Generating via fetch_gb_roms.py...');
       try {
         const scriptPath = path.join(__dirname, 'scripts', 'fetch_gb_roms.py');
-        execSync(`python3 "${scriptPath}"`, {
+        execSync(`python3 "${scriptPath}" --compile`, {
           stdio: 'inherit',
           cwd: __dirname, // Run from project root to ensure correct paths
         });
@@ -88,15 +293,30 @@ function loadRomData() {
       }
     }
 
-    // Read ROM list from JSON file
-    const rawData = fs.readFileSync(romListPath);
+    const source = sourceStat(romListPath);
 
-    let roms;
+    // Prefer the compiled database, which already carries the normalized titles
+    let compiled = null;
     try {
-      roms = JSON.parse(rawData);
-    } catch (parseError) {
-      console.error('Error parsing ROM data JSON:', parseError);
-      return { success: false };
+      compiled = loadCompiledRoms(path.join(__dirname, 'rom-list.bin'), romListPath);
+    } catch (compiledError) {
+      console.error('Error reading compiled ROM database, falling back to JSON:', compiledError);
+    }
+    const fromCompiled = compiled !== null;
+
+    // Remember which rom-list.json this is, so a changeset can be applied on top
+    let roms, sha256;
+    if (fromCompiled) {
+      ({ roms, sha256 } = compiled);
+    } else {
+      const rawData = fs.readFileSync(romListPath);
+      sha256 = crypto.createHash('sha256').update(rawData).digest('hex');
+      try {
+        roms = JSON.parse(rawData);
+      } catch (parseError) {
+        console.error('Error parsing ROM data JSON:', parseError);
+        return { success: false };
+      }
     }
 
     if (!Array.isArray(roms)) {
@@ -106,47 +326,175 @@ function loadRomData() {
 
     console.log(`Successfully loaded ${roms.length} ROM entries`);
 
-    // Configure Fuse.js for fuzzy searching
-    const fuseOptions = {
-      keys: [
-        { name: 'normalizedTitle', weight: 0.8 },
-        { name: 'filename', weight: 0.5 },
-        { name: 'title', weight: 0.2 },
-        { name: 'region', weight: 0.1 },
-        { name: 'cgbFlag', weight: 0.05 },
-        { name: 'sgbFlag', weight: 0.05 },
-        { name: 'hasTimer', weight: 0.025 },
-        { name: 'hasRumble', weight: 0.025 },
-        { name: 'hasBattery', weight: 0.025 },
-      ],
-      threshold: 0.4, // More permissive fuzzy matching
-      ignoreLocation: true, // Match anywhere in the string
-      minMatchCharLength: 2, // Allow shorter matches
-      includeScore: true,
-      useExtendedSearch: true, // Enable =exact searches
-    };
-
-    // Create normalized titles for each ROM
-    roms.forEach(rom => {
-      // Extract and normalize the base title
-      const baseTitle = extractBaseTitle(rom.filename);
-      rom.normalizedTitle = normalizeGameTitle(baseTitle);
-    });
-
-    // Create Fuse index
-    const fuseIndex = new Fuse(roms, fuseOptions);
-
-    console.log('ROM indexing complete! Search engine is ready.');
-    return { success: true, roms, fuseIndex };
+    // Create normalized titles for each ROM (the compiled database already has them)
+    if (!fromCompiled) {
+      roms.forEach(addNormalizedTitle);
+    }
+
+    // Index one entry per game; searches expand to the other variants
+    const { games, variants } = groupVariants(roms);
+    const fuseIndex = createFuseIndex(games, sha256);
+
+    console.log(`ROM indexing complete! Search engine is ready (${games.length} games indexed).`);
+    return { success: true, roms, games, variants, fuseIndex, sha256, source };
   } catch (error) {
     console.error('Error loading ROM data:', error);
     return { success: false };
   }
 }
 
+// Records are matched between database versions by archive and ROM file name
+function romKey(rom) {
+  return `${rom.filename}\u0000${rom.rom_filename}`;
+}
+
+// rom-list.json's row order: by filename, then ROM filename (record_key() in fetch_gb_roms.py)
+function compareRoms(a, b) {
+  if (a.filename !== b.filename) return a.filename < b.filename ? -1 : 1;
+  const x = a.rom_filename ?? '';
+  const y = b.rom_filename ?? '';
+  return x < y ? -1 : x > y ? 1 : 0;
+}
+
+/**
+ * Apply a changeset written by fetch_gb_roms.py (rom-list.delta.json) to loaded ROM data
+ *
+ * Unchanged ROMs keep their objects and their Fuse.js index records, so only
+ * added and changed ROMs are indexed. A game's variants are regrouped as they
+ * are ranked in the new database; fetch_gb_roms.py lists a ROM whose rank
+ * changed as changed. The current data is left untouched for searches that
+ * are still using it.
+ * @param {Object} current - Result of loadRomData() or an earlier applyRomDelta()
+ * @param {Object} delta - Parsed changeset
+ * @param {string} sha256 - SHA-256 of the rom-list.json now on disk
+ * @returns {Object|null} The patched data, or null when a full reload is needed
+ */
+function applyRomDelta(current, delta, sha256) {
+  if (!delta || delta.version !== DELTA_VERSION) return null;
+  // The changeset must lead from exactly the loaded data to exactly the file on disk
+  if (delta.base.sha256 !== current.sha256 || delta.target.sha256 !== sha256) return null;
+
+  const removed = new Set(delta.removed.map(romKey));
+  const changed = new Map(delta.changed.map(entry => [romKey(entry.record), entry.record]));
+
+  // The index only holds each game's preferred variant
+  const oldIndex = current.fuseIndex.getIndex().toJSON();
+  const oldRecords = new Map(oldIndex.records.map(record => [current.games[record.i], record]));
+
+  const kept = [];
+  current.roms.forEach(rom => {
+    const key = romKey(rom);
+    if (removed.has(key)) return;
+    if (changed.has(key)) {
+      kept.push({ rom: addNormalizedTitle({ ...changed.get(key) }) });
+    } else {
+      kept.push({ rom, record: oldRecords.get(rom) });
+    }
+  });
+
+  // rom-list.json is sorted, so added ROMs are merged in at their place; fetch_gb_roms.py
+  // doesn't write a changeset when this wouldn't give the new file's row order
+  const added = delta.added
+    .map(entry => ({ rom: addNormalizedTitle({ ...entry.record }) }))
+    .sort((a, b) => compareRoms(a.rom, b.rom));
+  const merged = [];
+  let next = 0;
+  for (const entry of kept) {
+    while (next < added.length && compareRoms(added[next].rom, entry.rom) < 0) {
+      merged.push(added[next++]);
+    }
+    merged.push(entry);
+  }
+  merged.push(...added.slice(next));
+
+  if (merged.length !== delta.target.count) return null;
+
+  // Index only the games without a reusable record
+  const indexed = merged.filter(entry => isPreferredVariant(entry.rom));
+  const fresh = indexed.filter(entry => !entry.record);
+  const freshIndex = Fuse.createIndex(FUSE_OPTIONS.keys, fresh.map(entry => entry.rom)).toJSON();
+  const freshRecords = new Map(freshIndex.records.map(record => [record.i, record]));
+  fresh.forEach((entry, i) => {
+    entry.record = freshRecords.get(i);
+  });
+  if (indexed.some(entry => !entry.record)) return null;
+
+  const roms = merged.map(entry => entry.rom);
+  const { games, variants } = groupVariants(roms);
+  const records = indexed.map((entry, i) => ({ ...entry.record, i }));
+  const fuseIndex = new Fuse(
+    games,
+    FUSE_OPTIONS,
+    Fuse.parseIndex({ keys: oldIndex.keys, records })
+  );
+
+  return {
+    success: true,
+    roms,
+    games,
+    variants,
+    fuseIndex,
+    sha256,
+    changes: {
+      added: delta.added.length,
+      changed: delta.changed.length,
+      removed: delta.removed.length,
+    },
+  };
+}
+
+/**
+ * Bring loaded ROM data up to date with rom-list.json on disk
+ *
+ * Applies rom-list.delta.json when it leads from the loaded data to the file
+ * on disk, and falls back to a full loadRomData() otherwise.
+ * @param {Object} current - Result of loadRomData() or an earlier refresh
+ * @returns {Object} The current data if nothing changed, otherwise the new data
+ */
+function refreshRomData(current) {
+  const romListPath = path.join(__dirname, 'rom-list.json');
+  const deltaPath = path.join(__dirname, 'rom-list.delta.json');
+
+  try {
+    // Nothing to read when rom-list.json wasn't touched since it was loaded
+    const source = sourceStat(romListPath);
+    if (current && current.success && sameSource(source, current.source)) return current;
+    const sha256 = hashFile(romListPath);
+    if (current && current.success && sha256 === current.sha256) {
+      // Touched but not changed: remember the new mtime so the next check doesn't hash again
+      current.source = source;
+      return current;
+    }
+
+    if (current && current.success && fs.existsSync(deltaPath)) {
+      const delta = JSON.parse(fs.readFileSync(deltaPath, 'utf8'));
+      const patched = applyRomDelta(current, delta, sha256);
+      if (patched) {
+        patched.source = source;
+        saveFuseIndex(patched.fuseIndex, sha256);
+        const { added, changed, removed } = patched.changes;
+        console.log(
+          `Applied ROM changeset: ${added} added, ${changed} changed, ${removed} removed (${patched.roms.length} ROM entries)`
+        );
+        return patched;
+      }
+      console.log('ROM changeset does not match the loaded data, reloading rom-list.json');
+    }
+  } catch (error) {
+    console.error('Error applying ROM changeset, reloading rom-list.json:', error);
+  }
+
+  return loadRomData();
+}
+
 module.exports = {
   loadRomData,
+  loadCompiledRoms,
+  applyRomDelta,
+  refreshRomData,
+  groupVariants,
   normalizeString,
   extractBaseTitle,
   normalizeGameTitle,
+  FUSE_OPTIONS,
 };
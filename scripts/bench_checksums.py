@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""Micro-benchmark for the ROM checksum engine in fetch_gb_roms.py
+
+Compares the bulk checksum functions against the original per-byte loops on
+random ROM images from 32 KiB to 8 MiB, plus the batch header API and the
+RomHeader decoder against the original field-by-field decoding.
+"""
+
+import argparse
+import os
+import time
+
+import fetch_gb_roms
+import rom_header
+
+
+def reference_header_checksum(header_bytes):
+    """Original per-byte header checksum loop"""
+    checksum = 0
+    for i in range(0x134, 0x14D):
+        checksum = (checksum - header_bytes[i] - 1) & 0xFF
+    return checksum
+
+
+def reference_global_checksum(rom_data):
+    """Original per-byte global checksum loop"""
+    checksum = 0
+    for i in range(len(rom_data)):
+        if i != 0x14E and i != 0x14F:
+            checksum = (checksum + rom_data[i]) & 0xFFFF
+    return checksum
+
+
+def reference_decode_header(header_bytes):
+    """Original field-by-field header decoding from build_rom_record"""
+    title = header_bytes[0x134:0x13F].decode('ascii', errors='replace').strip('\x00')
+    cgb_flag = header_bytes[0x143]
+    sgb_flag = header_bytes[0x146]
+    cartridge_type = header_bytes[0x147]
+    rom_size = header_bytes[0x148]
+    ram_size = header_bytes[0x149]
+    destination_code = header_bytes[0x14A]
+    mapper_type = rom_header.CARTRIDGE_TYPES.get(cartridge_type, f"Unknown (0x{cartridge_type:02X})")
+    return (
+        title,
+        rom_header.CGB_FLAGS.get(cgb_flag, f"Unknown (0x{cgb_flag:02X})"),
+        rom_header.SGB_FLAGS.get(sgb_flag, f"Unknown (0x{sgb_flag:02X})"),
+        rom_header.DESTINATION_CODES.get(destination_code, f"Unknown (0x{destination_code:02X})"),
+        header_bytes[0x14C],
+        rom_header.ROM_SIZES.get(rom_size, f"Unknown (0x{rom_size:02X})"),
+        rom_header.RAM_SIZES.get(ram_size, f"Unknown (0x{ram_size:02X})"),
+        "RAM" in mapper_type or cartridge_type == 0x05 or cartridge_type == 0x06,
+        mapper_type.split('+')[0].strip(),
+        "Timer" in mapper_type or cartridge_type in [0x0F, 0x10],
+        "Rumble" in mapper_type or cartridge_type in [0x1C, 0x1D, 0x1E, 0x22],
+        "Battery" in mapper_type,
+        header_bytes[0x14D],
+        (header_bytes[0x14E] << 8) | header_bytes[0x14F],
+        fetch_gb_roms.calculate_header_checksum(header_bytes) == header_bytes[0x14D]
+    )
+
+
+def header_fields(header):
+    """The fields of a RomHeader that reference_decode_header returns"""
+    return (header.title, header.cgb_support, header.sgb_support, header.region, header.version,
+            header.rom_size_label, header.ram_size_label, header.has_ram, header.mapper, header.has_timer,
+            header.has_rumble, header.has_battery, header.header_checksum, header.global_checksum,
+            header.header_checksum_valid)
+
+
+def best_time(func, arg, repeat):
+    """Return the fastest of several timed calls along with the result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark the ROM checksum engine')
+
+    parser.add_argument('--repeat', '-r', type=int, default=3,
+                        help='Timed runs per measurement, best is reported (default: 3)')
+
+    parser.add_argument('--batch', '-b', type=int, default=4096,
+                        help='Number of headers in the batch benchmark (default: 4096)')
+
+    parser.add_argument('--skip-reference', action='store_true',
+                        help='Only time the new engine (the reference loops take seconds on 8 MiB)')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    backend = "numpy" if fetch_gb_roms.numpy is not None else "stdlib"
+    print(f"Checksum engine backend: {backend}\n")
+    print(f"{'size':>8}  {'reference':>12}  {'engine':>12}  {'speedup':>8}")
+
+    for shift in range(15, 24):  # 32 KiB .. 8 MiB
+        size = 1 << shift
+        rom_data = os.urandom(size)
+
+        engine_time, engine_result = best_time(fetch_gb_roms.calculate_global_checksum, rom_data, args.repeat)
+        if args.skip_reference:
+            print(f"{size // 1024:>6} K  {'-':>12}  {engine_time * 1000:>10.2f}ms  {'-':>8}")
+            continue
+
+        reference_time, reference_result = best_time(reference_global_checksum, rom_data, 1)
+        assert reference_result == engine_result, f"checksum mismatch at {size} bytes"
+        print(f"{size // 1024:>6} K  {reference_time * 1000:>10.2f}ms  {engine_time * 1000:>10.2f}ms  "
+              f"{reference_time / engine_time:>7.1f}x")
+
+    headers = [os.urandom(0x150) for _ in range(args.batch)]
+    reference_time, reference_result = best_time(
+        lambda batch: [reference_header_checksum(h) for h in batch], headers, args.repeat)
+    single_time, _ = best_time(
+        lambda batch: [fetch_gb_roms.calculate_header_checksum(h) for h in batch], headers, args.repeat)
+    batch_time, batch_result = best_time(fetch_gb_roms.calculate_header_checksums, headers, args.repeat)
+    assert reference_result == batch_result, "header checksum mismatch"
+
+    print(f"\nHeader checksums for {args.batch} headers:")
+    print(f"  reference loop: {reference_time * 1000:8.2f}ms")
+    print(f"  engine (each):  {single_time * 1000:8.2f}ms")
+    print(f"  engine (batch): {batch_time * 1000:8.2f}ms  ({reference_time / batch_time:.1f}x)")
+
+    reference_time, reference_result = best_time(
+        lambda batch: [reference_decode_header(h) for h in batch], headers, args.repeat)
+    single_time, _ = best_time(
+        lambda batch: [header_fields(rom_header.RomHeader.from_bytes(h)) for h in batch], headers, args.repeat)
+    batch_time, batch_result = best_time(
+        lambda batch: [header_fields(h) for h in rom_header.decode_headers(batch)], headers, args.repeat)
+    assert reference_result == batch_result, "header decoding mismatch"
+
+    print(f"\nFull header decoding for {args.batch} headers:")
+    print(f"  reference:      {reference_time * 1000:8.2f}ms")
+    print(f"  RomHeader:      {single_time * 1000:8.2f}ms  ({reference_time / single_time:.1f}x)")
+    print(f"  decode_headers: {batch_time * 1000:8.2f}ms  ({reference_time / batch_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
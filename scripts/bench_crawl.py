@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+
+"""End-to-end benchmark for fetch_gb_roms.py against a local mock archive server
+
+Generates a synthetic corpus of valid GB/GBC ROMs (correct header and global
+checksums, size and cartridge-type mix taken from rom-list.json) packed into
+No-Intro-style ZIPs, serves it behind myrient-style directory listings with
+configurable latency and bandwidth, and times the listing, download and parse
+stages as well as process_files_with_progress for each engine. Results are
+written as JSON so runs can be compared with --baseline.
+"""
+
+import argparse
+import contextlib
+import concurrent.futures
+import datetime
+import functools
+import http.server
+import io
+import json
+import logging
+import os
+import platform
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from urllib.parse import quote, unquote
+
+import fetch_gb_roms
+
+# Bump when the corpus layout changes so cached corpora are regenerated
+CORPUS_VERSION = 1
+
+# Collections served by the mock server, like the myrient No-Intro folders
+COLLECTIONS = ('Nintendo - Game Boy', 'Nintendo - Game Boy Color')
+
+# Weights below are rounded from the published rom-list.json
+ROM_SIZE_WEIGHTS = {0x00: 221, 0x01: 255, 0x02: 823, 0x03: 739, 0x04: 429, 0x05: 1309, 0x06: 506, 0x07: 155, 0x08: 2}
+
+CARTRIDGE_TYPE_WEIGHTS = {
+    0x00: 200,   # ROM Only
+    0x01: 900,   # MBC1
+    0x02: 100,   # MBC1+RAM
+    0x03: 700,   # MBC1+RAM+Battery
+    0x06: 99,    # MBC2+Battery
+    0x10: 50,    # MBC3+Timer+RAM+Battery
+    0x13: 30,    # MBC3+RAM+Battery
+    0x19: 500,   # MBC5
+    0x1A: 200,   # MBC5+RAM
+    0x1B: 1500,  # MBC5+RAM+Battery
+    0x1E: 120,   # MBC5+Rumble+RAM+Battery
+    0xFF: 15     # HuC1+RAM+Battery
+}
+
+CGB_FLAG_WEIGHTS = {0x00: 1783, 0x80: 917, 0xC0: 1402}
+
+REGIONS = ('Japan', 'USA', 'Europe', 'USA, Europe', 'World')
+
+NINTENDO_LOGO = bytes.fromhex(
+    'CEED6666CC0D000B03730083000C000D0008111F8889000E'
+    'DCCC6EE6DDDDD999BBBB67636E0EECCCDDDC999FBBB9333E'
+)
+
+# Bytes written per sleep when throttling a response
+THROTTLE_CHUNK_SIZE = 16 * 1024
+
+
+def weighted_choice(rng, weights):
+    """Pick a key from a {value: weight} table"""
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def make_rom(rng, title, cgb_flag, sgb, cartridge_type, rom_size_code):
+    """Build a ROM image with a valid header, header checksum and global checksum"""
+    size = 0x8000 << rom_size_code
+
+    # Real dumps are part code/data and part 0xFF padding, which keeps
+    # compression ratios (and so download sizes) realistic
+    used = max(fetch_gb_roms.HEADER_SIZE, int(size * rng.uniform(0.3, 0.9)))
+    rom = bytearray(rng.randbytes(used) + b'\xff' * (size - used))
+
+    rom[0x100:0x104] = b'\x00\xc3\x50\x01'  # nop; jp $0150
+    rom[0x104:0x134] = NINTENDO_LOGO
+    rom[0x134:0x143] = title.encode('ascii')[:15].ljust(15, b'\x00')
+    rom[0x143] = cgb_flag
+    rom[0x144:0x146] = b'00'
+    rom[0x146] = 0x03 if sgb else 0x00
+    rom[0x147] = cartridge_type
+    rom[0x148] = rom_size_code
+    rom[0x149] = 0x02 if cartridge_type in (0x02, 0x03, 0x10, 0x13, 0x1A, 0x1B, 0x1E, 0xFF) else 0x00
+    rom[0x14A] = 0x00 if title.endswith('J') else 0x01
+    rom[0x14B] = 0x33
+    rom[0x14C] = rng.choice((0, 0, 0, 1))
+
+    rom[0x14D] = fetch_gb_roms.calculate_header_checksum(rom)
+    rom[0x14E:0x150] = fetch_gb_roms.calculate_global_checksum(rom).to_bytes(2, 'big')
+    return bytes(rom)
+
+
+def listing_html(collection, entries):
+    """Render a myrient-style directory listing that DirectoryParser accepts"""
+    rows = [
+        '<tr><td class="link"><a href="../" title="Parent directory">Parent directory/</a></td>'
+        '<td class="size">-</td><td class="date">-</td></tr>'
+    ]
+    for name, size in entries:
+        rows.append(
+            f'<tr><td class="link"><a href="{quote(name)}" title="{name}">{name}</a></td>'
+            f'<td class="size">{size / 1024:.1f} KiB</td><td class="date">01-Jan-2024 00:00</td></tr>'
+        )
+    return (
+        f'<html><head><title>{collection}</title></head><body>'
+        '<table id="list"><thead><tr><th>File Name</th><th>File Size</th><th>Date</th></tr></thead>'
+        f'<tbody>\n' + '\n'.join(rows) + '\n</tbody></table></body></html>\n'
+    )
+
+
+def generate_corpus(directory, count, seed):
+    """Write count zipped ROMs and their listings under directory, reusing a matching corpus"""
+    manifest_path = os.path.join(directory, 'corpus.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if (manifest.get('version'), manifest.get('count'), manifest.get('seed')) == (CORPUS_VERSION, count, seed):
+            return manifest
+        shutil.rmtree(directory)
+
+    rng = random.Random(seed)
+    listings = {collection: [] for collection in COLLECTIONS}
+    rom_bytes = 0
+    archive_bytes = 0
+
+    for i in range(count):
+        cgb_flag = weighted_choice(rng, CGB_FLAG_WEIGHTS)
+        cartridge_type = weighted_choice(rng, CARTRIDGE_TYPE_WEIGHTS)
+        # ROM Only carts are a single 32 KiB bank and MBC2 tops out at 256 KiB
+        if cartridge_type == 0x00:
+            rom_size_code = 0x00
+        elif cartridge_type == 0x06:
+            rom_size_code = rng.randint(0x01, 0x03)
+        else:
+            rom_size_code = weighted_choice(rng, ROM_SIZE_WEIGHTS)
+        region = rng.choice(REGIONS)
+        sgb = cgb_flag != 0xC0 and rng.random() < 0.2
+
+        name = f"Synthetic Game {i:04d} ({region})"
+        if rng.random() < 0.15:
+            name += f" (Rev {rng.randint(1, 2)})"
+        if sgb:
+            name += " (SGB Enhanced)"
+        if cgb_flag == 0x80:
+            name += " (GB Compatible)"
+        extension = '.gbc' if cgb_flag else '.gb'
+
+        title = f"SYNTH{i:04d}" + ('J' if region == 'Japan' else '')
+        rom = make_rom(rng, title, cgb_flag, sgb, cartridge_type, rom_size_code)
+
+        collection = COLLECTIONS[1] if cgb_flag == 0xC0 else COLLECTIONS[0]
+        folder = os.path.join(directory, collection)
+        os.makedirs(folder, exist_ok=True)
+        archive_path = os.path.join(folder, name + '.zip')
+        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(name + extension, rom)
+
+        size = os.path.getsize(archive_path)
+        listings[collection].append((name + '.zip', size))
+        rom_bytes += len(rom)
+        archive_bytes += size
+
+    for collection, entries in listings.items():
+        os.makedirs(os.path.join(directory, collection), exist_ok=True)
+        with open(os.path.join(directory, collection, 'index.html'), 'w') as f:
+            f.write(listing_html(collection, sorted(entries)))
+
+    manifest = {
+        'version': CORPUS_VERSION,
+        'count': count,
+        'seed': seed,
+        'romBytes': rom_bytes,
+        'archiveBytes': archive_bytes
+    }
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class MockArchiveHandler(http.server.BaseHTTPRequestHandler):
+    """Serves a corpus directory with added latency, throttled bandwidth and Range support"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = os.path.join(self.server.root, unquote(self.path.split('?')[0]).lstrip('/'))
+        if path.endswith('/'):
+            path = os.path.join(path, 'index.html')
+
+        # Time to first byte
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        etag = f'"{len(data):x}-{int(os.path.getmtime(path)):x}"'
+
+        start, end = 0, len(data)
+        status = 200
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header or '')
+        if match and (if_range is None or if_range == etag):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(len(data), int(match.group(2)) + 1) if match.group(2) else len(data)
+            elif match.group(2):
+                start = max(0, len(data) - int(match.group(2)))
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(data)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html' if path.endswith('.html') else 'application/zip')
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{len(data)}')
+        self.end_headers()
+        self.write_throttled(memoryview(data)[start:end])
+
+    def write_throttled(self, body):
+        """Send the body no faster than the server's per-connection bandwidth"""
+        if not self.server.bandwidth:
+            self.wfile.write(body)
+            return
+        for offset in range(0, len(body), THROTTLE_CHUNK_SIZE):
+            chunk = body[offset:offset + THROTTLE_CHUNK_SIZE]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / self.server.bandwidth)
+
+
+class MockArchiveServer(http.server.ThreadingHTTPServer):
+    """Local stand-in for the myrient mirror, run on a background thread"""
+
+    daemon_threads = True
+    # The default listen backlog of 5 drops connections when every download thread connects at once
+    request_queue_size = 128
+    handler_class = MockArchiveHandler
+
+    def __init__(self, root, latency=0.0, bandwidth=0):
+        super().__init__(('127.0.0.1', 0), self.handler_class)
+        self.root = root
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def collection_urls(self):
+        host, port = self.server_address
+        return [f"http://{host}:{port}/{quote(collection)}/" for collection in COLLECTIONS]
+
+
+def rate(count, seconds):
+    return round(count / seconds, 2) if seconds > 0 else None
+
+
+def check_records(records, expected, checksums):
+    """Make sure a run produced one valid record per archive"""
+    assert len(records) == expected, f"expected {expected} records, got {len(records)}"
+    if checksums:
+        invalid = [r['filename'] for r in records if not (r['headerChecksumValid'] and r['globalChecksumValid'])]
+        assert not invalid, f"checksum mismatch in {invalid[:3]}"
+
+
+def bench_stages(urls, options, threads, corpus):
+    """Time the listing, download and parse stages on their own"""
+    stages = {}
+
+    start = time.perf_counter()
+    zip_files = fetch_gb_roms.fetch_directory_listings(urls)
+    elapsed = time.perf_counter() - start
+    assert len(zip_files) == corpus['count'], f"listed {len(zip_files)} of {corpus['count']} archives"
+    stages['listing'] = {'seconds': round(elapsed, 3), 'archivesPerSecond': rate(len(zip_files), elapsed)}
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        fetched = list(executor.map(functools.partial(fetch_gb_roms.fetch_archive, options=options), zip_files))
+    elapsed = time.perf_counter() - start
+
+    # Downloaded archives come back as open spooled files, parsed in this process like the local engine does
+    downloaded = [(zip_info, archive) for zip_info, (kind, archive, _) in zip(zip_files, fetched)
+                  if kind == 'downloaded']
+    try:
+        stages['download'] = {
+            'seconds': round(elapsed, 3),
+            'archivesPerSecond': rate(len(zip_files), elapsed),
+            'mibPerSecond': rate(sum(archive.seek(0, os.SEEK_END) for _, archive in downloaded) / 2**20, elapsed)
+            if downloaded else None,
+            # Header-only runs read each archive's directory and header with Range requests instead
+            'headerOnly': len(zip_files) - len(downloaded)
+        }
+
+        if downloaded:
+            start = time.perf_counter()
+            records = []
+            for zip_info, archive in downloaded:
+                archive.seek(0)
+                records.append(fetch_gb_roms.parse_archive(archive, zip_info['filename'], options))
+            elapsed = time.perf_counter() - start
+            check_records(records, len(downloaded), options['checksums'])
+            stages['parse'] = {
+                'seconds': round(elapsed, 3),
+                'archivesPerSecond': rate(len(records), elapsed),
+                'romMibPerSecond': rate(corpus['romBytes'] / 2**20, elapsed),
+                'workers': 1
+            }
+    finally:
+        for _, archive in downloaded:
+            archive.close()
+
+    return stages
+
+
+def bench_engine(urls, engine, options, threads, parse_workers, corpus, max_threads=None):
+    """Time a full process_files_with_progress run, listings included
+    
+    With max_threads the download concurrency adapts, starting at threads.
+    """
+    metrics = fetch_gb_roms.RunMetrics()
+    controller = None
+    if max_threads:
+        controller = fetch_gb_roms.ConcurrencyController(threads, maximum=max_threads)
+    start = time.perf_counter()
+    # Keep the progress bar out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        records = fetch_gb_roms.process_files_with_progress(
+            fetch_gb_roms.ListingFeed(urls),
+            max_workers=threads,
+            calculate_checksums=options['checksums'],
+            engine=engine,
+            parse_workers=parse_workers,
+            metrics=metrics,
+            controller=controller
+        )
+    elapsed = time.perf_counter() - start
+    check_records(records, corpus['count'], options['checksums'])
+
+    # Summed per-archive time in each stage, to show where the engine spends it
+    summary = metrics.summary()
+    results = {
+        'seconds': round(elapsed, 3),
+        'archivesPerSecond': rate(corpus['count'], elapsed),
+        'archiveMibPerSecond': rate(corpus['archiveBytes'] / 2**20, elapsed),
+        'stageSeconds': {name[:-len('_seconds')]: values['sum'] for name, values in summary['histograms'].items()
+                         if name.endswith('_seconds')},
+        'retries': summary['retries']
+    }
+    if controller is not None:
+        results['concurrency'] = {'final': int(controller.limit), 'peak': int(controller.peak)}
+    return results
+
+
+def compare(results, baseline):
+    """Print each throughput figure next to the same figure from an earlier run"""
+    print(f"\nCompared with {baseline['timestamp']}:")
+    for key in ('corpus', 'server', 'options'):
+        if results[key] != baseline.get(key):
+            print(f"  warning: '{key}' does not match the baseline run, so the figures are not like for like")
+    for section in ('stages', 'endToEnd'):
+        for name, metrics in results[section].items():
+            for metric, value in metrics.items():
+                old = baseline.get(section, {}).get(name, {}).get(metric)
+                if not metric.endswith('PerSecond') or not old or value is None:
+                    continue
+                print(f"  {name:<9} {metric:<20} {old:>10.2f} -> {value:>10.2f}  ({(value / old - 1) * 100:+.1f}%)")
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark fetch_gb_roms.py against a local mock archive server')
+
+    parser.add_argument('--count', '-n', type=int, default=200,
+                        help='Number of synthetic ROM archives (default: 200)')
+
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Seed for the synthetic corpus (default: 1)')
+
+    parser.add_argument('--corpus', type=str,
+                        help='Directory to keep the corpus in between runs (default: a temporary directory)')
+
+    parser.add_argument('--latency', type=float, default=20,
+                        help='Added time to first byte per request, in milliseconds (default: 20)')
+
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help='Per-connection bandwidth limit in KiB/s, 0 for unlimited (default: 0)')
+
+    parser.add_argument('--engines', type=str, default='threads,async,pipeline',
+                        help='Comma-separated engines to time end to end (default: threads,async,pipeline)')
+
+    parser.add_argument('--threads', '-t', type=int, default=8,
+                        help='Download workers (default: 8)')
+
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Let the end-to-end runs adapt their download concurrency, starting at --threads')
+
+    parser.add_argument('--max-threads', type=int, default=32,
+                        help='Upper bound on download concurrency with --adaptive (default: 32)')
+
+    parser.add_argument('--parse-workers', type=int,
+                        help='Parser processes for the pipeline engine (default: CPU count)')
+
+    parser.add_argument('--no-checksums', action='store_true',
+                        help='Benchmark header-only runs (uses HTTP Range reads)')
+
+    parser.add_argument('--output', '-o', type=str, default='bench-results.json',
+                        help='Where to write the results (default: bench-results.json)')
+
+    parser.add_argument('--baseline', '-b', type=str,
+                        help='Earlier results file to compare against')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    fetch_gb_roms.logger.setLevel(logging.WARNING)
+    options = fetch_gb_roms.archive_options(calculate_checksum=not args.no_checksums)
+
+    with contextlib.ExitStack() as stack:
+        corpus_dir = args.corpus or stack.enter_context(tempfile.TemporaryDirectory(prefix='gb-corpus-'))
+
+        start = time.perf_counter()
+        corpus = generate_corpus(corpus_dir, args.count, args.seed)
+        print(f"Corpus: {corpus['count']} archives, {corpus['romBytes'] / 2**20:.1f} MiB of ROMs "
+              f"in {corpus['archiveBytes'] / 2**20:.1f} MiB of ZIPs ({time.perf_counter() - start:.1f}s)")
+
+        server = stack.enter_context(MockArchiveServer(corpus_dir, args.latency / 1000, args.bandwidth * 1024))
+        urls = server.collection_urls()
+
+        results = {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': fetch_gb_roms.numpy is not None,
+            'cpuCount': os.cpu_count(),
+            'corpus': corpus,
+            'server': {'latencyMs': args.latency, 'bandwidthKiB': args.bandwidth},
+            'options': {'threads': args.threads, 'parseWorkers': args.parse_workers, 'checksums': options['checksums'],
+                        'maxThreads': args.max_threads if args.adaptive else None},
+            'stages': bench_stages(urls, options, args.threads, corpus),
+            'endToEnd': {}
+        }
+
+        print(f"\n{'stage':<9} {'seconds':>9} {'archives/s':>11}")
+        for name, metrics in results['stages'].items():
+            print(f"{name:<9} {metrics['seconds']:>9.2f} {metrics['archivesPerSecond'] or 0:>11.1f}")
+
+        for engine in args.engines.split(','):
+            metrics = bench_engine(urls, engine, options, args.threads, args.parse_workers, corpus,
+                                   max_threads=args.max_threads if args.adaptive else None)
+            results['endToEnd'][engine] = metrics
+            line = f"{engine:<9} {metrics['seconds']:>9.2f} {metrics['archivesPerSecond']:>11.1f}  (end to end"
+            if 'concurrency' in metrics:
+                line += f", concurrency {metrics['concurrency']['final']}, peak {metrics['concurrency']['peak']}"
+            print(line + ")")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
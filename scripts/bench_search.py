@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+"""Latency benchmark for the ROM search index in rom_search.py
+
+Builds a query set from rom-list.json (full titles, one- and two-word
+prefixes, typos and header titles) and reports p50/p90/p99 latency for:
+
+- SearchIndex.search, without and with /dmgdb-style filters
+- the HTTP service, with a cold and a warm result cache
+- the bot's Fuse.js search, when node and fuse.js are installed
+
+along with its recall against Fuse.js: how many of Fuse.js's top results
+the index also returns within Fuse.js's score threshold, as the bot keeps
+them, and how many of the queries Fuse.js answers the index answers too.
+The bot falls back to Fuse.js for the rest.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+import urllib.parse
+
+import rom_search
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Times the bot's Fuse.js search over the same records and queries
+FUSE_SCRIPT = r"""
+const fs = require('fs');
+const Fuse = require('fuse.js');
+const { FUSE_OPTIONS, extractBaseTitle, normalizeGameTitle } = require('./loadRomData');
+
+const { database, queries, rounds, limit } = JSON.parse(fs.readFileSync(0, 'utf8'));
+const roms = JSON.parse(fs.readFileSync(database, 'utf8'));
+roms.forEach(rom => {
+  rom.normalizedTitle = normalizeGameTitle(extractBaseTitle(rom.filename));
+});
+const fuse = new Fuse(roms, FUSE_OPTIONS);
+
+const latencies = [];
+const top = [];
+for (let round = 0; round < rounds; round++) {
+  queries.forEach(query => {
+    const start = process.hrtime.bigint();
+    const results = fuse.search(query);
+    latencies.push(Number(process.hrtime.bigint() - start) / 1e6);
+    if (round === 0) top.push(results.slice(0, limit).map(result => result.refIndex));
+  });
+}
+process.stdout.write(JSON.stringify({ latencies, top, threshold: FUSE_OPTIONS.threshold }));
+"""
+
+
+def make_typo(rng, text):
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 1)
+    if rng.random() < 0.5:
+        return text[:i] + text[i + 1:]
+    return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+
+
+def make_queries(index, count, seed):
+    """Search texts a user might type for randomly chosen ROMs"""
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < count:
+        row = rng.randrange(index.count)
+        title = index.normalized_titles[row]
+        words = title.split()
+        if not words:
+            continue
+        kind = rng.randrange(5)
+        if kind == 0:
+            query = title
+        elif kind == 1:
+            query = words[0]
+        elif kind == 2:
+            query = ' '.join(words[:2])
+        elif kind == 3:
+            query = make_typo(rng, ' '.join(words[:3]))
+        else:
+            query = (index.records[row].get('title') or title).lower()
+        queries.append(query)
+    return queries
+
+
+def make_filters(rng):
+    filters = {}
+    if rng.random() < 0.5:
+        filters['region'] = rng.choice(rom_search.REGION_FILTERS)
+    if rng.random() < 0.3:
+        filters['cgb'] = rng.choice(sorted(rom_search.CGB_FILTERS))
+    for name in ('sgb', 'battery', 'timer', 'rumble'):
+        if rng.random() < 0.15:
+            filters[name] = rng.random() < 0.5
+    return filters
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(label, latencies):
+    print(f"  {label:<28} p50 {percentile(latencies, 0.5):7.3f} ms   p90 {percentile(latencies, 0.9):7.3f} ms   "
+          f"p99 {percentile(latencies, 0.99):7.3f} ms   max {max(latencies):7.3f} ms")
+
+
+def bench_index(index, queries, filters, rounds, limit):
+    latencies = []
+    top = []
+    for round_number in range(rounds):
+        for query, query_filters in zip(queries, filters):
+            start = time.perf_counter()
+            _, matches = index.search(query, query_filters, limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if round_number == 0:
+                top.append(matches)
+    return latencies, top
+
+
+def bench_service(service, queries, limit):
+    """Query the HTTP service over one keep-alive connection, first cold then warm"""
+    server = rom_search.SearchHTTPServer(('127.0.0.1', 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+    try:
+        results = {}
+        service.cache.clear()
+        for label in ('cold cache', 'warm cache'):
+            latencies = []
+            for query in queries:
+                path = '/search?' + urllib.parse.urlencode({'q': query, 'limit': limit})
+                start = time.perf_counter()
+                connection.request('GET', path)
+                json.loads(connection.getresponse().read())
+                latencies.append((time.perf_counter() - start) * 1000)
+            results[label] = latencies
+        return results
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+
+
+def bench_fuse(database, queries, rounds, limit):
+    """Run FUSE_SCRIPT, or return None when node or fuse.js is missing"""
+    payload = json.dumps({'database': os.path.abspath(database), 'queries': queries,
+                          'rounds': rounds, 'limit': limit})
+    try:
+        result = subprocess.run(['node', '-e', FUSE_SCRIPT], input=payload, capture_output=True,
+                                text=True, cwd=ROOT, check=False)
+    except FileNotFoundError:
+        print("  Fuse.js                      skipped: node is not installed")
+        return None
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines() or ['unknown error']
+        reason = next((line for line in lines if 'Error' in line), lines[-1])
+        print(f"  Fuse.js                      skipped ({reason}); run npm install first")
+        return None
+    return json.loads(result.stdout)
+
+
+def within(matches, threshold):
+    """Rows of the index matches the bot keeps, those scoring no worse than threshold"""
+    return [row for score, row in matches if score <= threshold]
+
+
+def overlap(ours, theirs, threshold):
+    """Share of the reference top results that also come back from the index"""
+    found = total = 0
+    for our_matches, their_rows in zip(ours, theirs):
+        found += len(set(within(our_matches, threshold)) & set(their_rows))
+        total += len(their_rows)
+    return found / total if total else 1.0
+
+
+def missed_queries(queries, ours, theirs, threshold):
+    """Queries Fuse.js has results for but the index has none within threshold for"""
+    return [query for query, our_matches, their_rows in zip(queries, ours, theirs)
+            if their_rows and not within(our_matches, threshold)]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark rom_search.py against the bot\'s Fuse.js search')
+    parser.add_argument('--database', '-d', type=str, default=os.path.join(ROOT, 'rom-list.json'),
+                        help='ROM list JSON file (default: rom-list.json in the repository)')
+    parser.add_argument('--queries', '-n', type=int, default=500,
+                        help='Number of queries to generate (default: 500)')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='Times each query is repeated (default: 3)')
+    parser.add_argument('--limit', type=int, default=10,
+                        help='Top results compared with Fuse.js (default: 10)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Seed for the query set (default: 1)')
+    parser.add_argument('--no-fuse', action='store_true',
+                        help='Skip the Fuse.js comparison')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    start = time.perf_counter()
+    service = rom_search.SearchService(args.database)
+    index = service.index
+    print(f"Indexed {index.count} ROMs in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    queries = make_queries(index, args.queries, args.seed)
+    rng = random.Random(args.seed)
+    filters = [make_filters(rng) for _ in queries]
+    print(f"{len(queries)} queries x {args.rounds} rounds\n")
+
+    latencies, top = bench_index(index, queries, [None] * len(queries), args.rounds, args.limit)
+    report('Index', latencies)
+    filtered, _ = bench_index(index, queries, filters, args.rounds, args.limit)
+    report('Index with filters', filtered)
+    for label, service_latencies in bench_service(service, queries, args.limit).items():
+        report(f"HTTP service, {label}", service_latencies)
+
+    if not args.no_fuse:
+        fuse = bench_fuse(args.database, queries, args.rounds, args.limit)
+        if fuse:
+            report('Fuse.js', fuse['latencies'])
+            speedup = percentile(fuse['latencies'], 0.99) / percentile(latencies, 0.99)
+            threshold = fuse['threshold']
+            answered = sum(1 for rows in fuse['top'] if rows)
+            missed = missed_queries(queries, top, fuse['top'], threshold)
+            print(f"\nIndex p99 is {speedup:.1f}x faster than Fuse.js. Within Fuse.js's threshold ({threshold}) it "
+                  f"returns {overlap(top, fuse['top'], threshold) * 100:.0f}% of Fuse.js's top {args.limit}, and "
+                  f"answers {answered - len(missed)} of the {answered} queries Fuse.js has results for "
+                  f"({(answered - len(missed)) / answered * 100 if answered else 100:.0f}% recall)")
+            if missed:
+                examples = ', '.join(repr(query) for query in missed[:5])
+                print(f"The bot falls back to Fuse.js for the other {len(missed)}, e.g. {examples}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+// Conformance check for the filename fields fetch_gb_roms.py writes
+// (scripts/rom_filename.py): every record's stored fields must match what the
+// bot's own helpers compute from its filename and region.
+// Usage: node scripts/check-filename-fields.js [rom-list.json]
+const fs = require('fs');
+const path = require('path');
+const { extractBaseTitle } = require('../loadRomData');
+const { cleanTitle, getDisplayRegion } = require('../utils/titles');
+const { pickRegionEmoji, flagMap } = require('../utils/regions');
+
+const MISMATCHES_SHOWN = 20;
+
+// Field, what the bot computes for it, and how to read the stored value
+const CHECKS = [
+  ['baseTitle', rom => extractBaseTitle(rom.filename), rom => rom.baseTitle],
+  ['displayTitle', rom => cleanTitle(extractBaseTitle(rom.filename)), rom => rom.displayTitle],
+  ['displayRegion', rom => getDisplayRegion(rom), rom => rom.displayRegion],
+  ['regionFlag', rom => pickRegionEmoji(rom.filename, rom.region), rom => flagMap[rom.regionFlag]],
+];
+
+const romListPath = process.argv[2] || path.join(__dirname, '..', 'rom-list.json');
+const roms = JSON.parse(fs.readFileSync(romListPath, 'utf8'));
+
+const problems = [];
+const counts = Object.fromEntries(CHECKS.map(([field]) => [field, 0]));
+roms.forEach(rom => {
+  CHECKS.forEach(([field, expectedOf, storedOf]) => {
+    if (!(field in rom)) {
+      problems.push(`${rom.filename}: no ${field} field`);
+      counts[field]++;
+      return;
+    }
+    const expected = expectedOf(rom);
+    const stored = storedOf(rom);
+    if (stored !== expected) {
+      problems.push(
+        `${rom.filename}: ${field} is ${JSON.stringify(stored)}, the bot computes ${JSON.stringify(expected)}`
+      );
+      counts[field]++;
+    }
+  });
+});
+
+problems.slice(0, MISMATCHES_SHOWN).forEach(problem => console.log(problem));
+if (problems.length > MISMATCHES_SHOWN) {
+  console.log(`...and ${problems.length - MISMATCHES_SHOWN} more`);
+}
+CHECKS.forEach(([field]) => {
+  console.log(`${field}: ${roms.length - counts[field]}/${roms.length} match`);
+});
+
+if (problems.length > 0) {
+  console.error(`\n${problems.length} mismatches in ${romListPath}`);
+  process.exit(1);
+}
+console.log(`\nAll ${roms.length} records in ${romListPath} match the bot's helpers.`);
@@ -1,21 +1,61 @@
 #!/usr/bin/env python3
 
 import urllib.request
+import urllib.parse
 import html.parser
 import io
 import zipfile
 import json
 import concurrent.futures
+import email.utils
+import filecmp
 import tempfile
 import logging
+import queue
 import argparse
+import datetime
+import asyncio
+import bisect
+import codecs
+import collections
+import contextvars
+import functools
+import ssl
 import time
 import hashlib
+import http.client
+import mmap
 import os
+import random
 import re
+import signal
+import socket
+import struct
+import sys
+import threading
+import zlib
+import xml.etree.ElementTree
 from urllib.parse import urljoin
 from urllib.error import URLError, HTTPError
 
+from rom_clusters import (ClusterBuilder, DEFAULT_REGION_PRIORITY, REVISION_PRIORITIES, VariantPreference,
+                          set_cluster_fields)
+from rom_database import compile_database_from_json
+from rom_filename import filename_fields
+from rom_header import ROM_SIZE_BYTES, ROM_SIZES, RomHeader
+
+# NumPy is optional; when present it is used for bulk checksum sums
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Only used to report peak memory, and not available on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,79 +64,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger('gb_rom_parser')
 
-# Lookup dictionaries for human-readable values
-CGB_FLAGS = {
-    0x00: "DMG",                # No CGB functionality
-    0x80: "DMG+CGB",            # Supports both CGB and DMG
-    0xC0: "CGB Only"            # CGB only
-}
-
-SGB_FLAGS = {
-    0x00: "No",                 # No SGB functionality
-    0x03: "Yes"                 # SGB functionality
-}
-
-CARTRIDGE_TYPES = {
-    0x00: "ROM Only",
-    0x01: "MBC1",
-    0x02: "MBC1+RAM",
-    0x03: "MBC1+RAM+Battery",
-    0x05: "MBC2",
-    0x06: "MBC2+Battery",
-    0x08: "ROM+RAM",
-    0x09: "ROM+RAM+Battery",
-    0x0B: "MMM01",
-    0x0C: "MMM01+RAM",
-    0x0D: "MMM01+RAM+Battery",
-    0x0F: "MBC3+Timer+Battery",
-    0x10: "MBC3+Timer+RAM+Battery",
-    0x11: "MBC3",
-    0x12: "MBC3+RAM",
-    0x13: "MBC3+RAM+Battery",
-    0x19: "MBC5",
-    0x1A: "MBC5+RAM",
-    0x1B: "MBC5+RAM+Battery",
-    0x1C: "MBC5+Rumble",
-    0x1D: "MBC5+Rumble+RAM",
-    0x1E: "MBC5+Rumble+RAM+Battery",
-    0x20: "MBC6",
-    0x22: "MBC7+Sensor+Rumble+RAM+Battery",
-    0xFC: "Pocket Camera",
-    0xFD: "BANDAI TAMA5",
-    0xFE: "HuC3",
-    0xFF: "HuC1+RAM+Battery"
-}
-
-ROM_SIZES = {
-    0x00: "32 KiB",
-    0x01: "64 KiB",
-    0x02: "128 KiB",
-    0x03: "256 KiB",
-    0x04: "512 KiB",
-    0x05: "1 MiB",
-    0x06: "2 MiB",
-    0x07: "4 MiB",
-    0x08: "8 MiB",
-    0x52: "1.1 MiB",
-    0x53: "1.2 MiB",
-    0x54: "1.5 MiB"
-}
-
-RAM_SIZES = {
-    0x00: "None",
-    0x01: "2 KiB",
-    0x02: "8 KiB",
-    0x03: "32 KiB",
-    0x04: "128 KiB",
-    0x05: "64 KiB"
-}
-
-DESTINATION_CODES = {
-    0x00: "Japanese",
-    0x01: "non-japanese"
-}
-
-
 class DirectoryParser(html.parser.HTMLParser):
     """HTML Parser for directory listings"""
     
@@ -110,6 +77,25 @@ class DirectoryParser(html.parser.HTMLParser):
         self.current_link = None
         self.current_link_text = ""
         self.skip_bios = True
+        # Listing metadata for the most recent ZIP entry in the current row
+        self.row_entry = None
+        self.current_column = None
+        self.current_column_text = ""
+        # Optional callback given each ZIP entry once its table row is complete
+        self.on_entry = None
+        self.emitted = 0
+    
+    def emit_entries(self):
+        """Pass entries whose rows have been fully parsed to on_entry"""
+        if self.on_entry is None:
+            return
+        while self.emitted < len(self.zip_files):
+            self.on_entry(self.zip_files[self.emitted])
+            self.emitted += 1
+    
+    def close(self):
+        super().close()
+        self.emit_entries()
         
     def handle_starttag(self, tag, attrs):
         attrs_dict = dict(attrs)
@@ -122,8 +108,11 @@ class DirectoryParser(html.parser.HTMLParser):
             return
             
         if tag == 'tr':
+            # The previous row is finished even if its </tr> was left out
+            self.emit_entries()
             # Start with clean state for this row
             self.skip_row = False
+            self.row_entry = None
             return
             
         if tag == 'th':
@@ -135,6 +124,12 @@ class DirectoryParser(html.parser.HTMLParser):
             self.in_link_td = True
             return
             
+        if tag == 'td' and attrs_dict.get('class') in ('size', 'date'):
+            # Capture the size/date columns so the journal can detect changes
+            self.current_column = attrs_dict.get('class')
+            self.current_column_text = ""
+            return
+            
         if tag == 'a' and self.in_link_td and not self.skip_row:
             href = attrs_dict.get('href', '')
             if href.endswith('.zip'):
@@ -148,6 +143,8 @@ class DirectoryParser(html.parser.HTMLParser):
         # Capture link text as fallback for title
         if self.current_link is not None:
             self.current_link_text += data
+        elif self.current_column is not None:
+            self.current_column_text += data
     
     def handle_endtag(self, tag):
         if tag == 'table' and self.in_table:
@@ -155,10 +152,18 @@ class DirectoryParser(html.parser.HTMLParser):
             
         if tag == 'tr':
             self.skip_row = False
+            self.emit_entries()
             
         if tag == 'td' and self.in_link_td:
             self.in_link_td = False
             
+        if tag == 'td' and self.current_column is not None:
+            if self.row_entry is not None:
+                value = self.current_column_text.strip()
+                self.row_entry[self.current_column] = value if value not in ('', '-') else None
+            self.current_column = None
+            self.current_column_text = ""
+            
         if tag == 'a' and self.current_link:
             # Use link text as fallback if title attribute is missing
             if not self.current_link['title'] and self.current_link_text:
@@ -177,439 +182,4111 @@ class DirectoryParser(html.parser.HTMLParser):
             
             self.current_link['title'] = title
             full_url = urljoin(self.base_url, self.current_link['href'])
-            self.zip_files.append({
+            self.row_entry = {
                 'url': full_url,
                 'filename': self.current_link['title']
-            })
+            }
+            self.zip_files.append(self.row_entry)
             self.current_link = None
             self.current_link_text = ""
 
 
+# Bytes read from a directory listing before feeding them to the parser
+LISTING_CHUNK_SIZE = 64 * 1024
+
+
+class ListingStream:
+    """DirectoryParser fed with raw bytes while a listing is still downloading
+    
+    Works as a file-like sink: each write() is decoded and parsed at once, and
+    every ZIP entry is handed to on_entry as soon as its table row is complete.
+    """
+    
+    def __init__(self, url, on_entry, skip_bios=True):
+        self.parser = DirectoryParser(url)
+        self.parser.skip_bios = skip_bios
+        self.parser.on_entry = on_entry
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+    
+    def write(self, data):
+        self.parser.feed(self.decoder.decode(data))
+        return len(data)
+    
+    def close(self):
+        """Flush the parser and return every entry found"""
+        self.parser.feed(self.decoder.decode(b'', final=True))
+        self.parser.close()
+        return self.parser.zip_files
+
+
+def stream_directory_listing(url, on_entry, skip_bios=True):
+    """Fetch one directory listing, passing ZIP entries to on_entry as they are parsed"""
+    try:
+        stream = ListingStream(url, on_entry, skip_bios)
+        with urllib.request.urlopen(url) as response:
+            while True:
+                # read1 returns whatever has arrived instead of waiting for a full chunk
+                chunk = response.read1(LISTING_CHUNK_SIZE)
+                if not chunk:
+                    break
+                stream.write(chunk)
+        
+        zip_files = stream.close()
+        logger.info(f"Found {len(zip_files)} ZIP files at {url}")
+        return zip_files
+    
+    except HTTPError as e:
+        logger.error(f"HTTP Error fetching directory {url}: {e.code} {e.reason}")
+    except URLError as e:
+        logger.error(f"URL Error fetching directory {url}: {e.reason}")
+    except Exception as e:
+        logger.error(f"Error fetching directory {url}: {e}")
+    return []
+
+
 def fetch_directory_listings(urls, skip_bios=True):
     """Fetch and parse the directory listings for each URL"""
     all_zip_files = []
-    
     for url in urls:
-        try:
-            # Fetch the directory page
-            with urllib.request.urlopen(url) as response:
-                html_content = response.read().decode('utf-8')
-            
-            # Parse the HTML to extract ZIP files
-            parser = DirectoryParser(url)
-            parser.skip_bios = skip_bios
-            parser.feed(html_content)
-            parser.close()  # Good practice to close the parser
-            
-            # Add the found ZIP files to our list
-            all_zip_files.extend(parser.zip_files)
-            logger.info(f"Found {len(parser.zip_files)} ZIP files at {url}")
-            
-        except HTTPError as e:
-            logger.error(f"HTTP Error fetching directory {url}: {e.code} {e.reason}")
-        except URLError as e:
-            logger.error(f"URL Error fetching directory {url}: {e.reason}")
-        except Exception as e:
-            logger.error(f"Error fetching directory {url}: {e}")
-    
+        all_zip_files.extend(stream_directory_listing(url, None, skip_bios))
     return all_zip_files
 
 
-def calculate_header_checksum(header_bytes):
-    """Calculate the header checksum for validation"""
-    checksum = 0
-    for i in range(0x134, 0x14D):
-        checksum = (checksum - header_bytes[i] - 1) & 0xFF
-    return checksum
+def collection_mirrors(collection):
+    """The mirror URLs of a collection given as one URL or a list of equivalent ones"""
+    mirrors = [collection] if isinstance(collection, str) else list(collection)
+    if not mirrors:
+        raise ValueError("a collection needs at least one URL")
+    # Archive URLs are matched up between mirrors by what follows these prefixes
+    return [url if url.endswith('/') else url + '/' for url in mirrors]
 
 
-def calculate_global_checksum(rom_data):
-    """Calculate the global checksum for validation"""
-    # The global checksum is the 16-bit sum of all bytes except the 2 checksum bytes
-    checksum = 0
-    for i in range(len(rom_data)):
-        # Skip the two global checksum bytes at 0x14E-0x14F
-        if i != 0x14E and i != 0x14F:
-            checksum = (checksum + rom_data[i]) & 0xFFFF
-    return checksum
+def rebase_entry(zip_info, mirrors, listed_from):
+    """Point an entry listed from one mirror at the first, noting its URL on each mirror"""
+    if not zip_info['url'].startswith(listed_from):
+        return zip_info
+    relative = zip_info['url'][len(listed_from):]
+    zip_info['url'] = mirrors[0] + relative
+    if len(mirrors) > 1:
+        zip_info['mirrors'] = [mirror + relative for mirror in mirrors]
+    return zip_info
 
 
-def calculate_md5(data):
-    """Calculate MD5 hash for data"""
-    return hashlib.md5(data).hexdigest()
+class ListingFeed:
+    """ZIP entries from several directory listings, yielded while they download
+    
+    Iterating starts one thread per listing and yields entries as their rows
+    are parsed, so archives can be downloading before discovery finishes.
+    count is the number found so far and done is set once every listing is in.
+    With select, only entries it returns True for are yielded and counted.
+    failed holds the URLs of listings that couldn't be fetched or were empty.
+    
+    Each of urls is a collection: one URL or a list of equivalent mirrors.
+    A collection is listed from its first mirror, falling back to the next
+    one on failure. Entries always carry the first mirror's URL, so the
+    journal sees the same archives whichever mirror answered, and a
+    'mirrors' list with the archive's URL on every mirror.
+    """
+    
+    def __init__(self, urls, skip_bios=True, select=None):
+        self.collections = [collection_mirrors(collection) for collection in urls]
+        self.skip_bios = skip_bios
+        self.select = select
+        self.count = 0
+        self.done = False
+        self.entries = queue.Queue()
+        self.lock = threading.Lock()
+        self.remaining = len(self.collections)
+        self.failed = []
+    
+    def add(self, zip_info):
+        if self.select is not None and not self.select(zip_info):
+            return
+        with self.lock:
+            self.count += 1
+        self.entries.put(zip_info)
+    
+    def listing_done(self):
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining > 0:
+                return
+            self.done = True
+        self.entries.put(None)
+    
+    def fetch(self, mirrors):
+        # A listing that broke off part way may already have added entries
+        seen = set()
+        
+        def found(listed_from, zip_info):
+            if zip_info['filename'] not in seen:
+                seen.add(zip_info['filename'])
+                self.add(rebase_entry(zip_info, mirrors, listed_from))
+        
+        try:
+            for url in mirrors:
+                if stream_directory_listing(url, functools.partial(found, url), self.skip_bios):
+                    return
+                if url != mirrors[-1]:
+                    logger.warning(f"Listing {url} failed, trying the next mirror")
+            self.failed.append(mirrors[0])
+        finally:
+            self.listing_done()
+    
+    async def discover_async(self, pool, on_entry):
+        """Discover over an AsyncConnectionPool instead of threads, calling on_entry for each entry"""
+        def found(mirrors, listed_from, seen, zip_info):
+            if zip_info['filename'] in seen:
+                return
+            seen.add(zip_info['filename'])
+            zip_info = rebase_entry(zip_info, mirrors, listed_from)
+            if self.select is not None and not self.select(zip_info):
+                return
+            with self.lock:
+                self.count += 1
+            on_entry(zip_info)
+        
+        async def fetch(mirrors):
+            seen = set()
+            for url in mirrors:
+                stream = ListingStream(url, functools.partial(found, mirrors, url, seen), self.skip_bios)
+                try:
+                    await pool.request(url, sink=stream)
+                    found_count = len(stream.close())
+                    logger.info(f"Found {found_count} ZIP files at {url}")
+                    if found_count:
+                        return
+                except HTTPError as e:
+                    logger.error(f"HTTP Error fetching directory {url}: {e.code} {e.reason}")
+                except Exception as e:
+                    logger.error(f"Error fetching directory {url}: {e}")
+                if url != mirrors[-1]:
+                    logger.warning(f"Listing {url} failed, trying the next mirror")
+            self.failed.append(mirrors[0])
+        
+        await asyncio.gather(*(fetch(mirrors) for mirrors in self.collections))
+        self.done = True
+    
+    def __iter__(self):
+        if not self.collections:
+            self.done = True
+            return
+        
+        # Daemon threads so Ctrl+C isn't held up by a slow listing
+        for mirrors in self.collections:
+            threading.Thread(target=self.fetch, args=(mirrors,), daemon=True).start()
+        
+        while True:
+            zip_info = self.entries.get()
+            if zip_info is None:
+                return
+            yield zip_info
 
 
-def process_zip_file(zip_info, retry_count=2, calculate_checksum=True, calculate_md5=False, process_all_roms=False):
-    """Download a ZIP file, extract ROM header data, and return a JSON object"""
-    url = zip_info['url']
-    filename = zip_info['filename']
+# Archives submitted but not yet handled, per worker, before submission waits
+SUBMIT_WINDOW_PER_WORKER = 2
+
+
+def submit_as_discovered(zip_files, submit, completions, on_result, window=None):
+    """Submit each archive as it is discovered, handling completions meanwhile
     
-    retries = 0
-    while retries <= retry_count:
-        try:
-            # Use a temporary file to avoid loading the entire ZIP into memory
-            with tempfile.TemporaryFile() as temp_file:
-                # Stream the ZIP file to the temporary file
-                with urllib.request.urlopen(url) as response:
-                    chunk_size = 8192  # 8 KB chunks
-                    while True:
-                        chunk = response.read(chunk_size)
-                        if not chunk:
-                            break
-                        temp_file.write(chunk)
-                
-                # Reset file pointer to beginning
-                temp_file.seek(0)
-                
-                # Open the ZIP file from the temporary file
+    zip_files may be a list or a ListingFeed. submit(zip_info) starts the work
+    and must eventually put (zip_info, result) on the completions queue; this
+    returns once every submitted archive has been passed to on_result. With a
+    window, at most that many archives are submitted and not yet handled at
+    once, so the executor's queue and the results waiting in it stay bounded
+    however long the archive list is.
+    """
+    submitted = 0
+    handled = 0
+    for zip_info in zip_files:
+        # Top the window up only as earlier archives finish
+        while window is not None and submitted - handled >= window:
+            on_result(*completions.get())
+            handled += 1
+        
+        submit(zip_info)
+        submitted += 1
+        
+        # Report whatever finished while waiting for the next entry
+        while True:
+            try:
+                item = completions.get_nowait()
+            except queue.Empty:
+                break
+            on_result(*item)
+            handled += 1
+    
+    while handled < submitted:
+        on_result(*completions.get())
+        handled += 1
+
+
+class CrawlJournal:
+    """Append-only on-disk journal of processed archives
+    
+    Each line is a JSON object describing one archive: its URL, the size and
+    date shown in the directory listing, the HTTP validators returned by the
+    server, the options it was parsed with and the parsed record. Later lines
+    replace earlier ones for the same URL, so a truncated final line left by a
+    crash is simply ignored on the next load.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.handle = None
+        # Entries recorded since the journal was loaded or last compacted
+        self.appended = 0
+        # (crc32, ROM size in bytes) -> record, for the options in crc_options (see lookup_by_crc)
+        self.crc_index = None
+        self.crc_options = None
+        
+    def load(self):
+        """Read an existing journal from disk, tolerating a truncated tail"""
+        if not os.path.exists(self.path):
+            return self
+        
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
                 try:
-                    with zipfile.ZipFile(temp_file) as zip_file:
-                        # Find all .gb or .gbc files in the ZIP
-                        rom_files = [
-                            file_info for file_info in zip_file.infolist() 
-                            if file_info.filename.lower().endswith(('.gb', '.gbc'))
-                        ]
-                        
-                        if not rom_files:
-                            logger.warning(f"No ROM files found in {filename}")
-                            return None
-                        
-                        # Check if we have multiple ROMs and log accordingly
-                        if len(rom_files) > 1 and not process_all_roms:
-                            logger.warning(f"Multiple ROM files found in {filename}, using only the first one")
-                            rom_files = rom_files[:1]
-                        
-                        results = []
-                        for rom_file in rom_files:
-                            # Read the ROM data
-                            with zip_file.open(rom_file) as f:
-                                rom_data = f.read()
-                                header_bytes = rom_data[0:0x150]
-                            
-                            # Extract header data
-                            title_bytes = header_bytes[0x134:0x13F]
-                            title = title_bytes.decode('ascii', errors='replace').strip('\x00')
-                            
-                            cgb_flag = header_bytes[0x143]
-                            sgb_flag = header_bytes[0x146]
-                            cartridge_type = header_bytes[0x147]
-                            rom_size = header_bytes[0x148]
-                            ram_size = header_bytes[0x149]
-                            destination_code = header_bytes[0x14A]
-                            old_licensee = header_bytes[0x14B]
-                            version = header_bytes[0x14C]
-                            header_checksum = header_bytes[0x14D]
-                            global_checksum = (header_bytes[0x14E] << 8) | header_bytes[0x14F]
-                            
-                            # Calculate checksums if requested
-                            header_checksum_valid = None
-                            global_checksum_valid = None
-                            if calculate_checksum:
-                                calculated_header_checksum = calculate_header_checksum(header_bytes)
-                                header_checksum_valid = calculated_header_checksum == header_checksum
-                                
-                                calculated_global_checksum = calculate_global_checksum(rom_data)
-                                global_checksum_valid = calculated_global_checksum == global_checksum
-                            
-                            # Calculate MD5 hash if requested
-                            md5_hash = None
-                            if calculate_md5:
-                                md5_hash = calculate_md5(rom_data)
-                            
-                            # Extract mapper information
-                            mapper_type = CARTRIDGE_TYPES.get(cartridge_type, f"Unknown (0x{cartridge_type:02X})")
-                            # Parse the mapper string to extract the base mapper name (MBC1, MBC2, etc.)
-                            mapper_base = mapper_type.split('+')[0].strip()
-                            
-                            # Determine features from cartridge type
-                            has_ram = "RAM" in mapper_type or cartridge_type == 0x05 or cartridge_type == 0x06  # MBC2 has internal RAM
-                            has_battery = "Battery" in mapper_type
-                            has_timer = "Timer" in mapper_type or cartridge_type in [0x0F, 0x10]
-                            has_rumble = "Rumble" in mapper_type or cartridge_type in [0x1C, 0x1D, 0x1E, 0x22]
-                            
-                            # Build JSON object in the required format
-                            result = {
-                                "filename": os.path.splitext(filename)[0],  # Remove .zip extension
-                                "rom_filename": rom_file.filename,
-                                "title": title,
-                                "cgbFlag": CGB_FLAGS.get(cgb_flag, f"Unknown (0x{cgb_flag:02X})"),
-                                "sgbFlag": SGB_FLAGS.get(sgb_flag, f"Unknown (0x{sgb_flag:02X})"),
-                                "region": DESTINATION_CODES.get(destination_code, f"Unknown (0x{destination_code:02X})"),
-                                "version": version,
-                                "romSize": ROM_SIZES.get(rom_size, f"Unknown (0x{rom_size:02X})"),
-                                "ramSize": RAM_SIZES.get(ram_size, f"Unknown (0x{ram_size:02X})"),
-                                "hasRam": has_ram,
-                                "mapper": mapper_base,
-                                "hasTimer": has_timer,
-                                "hasRumble": has_rumble,
-                                "hasBattery": has_battery,
-                                "headerChecksum": header_checksum,
-                                "globalChecksum": global_checksum
-                            }
-                            
-                            # Add validation info if checksums were calculated
-                            if header_checksum_valid is not None:
-                                result["headerChecksumValid"] = header_checksum_valid
-                            if global_checksum_valid is not None:
-                                result["globalChecksumValid"] = global_checksum_valid
-                            
-                            # Add MD5 hash if calculated
-                            if md5_hash:
-                                result["md5"] = md5_hash
-                            
-                            results.append(result)
-                        
-                        # Return the single result or list of results
-                        if process_all_roms:
-                            return results
-                        else:
-                            return results[0] if results else None
-                
-                except zipfile.BadZipFile:
-                    logger.warning(f"Bad ZIP file: {filename}")
-                    return None
-            
-        except HTTPError as e:
-            retries += 1
-            if retries <= retry_count:
-                logger.warning(f"HTTP Error downloading {filename}: {e.code} {e.reason}, retrying ({retries}/{retry_count})")
-                time.sleep(1 * retries)  # Exponential backoff
-            else:
-                logger.error(f"HTTP Error downloading {filename}: {e.code} {e.reason}, giving up after {retry_count} retries")
-                return None
-                
-        except URLError as e:
-            retries += 1
-            if retries <= retry_count:
-                logger.warning(f"URL Error downloading {filename}: {e.reason}, retrying ({retries}/{retry_count})")
-                time.sleep(1 * retries)  # Exponential backoff
-            else:
-                logger.error(f"URL Error downloading {filename}: {e.reason}, giving up after {retry_count} retries")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error processing {filename}: {e}")
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring corrupt journal line {line_number} in {self.path}")
+                    continue
+                if 'url' in entry:
+                    self.entries[entry['url']] = entry
+        
+        logger.info(f"Loaded {len(self.entries)} journal entries from {self.path}")
+        return self
+    
+    def open(self):
+        """Open the journal for appending"""
+        self.handle = open(self.path, 'a', encoding='utf-8')
+        return self
+    
+    def close(self):
+        """Flush and close the journal"""
+        with self.lock:
+            if self.handle:
+                self.handle.flush()
+                os.fsync(self.handle.fileno())
+                self.handle.close()
+                self.handle = None
+    
+    def compact(self):
+        """Rewrite the journal with one line per archive"""
+        self.close()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for url in sorted(self.entries):
+                f.write(json.dumps(self.entries[url], separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.appended = 0
+    
+    def get(self, url):
+        """Return the journal entry for a URL, if any"""
+        with self.lock:
+            return self.entries.get(url)
+    
+    def lookup(self, zip_info, options, trust_cache=False):
+        """Return a reusable entry when the archive is known to be unchanged
+        
+        An entry is reusable when it finished successfully with the same
+        parsing options and the directory listing still shows the same size and
+        date. With trust_cache the listing comparison is skipped, which is what
+        --retry-failed uses for everything it is not retrying.
+        """
+        entry = self.get(zip_info['url'])
+        if not entry or entry.get('status') != 'done' or entry.get('options') != options:
+            return None
+        if trust_cache:
+            return entry
+        
+        listing_size = zip_info.get('size')
+        listing_date = zip_info.get('date')
+        if listing_size is None and listing_date is None:
+            # Without listing metadata we can only revalidate with the server
+            return None
+        if entry.get('size') == listing_size and entry.get('date') == listing_date:
+            return entry
+        return None
+    
+    def lookup_by_crc(self, zip_info, options, dat):
+        """Reuse a record parsed from the same ROM under another name or date
+        
+        The DAT says which ROM each No-Intro archive holds. When an earlier
+        record with the same options has that ROM's CRC32 and size (and
+        MD5/SHA-1, where both sides have them), the archive is the same dump
+        renamed or re-uploaded. A record is then built from the earlier one's
+        header and hash fields and the new names, without fetching anything;
+        fields derived from the names are filled in again on output. Records
+        only carry crc32 when it was requested, which --dat does, and their
+        size is the one the header declares.
+        """
+        roms = dat.game_roms(zip_info['filename'])
+        if len(roms) != 1:
+            # Which ROM a multi-ROM archive yields depends on its member order
+            return None
+        rom = roms[0]
+        
+        with self.lock:
+            if self.crc_index is None or self.crc_options != options:
+                self.crc_options = options
+                self.crc_index = {}
+                for entry in self.entries.values():
+                    if entry.get('status') == 'done' and entry.get('options') == options:
+                        self._index_crcs(entry.get('result'))
+            record = self.crc_index.get((f"{rom['crc']:08x}", rom['size']))
+        
+        if record is None:
             return None
+        for field in ('md5', 'sha1'):
+            if record.get(field) and rom[field] and record[field] != rom[field]:
+                return None
+        
+        renamed = {'filename': os.path.splitext(zip_info['filename'])[0], 'rom_filename': rom['name']}
+        renamed.update((field, record[field]) for field in ROM_CONTENT_FIELDS if field in record)
+        return [renamed] if options['all_roms'] else renamed
+    
+    def _index_crcs(self, result):
+        """Add a result's records to the CRC index; call with the lock held"""
+        for record in (result if isinstance(result, list) else [result]):
+            if record and record.get('crc32'):
+                self.crc_index[(record['crc32'], ROM_LABEL_BYTES.get(record.get('romSize')))] = record
+    
+    def conditional_headers(self, url, options):
+        """Build If-None-Match/If-Modified-Since headers for a known archive"""
+        entry = self.get(url)
+        headers = {}
+        if not entry or entry.get('status') != 'done' or entry.get('options') != options:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+    
+    def record(self, zip_info, status, options=None, result=None, etag=None, last_modified=None, error=None):
+        """Append an entry for an archive and flush it to disk"""
+        entry = {
+            'url': zip_info['url'],
+            'filename': zip_info['filename'],
+            'size': zip_info.get('size'),
+            'date': zip_info.get('date'),
+            'status': status,
+            'etag': etag,
+            'last_modified': last_modified,
+            'options': options,
+            'result': result,
+            'error': error,
+            'updated': int(time.time())
+        }
+        
+        with self.lock:
+            previous = self.entries.get(entry['url'])
+            # Keep the validators from the previous fetch if this one has none
+            if previous and status == 'done':
+                entry['etag'] = entry['etag'] or previous.get('etag')
+                entry['last_modified'] = entry['last_modified'] or previous.get('last_modified')
+            self.entries[entry['url']] = entry
+            self.appended += 1
+            if self.crc_index is not None and status == 'done' and options == self.crc_options:
+                self._index_crcs(result)
+            if self.handle:
+                self.handle.write(json.dumps(entry, separators=(',', ':')) + '\n')
+                self.handle.flush()
+        return entry
+    
+    def failed(self):
+        """Return zip_info dicts for every archive that was given up on"""
+        with self.lock:
+            return [
+                {'url': e['url'], 'filename': e['filename'], 'size': e.get('size'), 'date': e.get('date')}
+                for e in self.entries.values() if e.get('status') == 'failed'
+            ]
+    
+    def known(self):
+        """Return zip_info dicts for every archive in the journal"""
+        with self.lock:
+            return [
+                {'url': e['url'], 'filename': e['filename'], 'size': e.get('size'), 'date': e.get('date')}
+                for e in self.entries.values()
+            ]
 
 
-def process_files_with_progress(zip_files, max_workers=8, calculate_checksums=True, 
-                                calculate_md5=False, process_all_roms=False):
-    """Process ZIP files in parallel with progress reporting"""
-    results = []
-    total_files = len(zip_files)
-    completed = 0
+class StreamingOutput:
+    """Streams records to an NDJSON sidecar and merges them into the final JSON
     
-    # Print initial message with cancel instructions
-    logger.info(f"Starting to process {total_files} files. Press Ctrl+C to cancel at any time.")
-    print(f"\n{'='*70}")
-    print(f" Processing {total_files} ROM files. Press Ctrl+C at any time to cancel.")
-    print(f"{'='*70}\n")
+    Records are appended to <output>.ndjson as soon as each archive finishes,
+    with an fsync'd checkpoint every checkpoint_interval seconds, so nothing is
+    held in memory during the crawl and an interruption keeps every finished
+    record. merge() writes the sorted JSON array to a temporary file and
+    renames it over the output, so readers never see a half-written file.
+    """
     
-    start_time = time.time()
-    last_update_time = start_time
-    update_interval = 2  # Update progress every 2 seconds
+    def __init__(self, output_path, checkpoint_interval=30):
+        self.output_path = output_path
+        self.sidecar_path = output_path + '.ndjson'
+        self.checkpoint_interval = checkpoint_interval
+        self.handle = None
+        self.count = 0
+        self.extensions = {}
+        # Set when the crawl feeding this output was cut short
+        self.interrupted = False
+        # Set by merge(skip_unchanged=True) when the output already had these records
+        self.unchanged = False
+        self.last_checkpoint = time.time()
+        self.lock = threading.Lock()
     
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all tasks and collect futures
-            future_to_zip = {
-                executor.submit(
-                    process_zip_file, 
-                    zip_info, 
-                    calculate_checksum=calculate_checksums,
-                    calculate_md5=calculate_md5,
-                    process_all_roms=process_all_roms
-                ): zip_info 
-                for zip_info in zip_files
-            }
-            
-            # Process results as they complete
-            for future in concurrent.futures.as_completed(future_to_zip):
-                zip_info = future_to_zip[future]
-                try:
-                    result = future.result()
-                    completed += 1
-                    
-                    # Report progress more frequently based on time rather than just count
-                    current_time = time.time()
-                    if (current_time - last_update_time >= update_interval) or (completed == total_files):
-                        last_update_time = current_time
-                        elapsed = current_time - start_time
-                        percent = completed / total_files * 100
-                        
-                        # Calculate ETA
-                        if completed > 0:
-                            avg_time_per_file = elapsed / completed
-                            eta = avg_time_per_file * (total_files - completed)
-                            eta_str = f"ETA: {int(eta // 60):02d}:{int(eta % 60):02d}"
-                        else:
-                            eta_str = "ETA: calculating..."
-                        
-                        # Format progress bar
-                        bar_length = 40
-                        filled_length = int(bar_length * completed // total_files)
-                        bar = '█' * filled_length + '░' * (bar_length - filled_length)
-                        
-                        # Print progress on a new line
-                        print(f"\r[{bar}] {completed}/{total_files} ({percent:.1f}%) - {eta_str}", end='', flush=True)
-                    
-                    if result:
-                        if isinstance(result, list):
-                            results.extend(result)
-                        else:
-                            results.append(result)
-                            
-                except Exception as e:
-                    logger.error(f"\nError processing {zip_info['filename']}: {e}")
-                    completed += 1
+    def open(self):
+        """Start a fresh sidecar for this run"""
+        self.handle = open(self.sidecar_path, 'w', encoding='utf-8')
+        return self
     
-    except KeyboardInterrupt:
-        print("\n\nProcess interrupted by user! Writing partial results...")
-        logger.warning("\nInterrupted by user. Writing partial results...")
-        return results
+    def write(self, record):
+        """Append one record, checkpointing to disk when one is due"""
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self.lock:
+            self.handle.write(line)
+            self.count += 1
+            ext = os.path.splitext(record.get("rom_filename", ""))[1].lower()
+            self.extensions[ext] = self.extensions.get(ext, 0) + 1
+            if time.time() - self.last_checkpoint >= self.checkpoint_interval:
+                self._checkpoint()
     
-    # Print final newline to ensure next log message starts on a new line
-    print("\n")
+    def checkpoint(self):
+        """Flush and fsync everything written so far"""
+        with self.lock:
+            self._checkpoint()
     
-    return results
+    def _checkpoint(self):
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+        self.last_checkpoint = time.time()
+    
+    def close(self):
+        with self.lock:
+            if self.handle:
+                self._checkpoint()
+                self.handle.close()
+                self.handle = None
+    
+    def merge(self, before_replace=None, skip_unchanged=False, preference=None):
+        """Write the sorted JSON array atomically and remove the sidecar
+        
+        Only the sort keys and line offsets are held in memory; records are
+        read back one at a time. Records are sorted by record_key(), so the
+        output doesn't depend on the order archives finished in, and is
+        byte-for-byte what json.dump(sorted_records, f, indent=2) would
+        produce. before_replace is called with the path of the finished
+        temporary file while the previous output is still in place. With
+        skip_unchanged, an output that already holds exactly these bytes is
+        left alone, mtime included, and unchanged is set. With preference (a
+        VariantPreference), records are grouped into games and get clusterId
+        and variantRank fields, and clusterTitles where a game has several
+        titles (see rom_clusters.py), replacing any they had.
+        """
+        self.close()
+        
+        # Same-named archives from the GB and GBC collections differ only in rom_filename
+        keys = []
+        clusters = ClusterBuilder(preference) if preference is not None else None
+        with open(self.sidecar_path, 'rb') as sidecar:
+            offset = 0
+            for line in sidecar:
+                if line.strip():
+                    record = json.loads(line)
+                    filename, rom_filename = record_key(record)
+                    keys.append((filename, rom_filename or '', len(keys), offset))
+                    if clusters is not None:
+                        clusters.add(record)
+                offset += len(line)
+        keys.sort()
+        assigned = clusters.assign() if clusters is not None else None
+        
+        temp_path = self.output_path + '.tmp'
+        with open(self.sidecar_path, 'rb') as sidecar, open(temp_path, 'w') as f:
+            if not keys:
+                f.write('[]')
+            else:
+                f.write('[\n')
+                for i, (_, _, row, offset) in enumerate(keys):
+                    sidecar.seek(offset)
+                    record = json.loads(sidecar.readline())
+                    if assigned is not None:
+                        set_cluster_fields(record, assigned[row])
+                    text = json.dumps(record, indent=2)
+                    f.write('  ' + text.replace('\n', '\n  '))
+                    f.write(',\n' if i < len(keys) - 1 else '\n')
+                f.write(']')
+            f.flush()
+            os.fsync(f.fileno())
+        
+        if skip_unchanged and os.path.exists(self.output_path) and filecmp.cmp(temp_path, self.output_path,
+                                                                                shallow=False):
+            os.unlink(temp_path)
+            os.unlink(self.sidecar_path)
+            self.unchanged = True
+            return len(keys)
+        
+        if before_replace is not None:
+            before_replace(temp_path)
+        os.replace(temp_path, self.output_path)
+        os.unlink(self.sidecar_path)
+        return len(keys)
 
 
-def load_config(config_file):
-    """Load configuration from a JSON file"""
-    try:
-        with open(config_file, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading config file {config_file}: {e}")
+# Changeset format read by applyRomDelta() in loadRomData.js
+CHANGESET_VERSION = 1
+
+
+def record_key(record):
+    """Identify a record across runs by its archive and ROM file names"""
+    return record["filename"], record.get("rom_filename")
+
+
+def js_order_key(key):
+    """A record_key() as JavaScript's < compares it, by UTF-16 code unit"""
+    filename, rom_filename = key
+    return filename.encode('utf-16-be'), (rom_filename or '').encode('utf-16-be')
+
+
+def replayed_keys(previous, changeset):
+    """Record keys in the order applyRomDelta() in loadRomData.js rebuilds them
+    
+    Kept records stay in their old order and added ones are merged in by
+    record key.
+    """
+    removed = {(entry['filename'], entry['rom_filename']) for entry in changeset['removed']}
+    kept = [record_key(record) for record in previous if record_key(record) not in removed]
+    added = sorted((record_key(entry['record']) for entry in changeset['added']), key=js_order_key)
+    keys = []
+    next_added = 0
+    for key in kept:
+        while next_added < len(added) and js_order_key(added[next_added]) < js_order_key(key):
+            keys.append(added[next_added])
+            next_added += 1
+        keys.append(key)
+    keys.extend(added[next_added:])
+    return keys
+
+
+def record_hash(record):
+    """Short content hash of a record that doesn't depend on key order"""
+    text = json.dumps(record, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def build_changeset(previous_raw, current_raw):
+    """Compare two rom-list.json files and describe the records that changed
+    
+    Records are matched on (filename, rom_filename). Added and changed
+    records are included in full with their hash, removed ones as their key
+    and old hash. Both files' SHA-256 are included so the bot only applies the
+    changeset on top of the exact database it has loaded. Returns None when
+    the files can't be compared record by record, or when applying the
+    changeset wouldn't rebuild the new file's row order: the bot's search
+    service results refer to rows of the new file.
+    """
+    previous = json.loads(previous_raw)
+    current = json.loads(current_raw)
+    
+    previous_hashes = {}
+    for record in previous:
+        previous_hashes[record_key(record)] = record_hash(record)
+    if len(previous_hashes) != len(previous):
+        logger.warning("Previous database has duplicate filename/rom_filename pairs, not writing a changeset")
         return None
+    
+    changeset = {
+        'version': CHANGESET_VERSION,
+        'base': {'sha256': hashlib.sha256(previous_raw).hexdigest(), 'count': len(previous)},
+        'target': {'sha256': hashlib.sha256(current_raw).hexdigest(), 'count': len(current)},
+        'added': [],
+        'changed': [],
+        'removed': []
+    }
+    seen = set()
+    for record in current:
+        key = record_key(record)
+        if key in seen:
+            logger.warning(f"Duplicate record for {key[0]} / {key[1]}, not writing a changeset")
+            return None
+        seen.add(key)
+        
+        digest = record_hash(record)
+        previous_digest = previous_hashes.pop(key, None)
+        if previous_digest is None:
+            changeset['added'].append({'hash': digest, 'record': record})
+        elif previous_digest != digest:
+            changeset['changed'].append({'hash': digest, 'record': record})
+    
+    for (filename, rom_filename), digest in previous_hashes.items():
+        changeset['removed'].append({'filename': filename, 'rom_filename': rom_filename, 'hash': digest})
+    
+    if replayed_keys(previous, changeset) != [record_key(record) for record in current]:
+        logger.warning("Records moved between the databases, not writing a changeset")
+        return None
+    return changeset
 
 
-def parse_arguments():
-    """Parse command line arguments"""
-    parser = argparse.ArgumentParser(description='Fetch and parse Game Boy ROM headers from No-Intro archives')
+def write_changeset(previous_path, current_path, changeset_path):
+    """Write the changeset from previous_path to current_path, or remove a stale one
     
-    parser.add_argument('--output', '-o', type=str, default='rom-list.json',
-                        help='Output JSON file (default: rom-list.json)')
+    Returns the changeset written, or None.
+    """
+    changeset = None
+    if os.path.exists(previous_path):
+        with open(previous_path, 'rb') as f:
+            previous_raw = f.read()
+        with open(current_path, 'rb') as f:
+            current_raw = f.read()
+        try:
+            changeset = build_changeset(previous_raw, current_raw)
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.warning(f"Could not compare with the previous database {previous_path}: {e}")
     
-    parser.add_argument('--threads', '-t', type=int, default=8,
-                        help='Number of concurrent download threads (default: 8)')
+    if changeset is None:
+        # An old changeset no longer leads to this file; the bot reloads in full
+        if os.path.exists(changeset_path):
+            os.unlink(changeset_path)
+        return None
     
-    parser.add_argument('--no-checksums', action='store_true',
-                        help='Skip header checksum verification')
+    write_atomically(changeset_path, json.dumps(changeset, separators=(',', ':')))
+    return changeset
+
+
+# Manifest format written next to each --shard output and read by merge_shards()
+SHARD_MANIFEST_VERSION = 1
+
+
+def shard_of(filename, shards):
+    """Stable shard number, from 1 to shards, for a record filename
     
-    parser.add_argument('--calculate-md5', action='store_true',
-                        help='Calculate MD5 hashes for each ROM (increases processing time)')
+    Every record from an archive has the same filename, so they all end up in
+    one shard. The hash doesn't depend on the mirror, the listing order or
+    the Python process.
+    """
+    digest = hashlib.sha1(filename.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shards + 1
+
+
+class Shard:
+    """The slice of the archive list crawled with --shard K/N
     
-    parser.add_argument('--process-all-roms', action='store_true',
-                        help='Process all ROMs in multi-ROM ZIP files (not just the first one)')
+    select() is given every archive as it is discovered. It keeps the ones
+    this shard owns and remembers the rest of the listing too, so
+    merge_shards() can check that every shard crawled the same archives.
+    """
     
-    parser.add_argument('--include-bios', action='store_true',
-                        help='Include BIOS files in processing')
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+        self.listed = set()
+        self.assigned = 0
+        # Set instead of the discovered listing when the archives come from the journal
+        self.listing = None
+        self.lock = threading.Lock()
     
-    parser.add_argument('--verbose', '-v', action='store_true',
-                        help='Enable verbose logging')
+    @classmethod
+    def parse(cls, text):
+        """Parse K/N, counting K from 1, for argparse"""
+        try:
+            index, count = (int(part) for part in text.split('/'))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected K/N such as 1/4, not '{text}'")
+        if not 1 <= index <= count:
+            raise argparse.ArgumentTypeError(f"shard {text} is out of range, K must be from 1 to N")
+        return cls(index, count)
     
-    parser.add_argument('--no-private', action='store_true',
-                        help='Skip private collections')
+    def __str__(self):
+        return f"{self.index}/{self.count}"
     
-    parser.add_argument('--config', '-c', type=str,
-                        help='Path to config JSON file with custom URLs')
+    def owns(self, filename):
+        return shard_of(os.path.splitext(filename)[0], self.count) == self.index
     
-    return parser.parse_args()
+    def select(self, zip_info):
+        """Note an archive from the listing and return whether this shard crawls it"""
+        filename = os.path.splitext(zip_info['filename'])[0]
+        owned = shard_of(filename, self.count) == self.index
+        with self.lock:
+            self.listed.add(filename)
+            if owned:
+                self.assigned += 1
+        return owned
+    
+    def manifest(self, output_sha256, records, complete, failed=None):
+        """Describe this shard's output for merge_shards()"""
+        listing = self.listing
+        if listing is None:
+            names = '\n'.join(sorted(self.listed)).encode('utf-8')
+            listing = {'sha256': hashlib.sha256(names).hexdigest(), 'count': len(self.listed)}
+        return {
+            'version': SHARD_MANIFEST_VERSION,
+            'shard': self.index,
+            'shards': self.count,
+            'sha256': output_sha256,
+            'records': records,
+            'archives': self.assigned,
+            'listing': listing,
+            'complete': complete,
+            'failed': failed
+        }
 
 
-def main():
-    """Main function to coordinate the fetching and processing of ROM data"""
-    # Parse command line arguments
-    args = parse_arguments()
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def merge_shards(paths, output):
+    """Stream the records of every --shard output into output, checking they add up
     
-    # Set logging level based on verbosity
-    if args.verbose:
-        logger.setLevel(logging.DEBUG)
+    Each path needs the .manifest its run wrote next to it. The shards must
+    all be from the same split, present once each, finished, and built from
+    the same directory listing. Every record must be in the shard its
+    filename hashes to, and no filename/rom_filename pair may appear in more
+    than one shard. Records are written in shard order, so merging output
+    gives the file a single run would have written. Returns the list of
+    problems found; nothing is written to output unless it is empty.
+    """
+    problems = []
+    shards = {}
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            with open(path + '.manifest', 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            problems.append(f"Cannot read shard {path}: {e}")
+            continue
+        
+        if manifest.get('version') != SHARD_MANIFEST_VERSION:
+            problems.append(f"{path}.manifest has an unknown version: {manifest.get('version')}")
+            continue
+        label = f"{manifest['shard']}/{manifest['shards']}"
+        if hashlib.sha256(raw).hexdigest() != manifest['sha256']:
+            problems.append(f"Shard {label} in {path} doesn't match its manifest; it was changed or cut short")
+            continue
+        if manifest['shard'] in shards:
+            problems.append(f"Shard {label} was given twice: {shards[manifest['shard']][0]} and {path}")
+            continue
+        if not manifest['complete']:
+            problems.append(f"Shard {label} in {path} was interrupted after {manifest['records']} records")
+        if manifest['failed']:
+            logger.warning(f"Shard {label} gave up on {len(manifest['failed'])} archives, e.g. "
+                           f"{manifest['failed'][0]}; rerun it with --retry-failed to fill them in")
+        shards[manifest['shard']] = (path, manifest, raw)
     
-    # Print banner
-    print("\n================================")
-    print("  GB ROM Database Builder")
-    print("================================\n")
+    counts = {manifest['shards'] for _, manifest, _ in shards.values()}
+    if len(counts) > 1:
+        problems.append(f"Shards come from different splits: N is {', '.join(str(n) for n in sorted(counts))}")
+        return problems
     
-    # Define URLs to fetch based on arguments or config file
-    if args.config:
-        config = load_config(args.config)
-        if config and 'urls' in config:
-            urls = config['urls']
-            logger.info(f"Loaded {len(urls)} URLs from config file")
-        else:
-            logger.error("Invalid config file or missing 'urls' key")
-            return
-    else:
-        # Default URLs
-        base_urls = [
-            "https://myrient.erista.me/files/No-Intro/Nintendo%20-%20Game%20Boy/",
-            "https://myrient.erista.me/files/No-Intro/Nintendo%20-%20Game%20Boy%20Color/"
-        ]
+    if counts:
+        count = counts.pop()
+        missing = [f"{index}/{count}" for index in range(1, count + 1) if index not in shards]
+        if missing:
+            problems.append(f"Missing shards: {', '.join(missing)}")
         
-        private_urls = [
-            "https://myrient.erista.me/files/No-Intro/Nintendo%20-%20Game%20Boy%20(Private)/",
-            "https://myrient.erista.me/files/No-Intro/Nintendo%20-%20Game%20Boy%20Color%20(Private)/"
-        ]
+        listings = {}
+        for index, (_, manifest, _) in sorted(shards.items()):
+            listings.setdefault(manifest['listing']['sha256'], []).append(f"{index}/{count}")
+        if len(listings) > 1:
+            groups = '; '.join(', '.join(labels) for labels in listings.values())
+            problems.append(f"Shards saw different directory listings ({groups}), so some archives may be "
+                            f"in no shard or in two; rerun them against the same listing")
+    
+    owners = {}
+    shard_records = []
+    for index, (path, manifest, raw) in sorted(shards.items()):
+        try:
+            records = json.loads(raw)
+        except json.JSONDecodeError as e:
+            problems.append(f"Cannot parse shard {index}/{count} in {path}: {e}")
+            continue
         
-        urls = base_urls if args.no_private else base_urls + private_urls
+        for record in records:
+            key = record_key(record)
+            if owners.get(key, index) != index:
+                problems.append(f"Duplicate record {key[0]} / {key[1]} in shards {owners[key]}/{count} "
+                                f"and {index}/{count}")
+                continue
+            owners[key] = index
+            expected = shard_of(record["filename"], count)
+            if expected != index:
+                problems.append(f"{key[0]} / {key[1]} is in shard {index}/{count} but belongs to shard "
+                                f"{expected}/{count}")
+        shard_records.append(records)
     
-    try:
-        # Fetch directory listings
-        print("\nFetching directory listings... (This may take a minute)")
-        zip_files = fetch_directory_listings(urls, skip_bios=not args.include_bios)
-        print(f"\nFound {len(zip_files)} total ZIP files\n")
-        
-        # Set up a handler for clean cancellation
-        import signal
-        def signal_handler(sig, frame):
-            print("\n\nProcess interrupted by user. Writing partial results...")
-            sys.exit(1)
-        
-        signal.signal(signal.SIGINT, signal_handler)
-        
-        # Process ZIP files in parallel with progress reporting
-        print("Processing ZIP files (press Ctrl+C at any time to cancel and save partial results)...")
-        results = process_files_with_progress(
-            zip_files, 
-            max_workers=args.threads,
-            calculate_checksums=not args.no_checksums,
-            calculate_md5=args.calculate_md5,
-            process_all_roms=args.process_all_roms
-        )
-        
-        # Sort results by filename for deterministic output
-        results.sort(key=lambda x: x["filename"])
-        
-        # Write results to JSON file
-        print(f"\nWriting {len(results)} records to {args.output}")
-        with open(args.output, "w") as f:
-            json.dump(results, f, indent=2)
-        
-        print(f"\nDone! ROM data written to {args.output}")
-        
-        # Print some stats
-        rom_types = {}
-        for rom in results:
-            ext = os.path.splitext(rom.get("rom_filename", ""))[1].lower()
-            rom_types[ext] = rom_types.get(ext, 0) + 1
-        
-        print("\nDatabase Statistics:")
-        print(f"  Total ROMs: {len(results)}")
-        for ext, count in rom_types.items():
-            print(f"  {ext} files: {count}")
+    if not problems:
+        for records in shard_records:
+            for record in records:
+                output.write(record)
+    return problems
+
+
+# Timing of the archive being processed by the current thread or asyncio
+# task, or None when nothing is being measured
+current_timing = contextvars.ContextVar('current_timing', default=None)
+
+
+class ArchiveTiming:
+    """Seconds, bytes and retries spent fetching and parsing one archive"""
     
-    except KeyboardInterrupt:
-        print("\nProcess interrupted by user")
-        # Results will be written from the process_files_with_progress function
+    __slots__ = ('requests', 'connect', 'ttfb', 'transfer', 'bytes', 'unzip', 'checksum', 'parse', 'retries',
+                 'outcome')
     
-    except Exception as e:
+    def __init__(self):
+        self.requests = 0
+        self.connect = 0.0
+        self.ttfb = 0.0
+        self.transfer = 0.0
+        self.bytes = 0
+        self.unzip = 0.0
+        self.checksum = 0.0
+        self.parse = 0.0
+        self.retries = 0
+        self.outcome = None
+    
+    def merge_parse(self, other):
+        """Add the parse-side timings measured in a worker"""
+        self.unzip += other.unzip
+        self.checksum += other.checksum
+        self.parse += other.parse
+
+
+def add_timing(field, value):
+    """Add to a field of the current ArchiveTiming, if one is being measured"""
+    timing = current_timing.get()
+    if timing is not None:
+        setattr(timing, field, getattr(timing, field) + value)
+
+
+def timed(func, *args, **kwargs):
+    """Run func under a fresh ArchiveTiming and return (result, timing)
+    
+    Used for parses in worker processes and executors, whose timings are
+    sent back and merged into the archive's own ArchiveTiming.
+    """
+    timing = ArchiveTiming()
+    token = current_timing.set(timing)
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        timing.parse = time.perf_counter() - start
+        current_timing.reset(token)
+    return result, timing
+
+
+def run_measured(metrics, func, *args, **kwargs):
+    """Call func with a fresh ArchiveTiming as the current one and hand it to metrics"""
+    if metrics is None:
+        return func(*args, **kwargs)
+    timing = ArchiveTiming()
+    token = current_timing.set(timing)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        current_timing.reset(token)
+        metrics.observe(timing)
+
+
+class Histogram:
+    """All observations of one per-archive metric
+    
+    Values are kept so the JSON summary can report exact percentiles; the
+    Prometheus export folds them into cumulative buckets.
+    """
+    
+    def __init__(self, help_text, buckets):
+        self.help_text = help_text
+        self.buckets = buckets
+        self.values = []
+    
+    def observe(self, value):
+        self.values.append(value)
+    
+    def summary(self):
+        values = sorted(self.values)
+        if not values:
+            return {'count': 0, 'sum': 0}
+        
+        def percentile(q):
+            return values[min(len(values) - 1, int(q * len(values)))]
+        
+        return {
+            'count': len(values),
+            'sum': round(sum(values), 6),
+            'mean': round(sum(values) / len(values), 6),
+            'p50': round(percentile(0.5), 6),
+            'p90': round(percentile(0.9), 6),
+            'p99': round(percentile(0.99), 6),
+            'max': round(values[-1], 6)
+        }
+    
+    def prometheus(self, name):
+        values = sorted(self.values)
+        lines = [f"# HELP {name} {self.help_text}", f"# TYPE {name} histogram"]
+        for bound in self.buckets:
+            lines.append(f'{name}_bucket{{le="{bound}"}} {bisect.bisect_right(values, bound)}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {len(values)}')
+        lines.append(f"{name}_sum {sum(values):.6f}")
+        lines.append(f"{name}_count {len(values)}")
+        return lines
+
+
+def peak_rss():
+    """Peak resident memory of this process and of its largest child, in bytes
+    
+    Returns None where the resource module isn't available.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+class RunMetrics:
+    """Aggregates per-archive timings into histograms for a run
+    
+    write() saves a JSON summary and/or a Prometheus textfile (for
+    node_exporter's textfile collector), each replaced atomically. With a
+    snapshot_interval both are also rewritten during the run, at most that
+    often, as archives finish.
+    """
+    
+    PREFIX = 'gb_rom_fetch'
+    TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    BYTE_BUCKETS = (4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+    RETRY_BUCKETS = (0, 1, 2, 3, 5)
+    
+    def __init__(self, json_path=None, textfile_path=None, snapshot_interval=None):
+        self.json_path = json_path
+        self.textfile_path = textfile_path
+        self.snapshot_interval = snapshot_interval
+        self.started = time.time()
+        self.last_snapshot = self.started
+        self.outcomes = {}
+        self.lock = threading.Lock()
+        self.histograms = {
+            'connect_seconds': Histogram('Time spent opening connections per downloaded archive', self.TIME_BUCKETS),
+            'first_byte_seconds': Histogram('Time from sending requests to their response headers per downloaded archive',
+                                            self.TIME_BUCKETS),
+            'transfer_seconds': Histogram('Time spent reading response bodies per downloaded archive', self.TIME_BUCKETS),
+            'downloaded_bytes': Histogram('Bytes downloaded per archive', self.BYTE_BUCKETS),
+            'unzip_seconds': Histogram('Time spent decompressing ROMs per parsed archive', self.TIME_BUCKETS),
+            'checksum_seconds': Histogram('Time spent on checksums and hashes per parsed archive', self.TIME_BUCKETS),
+            'parse_seconds': Histogram('Total parse time per parsed archive', self.TIME_BUCKETS),
+            'retries': Histogram('Retries per fetched archive', self.RETRY_BUCKETS)
+        }
+    
+    def observe(self, timing):
+        """Record one finished archive"""
+        with self.lock:
+            outcome = timing.outcome or 'failed'
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            
+            # Journal hits never touch the network or the parser
+            if timing.requests:
+                self.histograms['connect_seconds'].observe(timing.connect)
+                self.histograms['first_byte_seconds'].observe(timing.ttfb)
+                self.histograms['transfer_seconds'].observe(timing.transfer)
+                self.histograms['downloaded_bytes'].observe(timing.bytes)
+            if timing.parse:
+                self.histograms['unzip_seconds'].observe(timing.unzip)
+                self.histograms['checksum_seconds'].observe(timing.checksum)
+                self.histograms['parse_seconds'].observe(timing.parse)
+            if outcome != 'cached':
+                self.histograms['retries'].observe(timing.retries)
+            
+            if self.snapshot_interval and time.time() - self.last_snapshot >= self.snapshot_interval:
+                self.last_snapshot = time.time()
+                self._write()
+    
+    def totals(self):
+        """Summed time per activity across all archives"""
+        return {name: sum(histogram.values) for name, histogram in self.histograms.items()}
+    
+    def summary(self):
+        totals = self.totals()
+        network = totals['connect_seconds'] + totals['first_byte_seconds'] + totals['transfer_seconds']
+        cpu = totals['unzip_seconds'] + totals['checksum_seconds']
+        return {
+            'startedAt': datetime.datetime.fromtimestamp(self.started, datetime.timezone.utc).isoformat(timespec='seconds'),
+            'elapsedSeconds': round(time.time() - self.started, 3),
+            'archives': dict(sorted(self.outcomes.items())),
+            'networkSeconds': round(network, 3),
+            'parseSeconds': round(cpu, 3),
+            'downloadedBytes': int(totals['downloaded_bytes']),
+            'retries': int(totals['retries']),
+            'peakRssBytes': (peak_rss() or (None,))[0],
+            'histograms': {name: histogram.summary() for name, histogram in self.histograms.items()}
+        }
+    
+    def prometheus(self):
+        lines = [
+            f"# HELP {self.PREFIX}_archives_total Archives finished in the current run by outcome",
+            f"# TYPE {self.PREFIX}_archives_total counter"
+        ]
+        for outcome, count in sorted(self.outcomes.items()):
+            lines.append(f'{self.PREFIX}_archives_total{{outcome="{outcome}"}} {count}')
+        for name, histogram in self.histograms.items():
+            lines.extend(histogram.prometheus(f"{self.PREFIX}_{name}"))
+        lines.extend([
+            f"# HELP {self.PREFIX}_run_duration_seconds Wall time of the current run so far",
+            f"# TYPE {self.PREFIX}_run_duration_seconds gauge",
+            f"{self.PREFIX}_run_duration_seconds {time.time() - self.started:.3f}",
+            f"# HELP {self.PREFIX}_last_update_timestamp_seconds When these metrics were written",
+            f"# TYPE {self.PREFIX}_last_update_timestamp_seconds gauge",
+            f"{self.PREFIX}_last_update_timestamp_seconds {time.time():.0f}"
+        ])
+        rss = peak_rss()
+        if rss is not None:
+            lines.extend([
+                f"# HELP {self.PREFIX}_peak_rss_bytes Peak resident memory of the crawler process",
+                f"# TYPE {self.PREFIX}_peak_rss_bytes gauge",
+                f"{self.PREFIX}_peak_rss_bytes {rss[0]}"
+            ])
+        return '\n'.join(lines) + '\n'
+    
+    def write(self):
+        """Write the JSON summary and Prometheus textfile, when paths were given"""
+        with self.lock:
+            self._write()
+    
+    def _write(self):
+        if self.json_path:
+            write_atomically(self.json_path, json.dumps(self.summary(), indent=2) + '\n')
+        if self.textfile_path:
+            write_atomically(self.textfile_path, self.prometheus())
+    
+    def report(self):
+        """A few lines saying where the run's time went"""
+        totals = self.totals()
+        network = totals['connect_seconds'] + totals['first_byte_seconds'] + totals['transfer_seconds']
+        cpu = totals['unzip_seconds'] + totals['checksum_seconds']
+        lines = [
+            f"  Network: {network:.1f}s across archives (connect {totals['connect_seconds']:.1f}s, "
+            f"first byte {totals['first_byte_seconds']:.1f}s, transfer {totals['transfer_seconds']:.1f}s), "
+            f"{totals['downloaded_bytes'] / 2**20:.1f} MiB downloaded",
+            f"  Parsing: {cpu:.1f}s across archives (unzip {totals['unzip_seconds']:.1f}s, "
+            f"checksums {totals['checksum_seconds']:.1f}s)",
+            f"  Retries: {int(totals['retries'])}"
+        ]
+        if network or cpu:
+            lines.append(f"  Mostly {'network' if network >= cpu else 'CPU'}-bound "
+                         f"({max(network, cpu) / (network + cpu) * 100:.0f}% of measured time)")
+        rss = peak_rss()
+        if rss is not None:
+            line = f"  Peak memory: {rss[0] / 2**20:.0f} MiB"
+            if rss[1]:
+                line += f" (largest child process {rss[1] / 2**20:.0f} MiB)"
+            lines.append(line)
+        return lines
+
+
+def write_atomically(path, text):
+    """Replace a file with new contents via a temporary file and rename"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+# ROM header size, and the ranges used by the header and global checksums:
+# the header checksum covers 0x134-0x14C and the global checksum lives at 0x14E-0x14F
+HEADER_SIZE = 0x150
+HEADER_CHECKSUM_START = 0x134
+HEADER_CHECKSUM_END = 0x14D
+GLOBAL_CHECKSUM_OFFSET = 0x14E
+# Below this size NumPy's call overhead outweighs its faster summing
+NUMPY_MIN_SUM_SIZE = 4096
+
+
+def byte_sum(data):
+    """Sum every byte of a buffer in C rather than in a Python loop"""
+    if numpy is not None and len(data) >= NUMPY_MIN_SUM_SIZE:
+        return int(numpy.frombuffer(data, dtype=numpy.uint8).sum(dtype=numpy.uint64))
+    if isinstance(data, (bytes, bytearray)):
+        # Iterating bytes directly is the fastest pure-stdlib path
+        return sum(data)
+    # mmap and other buffer objects don't iterate as ints, so view them as bytes
+    return sum(memoryview(data).cast('B'))
+
+
+def calculate_header_checksum(header_bytes):
+    """Calculate the header checksum for validation"""
+    # x = x - byte - 1 over the 25 header bytes is -(sum + 25) modulo 256
+    header = memoryview(header_bytes)[HEADER_CHECKSUM_START:HEADER_CHECKSUM_END]
+    return -(byte_sum(header) + len(header)) & 0xFF
+
+
+def calculate_global_checksum(rom_data):
+    """Calculate the global checksum for validation"""
+    # The global checksum is the 16-bit sum of all bytes except the 2 checksum bytes
+    checksum = byte_sum(rom_data)
+    checksum -= sum(memoryview(rom_data)[GLOBAL_CHECKSUM_OFFSET:GLOBAL_CHECKSUM_OFFSET + 2])
+    return checksum & 0xFFFF
+
+
+def calculate_header_checksums(header_buffers):
+    """Calculate header checksums for a batch of headers"""
+    header_buffers = list(header_buffers)
+    if numpy is not None and header_buffers:
+        # Stack the 25-byte ranges into one 2-D array and sum each row at once
+        rows = numpy.frombuffer(
+            b''.join(bytes(memoryview(h)[HEADER_CHECKSUM_START:HEADER_CHECKSUM_END]) for h in header_buffers),
+            dtype=numpy.uint8
+        ).reshape(len(header_buffers), HEADER_CHECKSUM_END - HEADER_CHECKSUM_START)
+        sums = rows.sum(axis=1, dtype=numpy.int64) + rows.shape[1]
+        return [int(x) for x in (-sums) & 0xFF]
+    return [calculate_header_checksum(h) for h in header_buffers]
+
+
+def calculate_global_checksums(rom_buffers):
+    """Calculate global checksums for a batch of ROM images"""
+    return [calculate_global_checksum(rom_data) for rom_data in rom_buffers]
+
+
+def calculate_md5(data):
+    """Calculate MD5 hash for data"""
+    return hashlib.md5(data).hexdigest()
+
+
+# Decompressed bytes read per step when streaming a ROM through RomDigest
+DIGEST_CHUNK_SIZE = 64 * 1024
+
+
+class RomDigest:
+    """Single-pass accumulator for a ROM's header, global checksum and hashes
+    
+    ROM data is fed in chunks, so memory use stays at one chunk plus the hash
+    states no matter how large the ROM is.
+    """
+    
+    def __init__(self, calculate_checksum=True, calculate_md5=False, calculate_sha1=False, calculate_crc32=False):
+        self.calculate_checksum = calculate_checksum
+        self.header = bytearray()
+        self.size = 0
+        self.byte_total = 0
+        self.md5 = hashlib.md5() if calculate_md5 else None
+        self.sha1 = hashlib.sha1() if calculate_sha1 else None
+        self.crc32 = 0 if calculate_crc32 else None
+    
+    def update(self, chunk):
+        """Feed the next chunk of ROM data"""
+        if len(self.header) < HEADER_SIZE:
+            self.header += chunk[:HEADER_SIZE - len(self.header)]
+        self.size += len(chunk)
+        if self.calculate_checksum:
+            self.byte_total += byte_sum(chunk)
+        if self.md5 is not None:
+            self.md5.update(chunk)
+        if self.sha1 is not None:
+            self.sha1.update(chunk)
+        if self.crc32 is not None:
+            self.crc32 = zlib.crc32(chunk, self.crc32)
+    
+    def read_from(self, stream, chunk_size=DIGEST_CHUNK_SIZE):
+        """Consume a file-like object chunk by chunk"""
+        # Reading is where a ZIP member gets inflated, so time it apart from hashing
+        read_time = 0.0
+        update_time = 0.0
+        while True:
+            started = time.perf_counter()
+            chunk = stream.read(chunk_size)
+            read = time.perf_counter()
+            read_time += read - started
+            if not chunk:
+                break
+            self.update(chunk)
+            update_time += time.perf_counter() - read
+        add_timing('unzip', read_time)
+        add_timing('checksum', update_time)
+        return self
+    
+    def needs_data(self):
+        """Whether anything beyond the header has to be read"""
+        return self.calculate_checksum or self.md5 is not None or self.sha1 is not None or self.crc32 is not None
+    
+    def global_checksum(self):
+        """Return the calculated global checksum (excluding its own two bytes)"""
+        checksum_bytes = self.header[GLOBAL_CHECKSUM_OFFSET:GLOBAL_CHECKSUM_OFFSET + 2]
+        return (self.byte_total - sum(checksum_bytes)) & 0xFFFF
+    
+    def hashes(self):
+        """Return the requested hashes keyed by their record field name"""
+        hashes = {}
+        if self.md5 is not None:
+            hashes["md5"] = self.md5.hexdigest()
+        if self.sha1 is not None:
+            hashes["sha1"] = self.sha1.hexdigest()
+        if self.crc32 is not None:
+            hashes["crc32"] = f"{self.crc32:08x}"
+        return hashes
+
+
+def build_rom_record(filename, rom_filename, header_bytes, digest=None, hashes=None):
+    """Decode a ROM header into the JSON record written to rom-list.json
+    
+    digest is the RomDigest the whole ROM was streamed through and supplies
+    the checksum validation and hashes; header-only reads pass None. hashes
+    holds hash fields known without reading the ROM (see known_hashes).
+    """
+    header = RomHeader.from_bytes(header_bytes)
+    
+    # Build JSON object in the required format
+    result = {
+        "filename": os.path.splitext(filename)[0],  # Remove .zip extension
+        "rom_filename": rom_filename,
+        "title": header.title,
+        "cgbFlag": header.cgb_support,
+        "sgbFlag": header.sgb_support,
+        "region": header.region,
+        "version": header.version,
+        "romSize": header.rom_size_label,
+        "ramSize": header.ram_size_label,
+        "hasRam": header.has_ram,
+        "mapper": header.mapper,
+        "hasTimer": header.has_timer,
+        "hasRumble": header.has_rumble,
+        "hasBattery": header.has_battery,
+        "headerChecksum": header.header_checksum,
+        "globalChecksum": header.global_checksum
+    }
+    
+    # Add validation info if checksums were calculated; the global checksum
+    # needs the whole ROM
+    if digest is not None and digest.calculate_checksum:
+        result["headerChecksumValid"] = header.header_checksum_valid
+        result["globalChecksumValid"] = digest.global_checksum() == header.global_checksum
+    
+    # Add MD5/SHA-1/CRC32 hashes, whether calculated or looked up
+    known = dict(hashes or {})
+    if digest is not None:
+        known.update(digest.hashes())
+    for field in HASH_FIELDS:
+        if field in known:
+            result[field] = known[field]
+    
+    return result
+
+
+def select_rom_members(infolist, filename, process_all_roms=False):
+    """Pick the .gb/.gbc members of an archive that should be parsed"""
+    # Find all .gb or .gbc files in the ZIP
+    rom_files = [
+        file_info for file_info in infolist
+        if file_info.filename.lower().endswith(('.gb', '.gbc'))
+    ]
+    
+    if not rom_files:
+        logger.warning(f"No ROM files found in {filename}")
+        return []
+    
+    # Check if we have multiple ROMs and log accordingly
+    if len(rom_files) > 1 and not process_all_roms:
+        logger.warning(f"Multiple ROM files found in {filename}, using only the first one")
+        rom_files = rom_files[:1]
+    
+    return rom_files
+
+
+def finalize_results(results, process_all_roms=False):
+    """Return the single result or list of results"""
+    if not results:
+        return None
+    if process_all_roms:
+        return results
+    return results[0]
+
+
+# Hash fields in the order they appear in a record
+HASH_FIELDS = ('md5', 'sha1', 'crc32')
+
+# Record fields that come from the ROM's contents rather than its names, in record order
+ROM_CONTENT_FIELDS = ('title', 'cgbFlag', 'sgbFlag', 'region', 'version', 'romSize', 'ramSize', 'hasRam', 'mapper',
+                      'hasTimer', 'hasRumble', 'hasBattery', 'headerChecksum', 'globalChecksum',
+                      'headerChecksumValid', 'globalChecksumValid') + HASH_FIELDS
+
+# Size in bytes of each romSize label, to compare a record with a DAT entry
+ROM_LABEL_BYTES = {ROM_SIZES[code]: size for code, size in ROM_SIZE_BYTES.items()}
+
+
+class RomDat:
+    """ROM index loaded from No-Intro DAT files (Logiqx XML)
+    
+    Entries are keyed by CRC32 and size, the pair DAT tools identify a dump
+    by, and grouped by game name, which is what No-Intro archives are named.
+    """
+    
+    def __init__(self):
+        self.roms = {}
+        self.games = {}
+        self.names = {}
+    
+    @classmethod
+    def load(cls, paths):
+        """Build one index from several DAT files (e.g. Game Boy and Game Boy Color)"""
+        dat = cls()
+        for path in paths:
+            dat.add_file(path)
+        return dat
+    
+    def add_file(self, path):
+        """Read a DAT, either bare or zipped the way No-Intro distributes them"""
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                members = [info for info in archive.infolist() if info.filename.lower().endswith(('.dat', '.xml'))]
+                if not members:
+                    raise ValueError(f"no .dat file inside {path}")
+                count = 0
+                for info in members:
+                    with archive.open(info) as f:
+                        count += self.add_stream(f)
+        else:
+            with open(path, 'rb') as f:
+                count = self.add_stream(f)
+        logger.info(f"Loaded {count} ROMs from DAT {path}")
+    
+    def add_stream(self, stream):
+        """Index every <rom> of every <game> in a Logiqx XML stream"""
+        count = 0
+        for _, element in xml.etree.ElementTree.iterparse(stream):
+            if element.tag not in ('game', 'machine'):
+                continue
+            game = element.get('name')
+            for rom in element.iter('rom'):
+                try:
+                    entry = {
+                        'game': game,
+                        'name': rom.get('name'),
+                        'size': int(rom.get('size')),
+                        'crc': int(rom.get('crc'), 16),
+                        'md5': (rom.get('md5') or '').lower() or None,
+                        'sha1': (rom.get('sha1') or '').lower() or None
+                    }
+                except (TypeError, ValueError):
+                    # "nodump" entries have no size or CRC to match on
+                    continue
+                self.roms.setdefault((entry['crc'], entry['size']), entry)
+                self.games.setdefault(game, []).append(entry)
+                self.names[entry['name']] = entry
+                count += 1
+            element.clear()
+        return count
+    
+    def match(self, crc, size):
+        """Return the DAT entry for a ROM with this CRC32 and size, if any"""
+        return self.roms.get((crc, size))
+    
+    def game_roms(self, game):
+        """Return the .gb/.gbc entries of a game, in DAT order"""
+        return [rom for rom in self.games.get(game, []) if rom['name'].lower().endswith(('.gb', '.gbc'))]
+    
+    def __len__(self):
+        return len(self.roms)
+
+
+# DAT loaded with --dat; worker processes receive it through use_dat()
+rom_dat = None
+
+
+def use_dat(dat):
+    """Make a RomDat the one hash lookups use (also a process pool initializer)"""
+    global rom_dat
+    rom_dat = dat
+
+
+def known_hashes(crc, size, rom_filename, filename, calculate_md5=False, calculate_sha1=False,
+                 calculate_crc32=False):
+    """Hash fields for a ROM whose CRC32 and size are already known
+    
+    For ZIP members both come from the central directory, so the CRC32 is
+    free. With a DAT loaded, a ROM it lists by CRC32 and size also gets its
+    MD5 and SHA-1 from there. A ROM the DAT doesn't list is logged, since
+    it isn't a verified dump, and the caller calculates what is missing.
+    """
+    hashes = {}
+    if calculate_crc32:
+        hashes['crc32'] = f"{crc:08x}"
+    if rom_dat is None:
+        return hashes
+    
+    entry = rom_dat.match(crc, size)
+    if entry is None:
+        expected = rom_dat.names.get(os.path.basename(rom_filename))
+        if expected:
+            logger.warning(f"{rom_filename} in {filename} doesn't match the DAT "
+                           f"(CRC32 {crc:08x}, expected {expected['crc']:08x})")
+        else:
+            logger.debug(f"{rom_filename} in {filename} isn't in the DAT (CRC32 {crc:08x})")
+        return hashes
+    
+    if calculate_md5 and entry['md5']:
+        hashes['md5'] = entry['md5']
+    if calculate_sha1 and entry['sha1']:
+        hashes['sha1'] = entry['sha1']
+    return hashes
+
+
+# libretro-thumbnails repositories the bot shows box art from, pinned to
+# the same commits as GB_SHA and GBC_SHA in handlers/search.js
+THUMBNAIL_REPOSITORIES = (
+    ('gb', 'Nintendo_-_Game_Boy', '9db991096041e2c3476556cb6bd0810cdf1b5a93'),
+    ('gbc', 'Nintendo_-_Game_Boy_Color', '2c54e12ed7d9acd3124497bf5a9b107ab69d0d41')
+)
+THUMBNAIL_DIRECTORY = 'Named_Boxarts'
+THUMBNAIL_URL = 'https://raw.githubusercontent.com/libretro-thumbnails/{repository}/{sha}/{directory}/{name}'
+GITHUB_TREE_URL = 'https://api.github.com/repos/libretro-thumbnails/{repository}/git/trees/{sha}'
+
+# Characters libretro replaces with '_' in thumbnail file names
+THUMBNAIL_UNSAFE_CHARS = re.compile(r'[&*/:`<>?\\|"]')
+ROM_FILE_EXTENSION = re.compile(r'\.(gb|gbc)$', re.IGNORECASE)
+
+
+class BoxArtIndex:
+    """Box art file names in the pinned libretro-thumbnails repositories
+    
+    Built once per run, from local checkouts or from the GitHub tree API, so
+    each record can carry its thumbnail URL (or None) and the bot doesn't
+    have to probe raw.githubusercontent.com for every result it shows.
+    """
+    
+    def __init__(self, names):
+        # {'gb': set of file names, 'gbc': ...}
+        self.names = names
+    
+    @classmethod
+    def load(cls, source):
+        """source is 'github' or a directory holding the repository checkouts"""
+        if source == 'github':
+            return cls.from_github()
+        return cls.from_directory(source)
+    
+    @classmethod
+    def from_directory(cls, root):
+        """Read <root>/<repository>/Named_Boxarts, as in a clone of each repository"""
+        names = {}
+        for console, repository, sha in THUMBNAIL_REPOSITORIES:
+            checkout = os.path.join(root, repository)
+            directory = os.path.join(checkout, THUMBNAIL_DIRECTORY)
+            if not os.path.isdir(directory):
+                raise ValueError(f"{directory} not found; expected a checkout of libretro-thumbnails/{repository}")
+            head = git_head(checkout)
+            if head is not None and head != sha:
+                logger.warning(f"{checkout} is at {head[:12]}, not the pinned {sha[:12]}; "
+                               f"box art that differs between them may be missing or broken")
+            names[console] = {name for name in os.listdir(directory) if name.lower().endswith('.png')}
+            logger.info(f"Found {len(names[console])} box art images in {directory}")
+        return cls(names)
+    
+    @classmethod
+    def from_github(cls):
+        """List Named_Boxarts at the pinned commits through the GitHub tree API"""
+        names = {}
+        for console, repository, sha in THUMBNAIL_REPOSITORIES:
+            root = github_tree(GITHUB_TREE_URL.format(repository=repository, sha=sha))
+            directory = next((entry for entry in root['tree']
+                              if entry['path'] == THUMBNAIL_DIRECTORY and entry['type'] == 'tree'), None)
+            if directory is None:
+                raise ValueError(f"libretro-thumbnails/{repository}@{sha[:12]} has no {THUMBNAIL_DIRECTORY}")
+            tree = github_tree(directory['url'])
+            if tree.get('truncated'):
+                raise ValueError(f"GitHub truncated the {THUMBNAIL_DIRECTORY} listing of {repository}")
+            names[console] = {entry['path'] for entry in tree['tree']
+                              if entry['type'] == 'blob' and entry['path'].lower().endswith('.png')}
+            logger.info(f"Found {len(names[console])} box art images in libretro-thumbnails/{repository}")
+        return cls(names)
+    
+    def resolve(self, record):
+        """Thumbnail URL for a record, or None when neither repository has one
+        
+        The bot's lookup is tried first: the ROM's file name with a .png
+        extension, in the Game Boy Color repository for CGB titles and the
+        Game Boy one otherwise. Then the name with libretro's character
+        substitutions, then the other repository.
+        """
+        rom_filename = record.get('rom_filename')
+        if not rom_filename:
+            return None
+        png = ROM_FILE_EXTENSION.sub('.png', rom_filename)
+        candidates = [png]
+        safe = THUMBNAIL_UNSAFE_CHARS.sub('_', png)
+        if safe != png:
+            candidates.append(safe)
+        
+        repositories = list(THUMBNAIL_REPOSITORIES)
+        if re.search('cgb', record.get('cgbFlag') or '', re.IGNORECASE):
+            repositories.reverse()
+        for console, repository, sha in repositories:
+            for name in candidates:
+                if name in self.names.get(console, ()):
+                    # Quoted like encodeURIComponent() in the bot
+                    return THUMBNAIL_URL.format(repository=repository, sha=sha, directory=THUMBNAIL_DIRECTORY,
+                                                name=urllib.parse.quote(name, safe="-_.!~*'()"))
+        return None
+
+
+def git_head(checkout):
+    """Commit a git checkout is at, or None if it isn't one"""
+    git_dir = os.path.join(checkout, '.git')
+    try:
+        with open(os.path.join(git_dir, 'HEAD'), 'r') as f:
+            head = f.read().strip()
+        if not head.startswith('ref: '):
+            return head
+        ref = head[len('ref: '):]
+        ref_path = os.path.join(git_dir, ref)
+        if os.path.exists(ref_path):
+            with open(ref_path, 'r') as f:
+                return f.read().strip()
+        with open(os.path.join(git_dir, 'packed-refs'), 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    return None
+
+
+def github_tree(url):
+    request = urllib.request.Request(url, headers={'Accept': 'application/vnd.github+json'})
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        return json.load(response)
+
+
+def parse_zip_archive(archive, filename, calculate_checksum=True, calculate_md5=False, process_all_roms=False,
+                      calculate_sha1=False, calculate_crc32=False):
+    """Extract ROM records from a ZIP archive opened as a seekable file object"""
+    try:
+        with zipfile.ZipFile(archive) as zip_file:
+            results = []
+            for rom_file in select_rom_members(zip_file.infolist(), filename, process_all_roms):
+                hashes = known_hashes(rom_file.CRC, rom_file.file_size, rom_file.filename, filename,
+                                      calculate_md5, calculate_sha1, calculate_crc32)
+                # Stream the ROM through every digest still needed in one pass
+                digest = RomDigest(calculate_checksum,
+                                   calculate_md5 and 'md5' not in hashes,
+                                   calculate_sha1 and 'sha1' not in hashes,
+                                   calculate_crc32 and 'crc32' not in hashes)
+                with zip_file.open(rom_file) as f:
+                    if digest.needs_data():
+                        digest.read_from(f)
+                    else:
+                        digest.update(f.read(HEADER_SIZE))
+                
+                results.append(build_rom_record(filename, rom_file.filename, bytes(digest.header), digest, hashes))
+            
+            return finalize_results(results, process_all_roms)
+    
+    except zipfile.BadZipFile:
+        logger.warning(f"Bad ZIP file: {filename}")
+        return None
+
+
+class RangeUnsupported(Exception):
+    """Raised when an archive cannot be read with HTTP Range requests"""
+
+
+# Bytes requested from the end of an archive to find the end-of-central-directory
+# record. No-Intro archives carry no comment, so the first attempt is small; the
+# second covers the fixed 22-byte record plus the largest possible comment
+ZIP_TAIL_SIZE = 4096
+ZIP_MAX_TAIL_SIZE = 22 + 0xFFFF
+# Compressed bytes requested per round when inflating the start of a member
+RANGE_CHUNK_SIZE = 4096
+# Bytes allowed for a member's local extra field in the first range request;
+# a longer one costs a second request
+LOCAL_EXTRA_ALLOWANCE = 1024
+
+
+# Seconds before a stalled archive request is abandoned (and retried)
+REQUEST_TIMEOUT = 60
+
+# Downloaded archives up to this many bytes are kept in memory, larger ones
+# are written to a temporary file
+SPOOL_SIZE = 4 * 1024 * 1024
+
+# Jittered exponential backoff between retries, in seconds
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+# Longest Retry-After we are willing to honour
+RETRY_AFTER_LIMIT = 300.0
+
+# Failures worth retrying besides HTTP errors: timeouts, resets, truncated bodies
+RETRYABLE_ERRORS = (URLError, OSError, http.client.HTTPException, asyncio.TimeoutError)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header, given as delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), RETRY_AFTER_LIMIT)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    seconds = (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    return min(max(0.0, seconds), RETRY_AFTER_LIMIT)
+
+
+def retry_delay(attempt, retry_after=None):
+    """Backoff before retry number attempt, never shorter than Retry-After
+    
+    Half of the exponential step is fixed and half is random, so workers that
+    failed together don't all come back at the same moment.
+    """
+    step = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    delay = step / 2 + random.uniform(0, step / 2)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def describe_fetch_error(e):
+    """Summarize a failed attempt as (label, reason, journal error, congested, Retry-After seconds)
+    
+    congested marks the failures that suggest the mirror is overloaded:
+    429s, 5xx responses, timeouts and dropped connections.
+    """
+    if isinstance(e, HTTPError):
+        # urllib gives a case-insensitive message, the asyncio pool a dict of lowercase names
+        headers = e.headers if e.headers is not None else {}
+        retry_after = parse_retry_after(headers.get('Retry-After') or headers.get('retry-after'))
+        reason = f"{e.code} {e.reason}"
+        return "HTTP Error", reason, f"HTTP {reason}", e.code == 429 or e.code >= 500, retry_after
+    if isinstance(e, URLError):
+        return "URL Error", e.reason, f"URL Error {e.reason}", True, None
+    reason = str(e) or e.__class__.__name__
+    return "Connection error", reason, f"Connection error {reason}", True, None
+
+
+class HostRateLimiter:
+    """Per-host token buckets, plus host-wide pauses requested with Retry-After
+    
+    With a rate set, each host gets a bucket of burst tokens refilled at rate
+    per second and every request takes one. Pauses apply whether or not a
+    rate is set, so one 429 holds off every worker instead of just one.
+    """
+    
+    def __init__(self, rate=None, burst=None):
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.configure(rate, burst)
+    
+    def configure(self, rate=None, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+    
+    def _host(self, url, now):
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = {'tokens': float(self.burst), 'updated': now, 'paused_until': 0.0}
+        return self.hosts[host]
+    
+    def reserve(self, url):
+        """Take a token for a request to url and return how long to wait before sending it"""
+        with self.lock:
+            now = time.monotonic()
+            state = self._host(url, now)
+            start = max(now, state['paused_until'])
+            if self.rate:
+                state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * self.rate)
+                state['updated'] = now
+                state['tokens'] -= 1
+                if state['tokens'] < 0:
+                    # Borrowed from the future: wait until it would have refilled
+                    start = max(start, now - state['tokens'] / self.rate)
+            return start - now
+    
+    def pause(self, url, seconds):
+        """Hold every request to url's host for the given number of seconds"""
+        with self.lock:
+            now = time.monotonic()
+            state = self._host(url, now)
+            state['paused_until'] = max(state['paused_until'], now + seconds)
+    
+    def wait(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+    
+    async def wait_async(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Shared by every archive request; configured from the command line in main()
+host_limits = HostRateLimiter()
+
+
+# Archives at least this large by their listing size are downloaded in
+# parallel Range segments (0 turns this off)
+SEGMENT_THRESHOLD = 2 * 1024 * 1024
+# Bytes per segment, and how many segments of one archive download at once
+SEGMENT_SIZE = 1024 * 1024
+SEGMENT_CONNECTIONS = 4
+# Failed segments allowed per mirror before the archive's attempt fails
+SEGMENT_RETRIES = 2
+# Bytes read between throughput checks while a segment downloads
+SEGMENT_READ_SIZE = 64 * 1024
+# A segment running at under this fraction of another mirror's recent rate,
+# SLOW_SEGMENT_GRACE seconds in, is dropped and finished on another mirror
+SLOW_MIRROR_FRACTION = 0.25
+SLOW_SEGMENT_GRACE = 2.0
+# Seconds a mirror is passed over after failing, doubled for each failure in a row
+MIRROR_BENCH_TIME = 15.0
+MIRROR_BENCH_MAX = 600.0
+# Weight of the newest sample in each mirror's moving average throughput
+MIRROR_RATE_WEIGHT = 0.3
+
+# Sizes as they appear in directory listings, e.g. "1.2 MiB" or "512.0 KiB"
+LISTING_SIZE = re.compile(r'^([\d.]+)\s*([KMGT]?)i?B$', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+
+
+def listing_size(zip_info):
+    """An archive's size in bytes going by its listing entry, or None"""
+    match = LISTING_SIZE.match(zip_info.get('size') or '')
+    if not match:
+        return None
+    try:
+        return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+    except ValueError:
+        return None
+
+
+def mirror_urls(zip_info):
+    """The archive's URL on each of its collection's mirrors, the listed one first"""
+    return zip_info.get('mirrors') or [zip_info['url']]
+
+
+class MirrorPool:
+    """How each mirror host has been doing, shared by every archive request
+    
+    Keeps a moving average of each host's throughput and benches a host for
+    a while when a request to it fails or is dropped as too slow, for twice
+    as long with each failure in a row. rank() orders an archive's mirror
+    URLs by which to ask first. Also holds the segmented download settings.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.configure()
+    
+    def configure(self, segment_threshold=SEGMENT_THRESHOLD, segment_connections=SEGMENT_CONNECTIONS):
+        self.segment_threshold = segment_threshold
+        self.segment_connections = segment_connections
+    
+    def _host(self, url):
+        """Stats for a URL's host; call with the lock held"""
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = {'rate': None, 'failures': 0, 'benched_until': 0.0}
+        return self.hosts[host]
+    
+    def rank(self, urls, busy=None):
+        """urls best first: not benched, then least busy (a Counter), then fastest
+        
+        Hosts with no throughput measured yet count as fastest, so each
+        mirror gets tried; otherwise the listed order breaks ties.
+        """
+        now = time.monotonic()
+        with self.lock:
+            def key(url):
+                host = self._host(url)
+                rate = host['rate'] if host['rate'] is not None else float('inf')
+                return host['benched_until'] > now, busy[url] if busy else 0, -rate
+            return sorted(urls, key=key)
+    
+    def available(self, url):
+        with self.lock:
+            return self._host(url)['benched_until'] <= time.monotonic()
+    
+    def succeeded(self, url, size, seconds):
+        with self.lock:
+            host = self._host(url)
+            host['failures'] = 0
+            # Small responses are mostly latency and say little about throughput
+            if size >= SEGMENT_READ_SIZE and seconds > 0:
+                rate = size / seconds
+                host['rate'] = rate if host['rate'] is None else host['rate'] + MIRROR_RATE_WEIGHT * (rate - host['rate'])
+    
+    def failed(self, url):
+        """Bench a URL's host, returning for how many seconds"""
+        with self.lock:
+            host = self._host(url)
+            host['failures'] += 1
+            bench = min(MIRROR_BENCH_MAX, MIRROR_BENCH_TIME * 2 ** (host['failures'] - 1))
+            host['benched_until'] = time.monotonic() + bench
+        return bench
+    
+    def is_slow(self, url, rate, urls):
+        """Whether rate, seen from url, is far behind another available mirror's recent rate"""
+        now = time.monotonic()
+        with self.lock:
+            own = self._host(url)
+            best = max((host['rate'] or 0 for host in map(self._host, urls)
+                        if host is not own and host['benched_until'] <= now), default=0)
+        return rate < SLOW_MIRROR_FRACTION * best
+    
+    def segmented(self, zip_info):
+        """Whether to download an archive in segments"""
+        size = listing_size(zip_info)
+        return self.segment_threshold > 0 and size is not None and size >= self.segment_threshold
+
+
+# Shared by every archive request; configured from the command line in main()
+mirror_pool = MirrorPool()
+
+
+class ConcurrencyController:
+    """AIMD limit on how many archives download at once
+    
+    Every finished download reports its time to first byte. After each window
+    of about limit completions the limit grows by one while latency stays
+    within QUEUEING_TOLERANCE of the best window seen, and shrinks by a
+    quarter once it passes LATENCY_TOLERANCE times that, since requests are
+    then queueing at the mirror rather than running in parallel. 429s, 5xx
+    responses, timeouts and resets halve it at once, at most once per
+    CONGESTION_COOLDOWN seconds.
+    """
+    
+    QUEUEING_TOLERANCE = 1.5
+    LATENCY_TOLERANCE = 2.0
+    CONGESTION_COOLDOWN = 1.0
+    MIN_WINDOW = 4
+    
+    def __init__(self, initial, minimum=1, maximum=32):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.peak = self.limit
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        # Set by release() to wake acquire_async() waiters, on the event loop they wait on
+        self.released = None
+        self.released_loop = None
+        self.last_decrease = 0.0
+        self.best_latency = None
+        self.window_count = 0
+        self.window_latency = 0.0
+    
+    def _set_limit(self, limit, reason):
+        limit = min(max(limit, self.minimum), self.maximum)
+        if int(limit) != int(self.limit):
+            logger.debug(f"Download concurrency {int(self.limit)} -> {int(limit)} ({reason})")
+        self.limit = limit
+        self.peak = max(self.peak, limit)
+        self.window_count = 0
+        self.window_latency = 0.0
+    
+    def acquire(self):
+        """Block until another download may start"""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+    
+    async def acquire_async(self):
+        """acquire() for the asyncio engine: waits for a release() without blocking the loop"""
+        loop = asyncio.get_running_loop()
+        if self.released_loop is not loop:
+            self.released, self.released_loop = asyncio.Event(), loop
+        while self.in_flight >= int(self.limit):
+            # set() wakes every waiter at once, so clearing here can't lose a release
+            self.released.clear()
+            await self.released.wait()
+        self.in_flight += 1
+    
+    def release(self, latency=0.0, congested=False):
+        """Finish a download attempt and adjust the limit"""
+        with self.condition:
+            self.in_flight -= 1
+            self._update(latency, congested)
+            self.condition.notify_all()
+        self._wake_async()
+    
+    def _wake_async(self):
+        loop = self.released_loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.released.set()
+        else:
+            loop.call_soon_threadsafe(self.released.set)
+    
+    def _update(self, latency, congested):
+        if congested:
+            now = time.monotonic()
+            if now - self.last_decrease >= self.CONGESTION_COOLDOWN:
+                self.last_decrease = now
+                self._set_limit(self.limit / 2, "mirror is pushing back")
+            return
+        
+        self.window_count += 1
+        self.window_latency += latency
+        if self.window_count < max(self.MIN_WINDOW, int(self.limit)):
+            return
+        
+        latency = self.window_latency / self.window_count
+        self.best_latency = latency if self.best_latency is None else min(self.best_latency, latency)
+        if latency > self.best_latency * self.LATENCY_TOLERANCE:
+            self._set_limit(self.limit * 0.75, "latency is rising")
+        elif latency <= self.best_latency * self.QUEUEING_TOLERANCE:
+            self._set_limit(self.limit + 1, "latency is steady")
+        else:
+            # Somewhere in between: hold the limit and measure again
+            self.window_count = 0
+            self.window_latency = 0.0
+
+
+class TimedHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that adds its connect time to the current ArchiveTiming"""
+    
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        add_timing('connect', time.perf_counter() - started)
+
+
+class TimedHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPSConnection that adds its TCP and TLS setup time to the current ArchiveTiming"""
+    
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        add_timing('connect', time.perf_counter() - started)
+
+
+class TimedHTTPHandler(urllib.request.HTTPHandler):
+    def do_open(self, http_class, req, **kwargs):
+        return super().do_open(TimedHTTPConnection, req, **kwargs)
+
+
+class TimedHTTPSHandler(urllib.request.HTTPSHandler):
+    def do_open(self, http_class, req, **kwargs):
+        return super().do_open(TimedHTTPSConnection, req, **kwargs)
+
+
+# urlopen() equivalent used for archive requests, so they can be timed
+archive_opener = urllib.request.build_opener(TimedHTTPHandler, TimedHTTPSHandler)
+
+
+def open_url(request):
+    """Open an archive request, recording time to first byte for the current archive"""
+    host_limits.wait(request.full_url)
+    timing = current_timing.get()
+    if timing is None:
+        return archive_opener.open(request, timeout=REQUEST_TIMEOUT)
+    
+    connect_before = timing.connect
+    started = time.perf_counter()
+    try:
+        return archive_opener.open(request, timeout=REQUEST_TIMEOUT)
+    finally:
+        # Error responses still cost a round trip
+        timing.requests += 1
+        timing.ttfb += time.perf_counter() - started - (timing.connect - connect_before)
+
+
+def spooled_file(spool_size=None):
+    """Temporary file that stays in memory up to spool_size bytes"""
+    spool_size = SPOOL_SIZE if spool_size is None else spool_size
+    if spool_size <= 0:
+        # SpooledTemporaryFile treats 0 as no limit at all
+        return tempfile.TemporaryFile()
+    return tempfile.SpooledTemporaryFile(max_size=spool_size)
+
+
+def spool_archive(response, spool_size=None, temp_dir=None):
+    """Read an archive body into memory, or to disk when it is over spool_size
+    
+    Without temp_dir the archive is parsed in this process, and goes into a
+    SpooledTemporaryFile that moves itself to disk once it passes spool_size.
+    With temp_dir it is handed to a parser process: it is read into a BytesIO
+    when Content-Length says it fits, and otherwise into a named file in
+    temp_dir that the caller removes. The file is returned rewound; the
+    caller closes it.
+    """
+    spool_size = SPOOL_SIZE if spool_size is None else spool_size
+    length = response.headers.get('Content-Length', '')
+    on_disk = False
+    if temp_dir is None:
+        temp_file = spooled_file(spool_size)
+    elif length.isdigit() and int(length) <= spool_size:
+        temp_file = io.BytesIO()
+    else:
+        temp_file = tempfile.NamedTemporaryFile(suffix='.zip', dir=temp_dir, delete=False)
+        on_disk = True
+    
+    try:
+        read_response(response, temp_file, 8192)  # 8 KB chunks
+    except BaseException:
+        temp_file.close()
+        if on_disk:
+            os.unlink(temp_file.name)
+        raise
+    temp_file.seek(0)
+    return temp_file
+
+
+def read_response(response, sink=None, chunk_size=8192):
+    """Read a response body into sink, or return it, recording transfer time and bytes"""
+    started = time.perf_counter()
+    if sink is None:
+        body = response.read()
+        size = len(body)
+    else:
+        body = None
+        size = 0
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                break
+            sink.write(chunk)
+            size += len(chunk)
+    add_timing('transfer', time.perf_counter() - started)
+    add_timing('bytes', size)
+    return body
+
+
+def open_range(url, start, end=None, request_headers=None):
+    """Open a ranged GET; end=None with a negative start requests a suffix"""
+    headers = dict(request_headers or {})
+    if end is None:
+        headers['Range'] = f"bytes={start}"
+    else:
+        headers['Range'] = f"bytes={start}-{end}"
+    return open_url(urllib.request.Request(url, headers=headers))
+
+
+def read_range(url, start, end, request_headers=None):
+    """Fetch an inclusive byte range, insisting on a 206 response"""
+    try:
+        with open_range(url, start, end, request_headers) as response:
+            if response.status != 206:
+                raise RangeUnsupported(f"expected 206 for bytes {start}-{end}, got {response.status}")
+            return read_response(response)
+    except HTTPError as e:
+        if e.code == 416:
+            raise RangeUnsupported(f"range {start}-{end} not satisfiable")
+        raise
+
+
+class SegmentAborted(OSError):
+    """A segment download that stopped part way; position is the first byte not received"""
+    
+    def __init__(self, position, reason):
+        super().__init__(reason)
+        self.position = position
+
+
+class SegmentedDownload:
+    """One archive downloaded in parallel Range segments spread over its mirrors
+    
+    The first request goes to the best-ranked mirror, with the journal's
+    conditional headers when that is the listed URL, and asks for the first
+    segment. Its Content-Range gives the archive's size. The rest is split
+    into SEGMENT_SIZE pieces, and up to connections of them download at
+    once, each from the best mirror not already busy with this archive. A
+    mirror that errors, reports a different size, or falls far behind
+    another mirror's recent rate gives up its segment, is benched in
+    mirror_pool, and the bytes it didn't deliver go back on the queue for
+    another mirror. Mirrors holding different bytes of the same size are
+    caught by the CRC check when the archive is parsed.
+    """
+    
+    def __init__(self, zip_info, request_headers=None, validators=None, spool_size=None, temp_dir=None,
+                 connections=SEGMENT_CONNECTIONS):
+        self.zip_info = zip_info
+        self.urls = mirror_urls(zip_info)
+        self.request_headers = request_headers or {}
+        self.validators = validators
+        self.spool_size = SPOOL_SIZE if spool_size is None else spool_size
+        self.temp_dir = temp_dir
+        self.connections = max(1, connections)
+        self.size = None
+        self.sink = None
+        self.on_disk = False
+        self.write_lock = threading.Lock()
+        # Guards everything below, and is notified whenever a segment finishes
+        self.changed = threading.Condition()
+        self.pending = collections.deque()
+        self.busy = collections.Counter()
+        # Mirrors that can't serve this archive in segments
+        self.excluded = set()
+        self.failures = 0
+        self.error = None
+    
+    def run(self):
+        """Download the archive, returning it as an open, rewound file like spool_archive()
+        
+        Raises RangeUnsupported when the archive can't be fetched in
+        segments, and the last error once too many segments have failed.
+        """
+        url = mirror_pool.rank(self.urls)[0]
+        headers = dict(self.request_headers) if url == self.zip_info['url'] else {}
+        headers['Range'] = f"bytes=0-{SEGMENT_SIZE - 1}"
+        try:
+            response = open_url(urllib.request.Request(url, headers=headers))
+        except HTTPError as e:
+            if e.code != 304:
+                mirror_pool.failed(url)
+            raise
+        except RETRYABLE_ERRORS:
+            mirror_pool.failed(url)
+            raise
+        
+        if self.validators is not None and url == self.zip_info['url']:
+            self.validators['etag'] = response.headers.get('ETag')
+            self.validators['last_modified'] = response.headers.get('Last-Modified')
+        if response.status != 206:
+            # Range was ignored, so the body is the whole archive
+            with response:
+                return spool_archive(response, self.spool_size, self.temp_dir)
+        
+        content_range = response.headers.get('Content-Range', '')
+        match = re.match(r'bytes 0-(\d+)/(\d+)', content_range)
+        if not match:
+            response.close()
+            raise RangeUnsupported(f"unusable Content-Range '{content_range}'")
+        first_end, self.size = int(match.group(1)), int(match.group(2))
+        self.sink = self._open_sink()
+        
+        try:
+            self.pending.extend((start, min(start + SEGMENT_SIZE, self.size) - 1)
+                                for start in range(first_end + 1, self.size, SEGMENT_SIZE))
+            self.busy[url] += 1
+            # Each helper runs in a copy of this context, so its timings count towards the archive
+            helpers = [threading.Thread(target=contextvars.copy_context().run, args=(self._work,), daemon=True)
+                       for _ in range(min(self.connections - 1, len(self.pending)))]
+            for helper in helpers:
+                helper.start()
+            self._fetch(url, 0, first_end, response)
+            self._work()
+            for helper in helpers:
+                helper.join()
+            if self.error is not None:
+                raise self.error
+            self.sink.seek(0)
+            return self.sink
+        
+        except BaseException as e:
+            with self.changed:
+                # Stops the helpers after their current segment
+                self.error = self.error or e
+                self.changed.notify_all()
+            with self.write_lock:
+                self.sink.close()
+            if self.on_disk:
+                os.unlink(self.sink.name)
+            raise
+    
+    def _open_sink(self):
+        # The same choice of file as spool_archive() makes
+        if self.temp_dir is None:
+            return spooled_file(self.spool_size)
+        if self.size <= self.spool_size:
+            return io.BytesIO()
+        self.on_disk = True
+        return tempfile.NamedTemporaryFile(suffix='.zip', dir=self.temp_dir, delete=False)
+    
+    def _work(self):
+        """Take segments off the queue until none are left or in progress elsewhere"""
+        while True:
+            with self.changed:
+                # A segment in progress may still come back to the queue
+                while not self.pending and sum(self.busy.values()) and self.error is None:
+                    self.changed.wait()
+                if not self.pending or self.error is not None:
+                    return
+                candidates = [url for url in self.urls if url not in self.excluded]
+                if not candidates:
+                    self.error = RangeUnsupported("no mirror can serve the archive in segments")
+                    self.changed.notify_all()
+                    return
+                start, end = self.pending.popleft()
+                url = mirror_pool.rank(candidates, self.busy)[0]
+                self.busy[url] += 1
+            self._fetch(url, start, end)
+    
+    def _fetch(self, url, start, end, response=None):
+        """Fetch bytes start-end from url, or read them from response, requeueing what doesn't arrive"""
+        failure = None
+        try:
+            if response is None:
+                response = open_range(url, start, end)
+            with response:
+                if response.status != 206:
+                    raise RangeUnsupported("Range was ignored")
+                total = response.headers.get('Content-Range', '').rpartition('/')[2]
+                if total != str(self.size):
+                    raise RangeUnsupported(f"the mirror has {total or 'an unknown number of'} bytes, not {self.size}")
+                self._receive(url, response, start, end)
+        except SegmentAborted as e:
+            failure, start = e, e.position
+        except (RangeUnsupported,) + RETRYABLE_ERRORS as e:
+            failure = e
+        
+        with self.changed:
+            # Segments cut short because the whole download was given up say nothing about the mirror
+            abandoned = self.error is not None
+            self.busy[url] -= 1
+            if failure is not None:
+                self.pending.appendleft((start, end))
+                self.failures += 1
+                if isinstance(failure, RangeUnsupported):
+                    self.excluded.add(url)
+                if self.failures > len(self.urls) * SEGMENT_RETRIES:
+                    self.error = self.error or failure
+            self.changed.notify_all()
+        
+        if failure is not None and not abandoned:
+            bench = mirror_pool.failed(url)
+            logger.debug(f"Segment {start}-{end} of {self.zip_info['filename']} failed on {url} ({failure}), "
+                         f"benching that mirror for {bench:.0f}s")
+    
+    def _receive(self, url, response, start, end):
+        """Copy a 206 body into the archive, raising SegmentAborted if it breaks off or lags"""
+        position = start
+        started = time.perf_counter()
+        try:
+            while position <= end:
+                try:
+                    chunk = response.read(min(SEGMENT_READ_SIZE, end + 1 - position))
+                except RETRYABLE_ERRORS as e:
+                    raise SegmentAborted(position, str(e) or e.__class__.__name__)
+                if not chunk:
+                    raise SegmentAborted(position, "connection closed early")
+                with self.write_lock:
+                    if self.error is not None:
+                        raise SegmentAborted(position, "download abandoned")
+                    self.sink.seek(position)
+                    self.sink.write(chunk)
+                position += len(chunk)
+                
+                elapsed = time.perf_counter() - started
+                rate = (position - start) / elapsed if elapsed > 0 else 0
+                if position <= end and elapsed > SLOW_SEGMENT_GRACE and mirror_pool.is_slow(url, rate, self.urls):
+                    raise SegmentAborted(position, f"too slow at {rate / 1024:.0f} KiB/s")
+        finally:
+            add_timing('transfer', time.perf_counter() - started)
+            add_timing('bytes', position - start)
+        mirror_pool.succeeded(url, position - start, time.perf_counter() - started)
+
+
+def parse_central_directory(data, count):
+    """Build ZipInfo objects from raw central directory records"""
+    infolist = []
+    pos = 0
+    for _ in range(count):
+        if data[pos:pos + 4] != b'PK\x01\x02':
+            raise RangeUnsupported("malformed central directory")
+        (flag_bits, compress_type, crc, compress_size, file_size,
+         name_len, extra_len, comment_len, header_offset) = struct.unpack_from('<8x2H4x3L3H8xL', data, pos)
+        name_bytes = data[pos + 46:pos + 46 + name_len]
+        name = name_bytes.decode('utf-8' if flag_bits & 0x800 else 'cp437')
+        
+        info = zipfile.ZipInfo(name)
+        info.flag_bits = flag_bits
+        info.compress_type = compress_type
+        info.CRC = crc
+        info.compress_size = compress_size
+        info.file_size = file_size
+        info.header_offset = header_offset
+        infolist.append(info)
+        
+        pos += 46 + name_len + extra_len + comment_len
+    return infolist
+
+
+def read_member_header(url, info, request_headers=None):
+    """Inflate just the first 0x150 bytes of a ZIP member using ranged reads"""
+    if info.flag_bits & 0x1:
+        raise RangeUnsupported(f"{info.filename} is encrypted")
+    if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        raise RangeUnsupported(f"{info.filename} uses compression method {info.compress_type}")
+    
+    wanted = min(HEADER_SIZE, info.file_size)
+    if info.compress_type == zipfile.ZIP_STORED:
+        budget = wanted
+    else:
+        budget = RANGE_CHUNK_SIZE
+    
+    # The local header's name/extra lengths can differ from the central
+    # directory, so fetch it together with the first chunk of data
+    start = info.header_offset
+    name_size = len(info.filename.encode('utf-8' if info.flag_bits & 0x800 else 'cp437'))
+    chunk = read_range(url, start, start + 30 + name_size + LOCAL_EXTRA_ALLOWANCE + budget - 1, request_headers)
+    if len(chunk) < 30 or chunk[:4] != b'PK\x03\x04':
+        raise RangeUnsupported(f"bad local header for {info.filename}")
+    name_len, extra_len = struct.unpack_from('<2H', chunk, 26)
+    data_start = start + 30 + name_len + extra_len
+    compressed = chunk[30 + name_len + extra_len:]
+    first = min(budget, info.compress_size)
+    if len(compressed) < first:
+        # The local name and extra field ran past the first request
+        compressed = read_range(url, data_start, data_start + first - 1, request_headers)
+    
+    if info.compress_type == zipfile.ZIP_STORED:
+        return compressed[:wanted]
+    
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    output = decompressor.decompress(compressed, wanted)
+    consumed = len(compressed)
+    while len(output) < wanted and consumed < info.compress_size and not decompressor.eof:
+        # Not enough compressed input yet: fetch the next slice of the member
+        end = min(data_start + consumed + RANGE_CHUNK_SIZE, data_start + info.compress_size) - 1
+        more = read_range(url, data_start + consumed, end, request_headers)
+        consumed += len(more)
+        output += decompressor.decompress(decompressor.unconsumed_tail + more, wanted - len(output))
+    return output[:wanted]
+
+
+def fetch_zip_headers(url, filename, request_headers=None, validators=None, process_all_roms=False,
+                      calculate_md5=False, calculate_sha1=False, calculate_crc32=False, spool_size=None):
+    """Read ROM headers from a remote ZIP using HTTP Range requests
+    
+    Fetches the end-of-central-directory record, the central directory and
+    then only the first compressed bytes of each ROM member. If the server
+    ignores Range and sends the whole archive, it is parsed as a normal
+    download instead. Hashes must be known without reading the ROMs (see
+    known_hashes); if one isn't, RangeUnsupported sends the caller to a
+    full download.
+    """
+    try:
+        response = open_range(url, f"-{ZIP_TAIL_SIZE}", request_headers=request_headers)
+    except HTTPError as e:
+        if e.code == 416:
+            raise RangeUnsupported("suffix range not satisfiable")
+        raise
+    
+    with response:
+        if validators is not None:
+            validators['etag'] = response.headers.get('ETag')
+            validators['last_modified'] = response.headers.get('Last-Modified')
+        
+        if response.status != 206:
+            # Server ignored Range: the body is the whole archive
+            logger.debug(f"Range not supported for {filename}, falling back to full download")
+            with spooled_file(spool_size) as temp_file:
+                read_response(response, temp_file)
+                temp_file.seek(0)
+                return parse_zip_archive(temp_file, filename, calculate_checksum=False,
+                                         calculate_md5=calculate_md5, process_all_roms=process_all_roms,
+                                         calculate_sha1=calculate_sha1, calculate_crc32=calculate_crc32)
+        
+        tail = read_response(response)
+        content_range = response.headers.get('Content-Range', '')
+    
+    match = re.match(r'bytes (\d+)-(\d+)/(\d+)', content_range)
+    if not match:
+        raise RangeUnsupported(f"unusable Content-Range '{content_range}'")
+    tail_start = int(match.group(1))
+    
+    # Only pin later ranges to this version of the file when we have a validator
+    pinned_headers = {}
+    if validators and (validators.get('etag') or validators.get('last_modified')):
+        pinned_headers['If-Range'] = validators.get('etag') or validators.get('last_modified')
+    
+    eocd = tail.rfind(b'PK\x05\x06')
+    if eocd < 0 and tail_start > 0:
+        # A long archive comment pushed the record further back
+        total_size = int(match.group(3))
+        tail_start = max(0, total_size - ZIP_MAX_TAIL_SIZE)
+        tail = read_range(url, tail_start, total_size - 1, pinned_headers)
+        eocd = tail.rfind(b'PK\x05\x06')
+    if eocd < 0 or len(tail) - eocd < 22:
+        logger.warning(f"Bad ZIP file: {filename}")
+        return None
+    count, cd_size, cd_offset = struct.unpack_from('<10xH2L', tail, eocd)
+    if cd_offset == 0xFFFFFFFF or count == 0xFFFF:
+        raise RangeUnsupported("ZIP64 archives are not supported")
+    
+    # The central directory is usually inside the tail we already have
+    if cd_offset >= tail_start:
+        central_directory = tail[cd_offset - tail_start:cd_offset - tail_start + cd_size]
+    else:
+        central_directory = read_range(url, cd_offset, cd_offset + cd_size - 1, pinned_headers)
+    
+    results = []
+    for info in select_rom_members(parse_central_directory(central_directory, count), filename, process_all_roms):
+        hashes = known_hashes(info.CRC, info.file_size, info.filename, filename,
+                              calculate_md5, calculate_sha1, calculate_crc32)
+        if (calculate_md5 and 'md5' not in hashes) or (calculate_sha1 and 'sha1' not in hashes):
+            raise RangeUnsupported(f"{info.filename} isn't in the DAT, so hashing it needs the whole archive")
+        header_bytes = read_member_header(url, info, pinned_headers)
+        results.append(build_rom_record(filename, info.filename, header_bytes, hashes=hashes))
+    
+    return finalize_results(results, process_all_roms)
+
+
+def archive_options(calculate_checksum=True, calculate_md5=False, process_all_roms=False,
+                    calculate_sha1=False, calculate_crc32=False):
+    """Options an archive is parsed with, also used as the journal's reuse key"""
+    return {
+        'checksums': calculate_checksum,
+        'md5': calculate_md5,
+        'sha1': calculate_sha1,
+        'crc32': calculate_crc32,
+        'all_roms': process_all_roms
+    }
+
+
+def fetch_archive(zip_info, options, retry_count=2, journal=None, trust_cache=False, range_headers=True,
+                  temp_dir=None, controller=None, spool_size=None):
+    """Download one archive, or resolve it without a full download
+    
+    Returns a (kind, value, validators) tuple where kind is one of:
+      'cached'     value is the journal's record, nothing was fetched
+      'done'       value is the finished result (304 Not Modified or a range read)
+      'downloaded' value is the archive, as an open file from spool_archive()
+      'failed'     value is the error message
+    
+    Each attempt holds a slot from controller (a ConcurrencyController) when
+    one is given, and reports its latency and outcome back to it. Each
+    attempt also goes to whichever of the archive's mirrors mirror_pool
+    ranks first, so a mirror that fails is skipped on the retry, and
+    archives over the segment threshold are fetched as a SegmentedDownload.
+    """
+    url = zip_info['url']
+    filename = zip_info['filename']
+    urls = mirror_urls(zip_info)
+    segmented = mirror_pool.segmented(zip_info)
+    
+    # Skip archives the journal already holds an up-to-date record for
+    request_headers = {}
+    if journal:
+        cached = journal.lookup(zip_info, options, trust_cache=trust_cache)
+        if cached:
+            logger.debug(f"Unchanged since last run, reusing journal record: {filename}")
+            return 'cached', cached['result'], None
+        if rom_dat is not None:
+            reused = journal.lookup_by_crc(zip_info, options, rom_dat)
+            if reused is not None:
+                logger.debug(f"Same ROM as an earlier record according to the DAT, skipping download: {filename}")
+                return 'done', reused, None
+        request_headers = journal.conditional_headers(url, options)
+    
+    validators = {'etag': None, 'last_modified': None}
+    
+    # Without checksums only the 0x150-byte header of each ROM is needed, as
+    # long as the hashes can come from the central directory and the DAT
+    use_range = range_headers and not (options['checksums'] or
+                                       ((options['md5'] or options['sha1']) and rom_dat is None))
+    
+    retries = 0
+    while True:
+        if controller is not None:
+            controller.acquire()
+        timing = current_timing.get()
+        ttfb_before = timing.ttfb if timing is not None else 0.0
+        started = time.perf_counter()
+        congested = False
+        mirror_url = mirror_pool.rank(urls)[0]
+        # The journal's validators came from the listed URL
+        headers = request_headers if mirror_url == url else {}
+        # A segmented download benches the mirrors that fail it itself
+        bench_on_failure = True
+        
+        try:
+            if use_range:
+                try:
+                    # Another mirror's validators still pin its range reads, but don't go in the journal
+                    result = fetch_zip_headers(mirror_url, filename, headers,
+                                               validators if mirror_url == url else {}, options['all_roms'],
+                                               options['md5'], options['sha1'], options['crc32'], spool_size)
+                    return 'done', result, validators
+                except RangeUnsupported as e:
+                    logger.debug(f"Range read failed for {filename} ({e}), downloading the whole archive")
+                    use_range = False
+            
+            if segmented:
+                bench_on_failure = False
+                try:
+                    temp_file = SegmentedDownload(zip_info, request_headers, validators, spool_size, temp_dir,
+                                                  mirror_pool.segment_connections).run()
+                    return 'downloaded', temp_file, validators
+                except RangeUnsupported as e:
+                    logger.debug(f"Segmented download failed for {filename} ({e}), downloading it in one piece")
+                    segmented = False
+                    bench_on_failure = True
+            
+            request = urllib.request.Request(mirror_url, headers=headers)
+            with open_url(request) as response:
+                if mirror_url == url:
+                    validators['etag'] = response.headers.get('ETag')
+                    validators['last_modified'] = response.headers.get('Last-Modified')
+                received = time.perf_counter()
+                temp_file = spool_archive(response, spool_size, temp_dir)
+            
+            # Lets later attempts pick the faster mirror
+            temp_file.seek(0, os.SEEK_END)
+            mirror_pool.succeeded(mirror_url, temp_file.tell(), time.perf_counter() - received)
+            temp_file.seek(0)
+            return 'downloaded', temp_file, validators
+            
+        except HTTPError as e:
+            if e.code == 304 and journal:
+                # Not Modified: the journal record is still current
+                logger.debug(f"Not modified since last run: {filename}")
+                cached = journal.get(url)
+                validators['etag'] = e.headers.get('ETag')
+                validators['last_modified'] = e.headers.get('Last-Modified')
+                return 'done', cached['result'], validators
+            label, reason, error, congested, retry_after = describe_fetch_error(e)
+        
+        except RETRYABLE_ERRORS as e:
+            # Timeouts and connection resets are worth another try too
+            label, reason, error, congested, retry_after = describe_fetch_error(e)
+        
+        except Exception as e:
+            logger.error(f"Error processing {filename}: {e}")
+            return 'failed', str(e), None
+        
+        finally:
+            if controller is not None:
+                latency = timing.ttfb - ttfb_before if timing is not None else time.perf_counter() - started
+                controller.release(latency, congested)
+        
+        if bench_on_failure:
+            mirror_pool.failed(mirror_url)
+        
+        retries += 1
+        if retries > retry_count:
+            logger.error(f"{label} downloading {filename}: {reason}, giving up after {retry_count} retries")
+            return 'failed', error, None
+        
+        delay = retry_delay(retries, retry_after)
+        if retry_after is not None:
+            # The server asked us to slow down, so hold off every worker on this host
+            host_limits.pause(mirror_url, delay)
+        next_url = mirror_pool.rank(urls)[0]
+        if next_url != mirror_url and mirror_pool.available(next_url):
+            # Another mirror is ready, so there's nothing to wait for
+            logger.warning(f"{label} downloading {filename} from {mirror_url}: {reason}, trying {next_url} "
+                           f"({retries}/{retry_count})")
+            add_timing('retries', 1)
+            continue
+        logger.warning(f"{label} downloading {filename}: {reason}, retrying in {delay:.1f}s ({retries}/{retry_count})")
+        add_timing('retries', 1)
+        time.sleep(delay)
+
+
+def parse_archive(archive, filename, options):
+    """Parse an archive opened as a seekable file object with archive_options()"""
+    return parse_zip_archive(
+        archive, filename,
+        calculate_checksum=options['checksums'],
+        calculate_md5=options['md5'],
+        process_all_roms=options['all_roms'],
+        calculate_sha1=options['sha1'],
+        calculate_crc32=options['crc32']
+    )
+
+
+def parse_archive_file(path, filename, options, remove=True):
+    """Parse a downloaded archive from disk; safe to run in a worker process"""
+    try:
+        with open(path, 'rb') as archive:
+            return parse_archive(archive, filename, options)
+    finally:
+        if remove:
+            os.unlink(path)
+
+
+def parse_archive_data(data, filename, options):
+    """Parse a downloaded archive held in memory; safe to run in a worker process"""
+    return parse_archive(io.BytesIO(data), filename, options)
+
+
+def record_outcome(journal, zip_info, options, kind, value, validators=None):
+    """Write a fetched or parsed archive to the journal and return its result"""
+    timing = current_timing.get()
+    if timing is not None:
+        timing.outcome = kind
+    if kind == 'failed':
+        if journal:
+            journal.record(zip_info, 'failed', options, error=value)
+        return None
+    if kind != 'cached' and journal:
+        # Record the outcome so later runs can skip or revalidate this archive
+        journal.record(zip_info, 'done', options, value, **(validators or {}))
+    return value
+
+
+def process_zip_file(zip_info, retry_count=2, calculate_checksum=True, calculate_md5=False, process_all_roms=False,
+                     journal=None, trust_cache=False, range_headers=True, calculate_sha1=False, calculate_crc32=False,
+                     controller=None, spool_size=None):
+    """Download a ZIP file, extract ROM header data, and return a JSON object"""
+    options = archive_options(calculate_checksum, calculate_md5, process_all_roms, calculate_sha1, calculate_crc32)
+    kind, value, validators = fetch_archive(zip_info, options, retry_count, journal, trust_cache, range_headers,
+                                            controller=controller, spool_size=spool_size)
+    
+    if kind == 'downloaded':
+        started = time.perf_counter()
+        try:
+            with value as archive:
+                kind, value = 'done', parse_archive(archive, zip_info['filename'], options)
+        except Exception as e:
+            logger.error(f"Error processing {zip_info['filename']}: {e}")
+            kind, value = 'failed', str(e)
+        add_timing('parse', time.perf_counter() - started)
+    
+    return record_outcome(journal, zip_info, options, kind, value, validators)
+
+
+class AsyncConnectionPool:
+    """Bounded pool of persistent HTTP/1.1 connections per host for asyncio
+    
+    Connections are reused across requests with keep-alive, so thousands of
+    archives on one host share a handful of TCP+TLS handshakes. timeout
+    bounds each connect and read, not the whole transfer, so a slow but
+    steady download isn't cut off.
+    """
+    
+    user_agent = f"Python-urllib/{urllib.request.__version__}"
+    
+    def __init__(self, max_per_host=8, timeout=60):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.idle = {}
+        self.slots = {}
+        self.ssl_context = None
+    
+    def _slot(self, key):
+        if key not in self.slots:
+            self.slots[key] = asyncio.Semaphore(self.max_per_host)
+        return self.slots[key]
+    
+    async def _timed(self, awaitable):
+        """Await one connect or read, giving up after timeout seconds without progress"""
+        return await asyncio.wait_for(awaitable, self.timeout)
+    
+    async def _connect(self, key):
+        scheme, host, port = key
+        if scheme == 'https':
+            if self.ssl_context is None:
+                self.ssl_context = ssl.create_default_context()
+            return await asyncio.open_connection(host, port, ssl=self.ssl_context)
+        return await asyncio.open_connection(host, port)
+    
+    async def close(self):
+        """Close every idle connection"""
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle.clear()
+    
+    async def request(self, url, headers=None, sink=None, max_redirects=5):
+        """GET a URL; returns (status, reason, headers, body)
+        
+        The body is written to sink when one is given (and returned as b''),
+        otherwise it is returned as bytes. Only a 2xx body goes to sink;
+        redirect and error pages are read and dropped. Error statuses raise
+        HTTPError just like urlopen, so callers can share retry handling.
+        """
+        for _ in range(max_redirects + 1):
+            await host_limits.wait_async(url)
+            status, reason, response_headers, body = await self._request_once(url, headers or {}, sink)
+            if status in (301, 302, 303, 307, 308) and 'location' in response_headers:
+                url = urljoin(url, response_headers['location'])
+                continue
+            if status >= 400 or status == 304:
+                raise HTTPError(url, status, reason, response_headers, None)
+            return status, reason, response_headers, body
+        raise URLError(f"too many redirects for {url}")
+    
+    async def _request_once(self, url, headers, sink):
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        
+        lines = [f"GET {path} HTTP/1.1", f"Host: {parts.netloc}", f"User-Agent: {self.user_agent}",
+                 "Accept-Encoding: identity", "Connection: keep-alive"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        request_bytes = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        
+        async with self._slot(key):
+            idle = self.idle.setdefault(key, [])
+            while True:
+                reused = bool(idle)
+                if reused:
+                    reader, writer = idle.pop()
+                else:
+                    started = time.perf_counter()
+                    reader, writer = await self._timed(self._connect(key))
+                    add_timing('connect', time.perf_counter() - started)
+                try:
+                    started = time.perf_counter()
+                    writer.write(request_bytes)
+                    await self._timed(writer.drain())
+                    status_line = await self._timed(reader.readline())
+                    if not status_line:
+                        raise ConnectionResetError("connection closed before response")
+                    add_timing('ttfb', time.perf_counter() - started)
+                    add_timing('requests', 1)
+                    break
+                except (ConnectionError, OSError, asyncio.TimeoutError):
+                    writer.close()
+                    if not reused:
+                        raise
+                    # The server closed an idle keep-alive connection: retry on a fresh one
+            
+            try:
+                started = time.perf_counter()
+                version, status, reason = self._parse_status_line(status_line)
+                response_headers = await self._read_headers(reader)
+                body, keep_alive = await self._read_body(reader, version, status, response_headers, sink)
+                add_timing('transfer', time.perf_counter() - started)
+            except BaseException:
+                writer.close()
+                raise
+            
+            if keep_alive:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, reason, response_headers, body
+    
+    @staticmethod
+    def _parse_status_line(line):
+        parts = line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise URLError(f"bad status line {line!r}")
+        return parts[0], int(parts[1]), parts[2] if len(parts) > 2 else ''
+    
+    async def _read_headers(self, reader):
+        headers = {}
+        while True:
+            line = await self._timed(reader.readline())
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+    
+    async def _read_body(self, reader, version, status, headers, sink):
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        chunks = []
+        # Other bodies are still read, so the connection can be reused
+        target = sink if 200 <= status < 300 else None
+        
+        def emit(data):
+            add_timing('bytes', len(data))
+            if target is not None:
+                target.write(data)
+            elif sink is None:
+                chunks.append(data)
+        
+        if status in (204, 304) or 100 <= status < 200:
+            return b'', keep_alive
+        
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await self._timed(reader.readline())
+                size = int(size_line.split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # Skip any trailers
+                    while (await self._timed(reader.readline())) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                remaining = size
+                while remaining:
+                    data = await self._timed(reader.read(min(remaining, 65536)))
+                    if not data:
+                        raise ConnectionResetError("connection closed mid-chunk")
+                    emit(data)
+                    remaining -= len(data)
+                await self._timed(reader.readline())
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining:
+                data = await self._timed(reader.read(min(remaining, 65536)))
+                if not data:
+                    raise ConnectionResetError("connection closed mid-body")
+                emit(data)
+                remaining -= len(data)
+        else:
+            # No length: the body runs until the server closes the connection
+            keep_alive = False
+            while True:
+                data = await self._timed(reader.read(65536))
+                if not data:
+                    break
+                emit(data)
+        
+        return b''.join(chunks), keep_alive
+
+
+async def process_zip_file_async(pool, executor, zip_info, retry_count=2, calculate_checksum=True,
+                                 calculate_md5=False, process_all_roms=False, journal=None, trust_cache=False,
+                                 calculate_sha1=False, calculate_crc32=False, controller=None, spool_size=None):
+    """asyncio counterpart of process_zip_file: download over the pool, parse in the executor
+    
+    Archives are downloaded in one piece, but each attempt goes to the
+    mirror mirror_pool ranks first, as with the other engines.
+    """
+    url = zip_info['url']
+    urls = mirror_urls(zip_info)
+    filename = zip_info['filename']
+    options = archive_options(calculate_checksum, calculate_md5, process_all_roms, calculate_sha1, calculate_crc32)
+    loop = asyncio.get_running_loop()
+    
+    # Skip archives the journal already holds an up-to-date record for
+    request_headers = {}
+    if journal:
+        cached = journal.lookup(zip_info, options, trust_cache=trust_cache)
+        if cached:
+            logger.debug(f"Unchanged since last run, reusing journal record: {filename}")
+            return cached['result']
+        if rom_dat is not None:
+            reused = journal.lookup_by_crc(zip_info, options, rom_dat)
+            if reused is not None:
+                logger.debug(f"Same ROM as an earlier record according to the DAT, skipping download: {filename}")
+                return record_outcome(journal, zip_info, options, 'done', reused)
+        request_headers = journal.conditional_headers(url, options)
+    
+    retries = 0
+    while True:
+        timing = current_timing.get()
+        mirror_url = mirror_pool.rank(urls)[0]
+        try:
+            with spooled_file(spool_size) as temp_file:
+                # Only the download holds a concurrency slot; parsing has its own executor
+                if controller is not None:
+                    await controller.acquire_async()
+                ttfb_before = timing.ttfb if timing is not None else 0.0
+                started = time.perf_counter()
+                congested = False
+                try:
+                    _, _, response_headers, _ = await pool.request(
+                        mirror_url, request_headers if mirror_url == url else {}, sink=temp_file)
+                except RETRYABLE_ERRORS as e:
+                    congested = describe_fetch_error(e)[3]
+                    raise
+                finally:
+                    if controller is not None:
+                        latency = timing.ttfb - ttfb_before if timing is not None else time.perf_counter() - started
+                        controller.release(latency, congested)
+                temp_file.seek(0)
+                
+                # Decompression and checksums run off the event loop
+                result, parse_timing = await loop.run_in_executor(executor, functools.partial(
+                    timed, parse_zip_archive, temp_file, filename,
+                    calculate_checksum=calculate_checksum,
+                    calculate_md5=calculate_md5,
+                    process_all_roms=process_all_roms,
+                    calculate_sha1=calculate_sha1,
+                    calculate_crc32=calculate_crc32
+                ))
+                if timing is not None:
+                    timing.merge_parse(parse_timing)
+            
+            return record_outcome(journal, zip_info, options, 'done', result, {
+                'etag': response_headers.get('etag'),
+                'last_modified': response_headers.get('last-modified')
+            })
+        
+        except HTTPError as e:
+            if e.code == 304 and journal:
+                # Not Modified: the journal record is still current
+                logger.debug(f"Not modified since last run: {filename}")
+                return record_outcome(journal, zip_info, options, 'done', journal.get(url)['result'], {
+                    'etag': e.headers.get('etag'),
+                    'last_modified': e.headers.get('last-modified')
+                })
+            label, reason, error, _, retry_after = describe_fetch_error(e)
+        
+        except RETRYABLE_ERRORS as e:
+            label, reason, error, _, retry_after = describe_fetch_error(e)
+        
+        except Exception as e:
+            logger.error(f"Error processing {filename}: {e}")
+            return record_outcome(journal, zip_info, options, 'failed', str(e))
+        
+        mirror_pool.failed(mirror_url)
+        retries += 1
+        if retries > retry_count:
+            logger.error(f"{label} downloading {filename}: {reason}, giving up after {retry_count} retries")
+            return record_outcome(journal, zip_info, options, 'failed', error)
+        
+        delay = retry_delay(retries, retry_after)
+        if retry_after is not None:
+            host_limits.pause(mirror_url, delay)
+        next_url = mirror_pool.rank(urls)[0]
+        if next_url != mirror_url and mirror_pool.available(next_url):
+            logger.warning(f"{label} downloading {filename} from {mirror_url}: {reason}, trying {next_url} "
+                           f"({retries}/{retry_count})")
+            add_timing('retries', 1)
+            continue
+        logger.warning(f"{label} downloading {filename}: {reason}, retrying in {delay:.1f}s ({retries}/{retry_count})")
+        add_timing('retries', 1)
+        await asyncio.sleep(delay)
+
+
+async def run_async_engine(zip_files, on_result, max_workers=8, metrics=None, **options):
+    """Process ZIP files with asyncio, calling on_result(zip_info, result) as each finishes
+    
+    max_workers tasks take archives from a queue, so only the archives being
+    worked on have a task, and each task's result is handed on as soon as it
+    finishes rather than kept until the run ends.
+    """
+    pool = AsyncConnectionPool(max_per_host=max_workers)
+    pending = asyncio.Queue()
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
+        async def run_one(zip_info):
+            timing = ArchiveTiming()
+            token = current_timing.set(timing)
+            try:
+                result = await process_zip_file_async(pool, executor, zip_info, **options)
+            except Exception as e:
+                logger.error(f"\nError processing {zip_info['filename']}: {e}")
+                result = None
+            finally:
+                current_timing.reset(token)
+            if metrics is not None:
+                metrics.observe(timing)
+            on_result(zip_info, result)
+        
+        async def worker():
+            while True:
+                zip_info = await pending.get()
+                if zip_info is None:
+                    return
+                await run_one(zip_info)
+        
+        workers = [asyncio.ensure_future(worker()) for _ in range(max_workers)]
+        try:
+            if isinstance(zip_files, ListingFeed):
+                # Listings stream over the same pool and archives start as they appear
+                await zip_files.discover_async(pool, pending.put_nowait)
+            else:
+                for zip_info in zip_files:
+                    pending.put_nowait(zip_info)
+            for _ in workers:
+                pending.put_nowait(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await pool.close()
+
+
+class StageStats:
+    """Busy and blocked time accounting for one stage of the pipeline engine"""
+    
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.items = 0
+        self.lock = threading.Lock()
+    
+    def add(self, busy=0.0, blocked=0.0, items=0):
+        with self.lock:
+            self.busy += busy
+            self.blocked += blocked
+            self.items += items
+    
+    def utilization(self, wall_time):
+        """Fraction of the stage's worker time spent doing work"""
+        if wall_time <= 0 or self.workers <= 0:
+            return 0.0
+        return min(1.0, self.busy / (wall_time * self.workers))
+    
+    def summary(self, wall_time):
+        line = (f"  {self.name:<9} {self.workers:>3} workers, {self.items:>6} archives, "
+                f"{self.utilization(wall_time) * 100:5.1f}% busy")
+        if self.blocked >= 0.05:
+            line += f", {self.blocked:.1f}s blocked on a full parse queue"
+        return line
+
+
+def run_pipeline(zip_files, on_result, options, download_workers=8, parse_workers=None, queue_size=None,
+                 journal=None, trust_cache=False, range_headers=True, metrics=None, controller=None,
+                 spool_size=None, window=None):
+    """Process ZIP files in two stages: download threads feeding a process pool
+    
+    Download workers fetch archives and hand them to a ProcessPoolExecutor
+    that does the ZIP parsing, header decoding and checksums, so network
+    fetches never wait behind the GIL. Archives up to spool_size bytes are
+    passed as bytes, larger ones as the path of a temporary file. At most
+    queue_size downloaded archives are waiting for or being parsed at any
+    time; download workers block until there is room. With a controller only
+    as many downloads as it allows run at once, out of download_workers
+    threads. Returns the StageStats for each stage.
+    """
+    parse_workers = parse_workers or os.cpu_count() or 1
+    queue_size = queue_size or parse_workers * 2
+    window = window or (download_workers + queue_size) * SUBMIT_WINDOW_PER_WORKER
+    handoff = threading.BoundedSemaphore(queue_size)
+    completions = queue.Queue()
+    download_stats = StageStats('download', download_workers)
+    parse_stats = StageStats('parse', parse_workers)
+    
+    with tempfile.TemporaryDirectory(prefix='gb-roms-') as temp_dir:
+        parsers = concurrent.futures.ProcessPoolExecutor(max_workers=parse_workers, initializer=use_dat,
+                                                         initargs=(rom_dat,))
+        downloaders = concurrent.futures.ThreadPoolExecutor(max_workers=download_workers)
+        
+        def finish(zip_info, timing, result):
+            if metrics is not None:
+                metrics.observe(timing)
+            completions.put((zip_info, result))
+        
+        def parsed(zip_info, validators, timing, future):
+            handoff.release()
+            # Runs on the executor's callback thread, so make the archive's timing current here
+            token = current_timing.set(timing)
+            try:
+                result, parse_timing = future.result()
+                timing.merge_parse(parse_timing)
+                parse_stats.add(busy=parse_timing.parse, items=1)
+                result = record_outcome(journal, zip_info, options, 'done', result, validators)
+            except Exception as e:
+                logger.error(f"Error processing {zip_info['filename']}: {e}")
+                result = record_outcome(journal, zip_info, options, 'failed', str(e))
+            finally:
+                current_timing.reset(token)
+            finish(zip_info, timing, result)
+        
+        def download(zip_info):
+            timing = ArchiveTiming()
+            token = current_timing.set(timing)
+            try:
+                started = time.perf_counter()
+                kind, value, validators = fetch_archive(zip_info, options, journal=journal, trust_cache=trust_cache,
+                                                        range_headers=range_headers, temp_dir=temp_dir,
+                                                        controller=controller, spool_size=spool_size)
+                finished = time.perf_counter()
+                download_stats.add(busy=finished - started, items=1)
+                
+                if kind != 'downloaded':
+                    finish(zip_info, timing, record_outcome(journal, zip_info, options, kind, value, validators))
+                    return
+                
+                # Wait for room so the parse backlog (and memory and temp disk use) stays bounded
+                handoff.acquire()
+                download_stats.add(blocked=time.perf_counter() - finished)
+                try:
+                    with value:
+                        if isinstance(value, io.BytesIO):
+                            parse = functools.partial(parse_archive_data, value.getvalue())
+                        else:
+                            parse = functools.partial(parse_archive_file, value.name)
+                    future = parsers.submit(timed, parse, zip_info['filename'], options)
+                except BaseException:
+                    # parsed() will never run for this archive: give back its slot and temp file
+                    handoff.release()
+                    if not isinstance(value, io.BytesIO):
+                        try:
+                            os.unlink(value.name)
+                        except FileNotFoundError:
+                            pass
+                    raise
+                future.add_done_callback(functools.partial(parsed, zip_info, validators, timing))
+            except Exception as e:
+                logger.error(f"Error processing {zip_info['filename']}: {e}")
+                finish(zip_info, timing, None)
+            finally:
+                current_timing.reset(token)
+        
+        try:
+            submit_as_discovered(zip_files, functools.partial(downloaders.submit, download), completions, on_result,
+                                 window)
+        finally:
+            # On interruption drop queued work instead of finishing the crawl
+            downloaders.shutdown(wait=True, cancel_futures=True)
+            parsers.shutdown(wait=True, cancel_futures=True)
+    
+    return download_stats, parse_stats
+
+
+# File types picked up when walking a local mirror with --source
+LOCAL_ARCHIVE_EXTENSIONS = ('.zip',)
+LOCAL_ROM_EXTENSIONS = ('.gb', '.gbc')
+
+
+def scan_local_mirror(root, skip_bios=True):
+    """Walk a local mirror for .zip archives and bare .gb/.gbc ROMs
+    
+    Entries have the same shape as fetch_directory_listings() output, with
+    'url' holding the file path and 'size' its size in bytes.
+    """
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()  # Walk in a stable order
+        for name in sorted(filenames):
+            title, ext = os.path.splitext(name)
+            if ext.lower() not in LOCAL_ARCHIVE_EXTENSIONS + LOCAL_ROM_EXTENSIONS:
+                continue
+            
+            # Skip BIOS files if option is enabled
+            if skip_bios and "[BIOS]" in title:
+                logger.debug(f"Skipping BIOS file: {title}")
+                continue
+            
+            path = os.path.join(dirpath, name)
+            entries.append({
+                'url': path,
+                'filename': title,
+                'size': os.path.getsize(path),
+                'date': None
+            })
+    
+    logger.info(f"Found {len(entries)} files under {root}")
+    return entries
+
+
+def parse_rom_file(path, filename, options):
+    """Parse a bare .gb/.gbc ROM through mmap
+    
+    Header-only runs touch just the page holding the header; otherwise the
+    mapping is fed to RomDigest in one piece without copying it into memory.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < HEADER_SIZE:
+            logger.warning(f"ROM too small to contain a header: {filename}")
+            return None
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as rom:
+            hashes = {}
+            if rom_dat is not None and (options['md5'] or options['sha1']):
+                # A CRC32 pass is cheap next to MD5/SHA-1 and finds the ROM in the DAT
+                started = time.perf_counter()
+                with memoryview(rom) as view:
+                    crc = zlib.crc32(view)
+                add_timing('checksum', time.perf_counter() - started)
+                hashes = known_hashes(crc, len(rom), os.path.basename(path), filename,
+                                      options['md5'], options['sha1'], options['crc32'])
+            
+            digest = None
+            if options['checksums'] or any(options[field] and field not in hashes for field in HASH_FIELDS):
+                digest = RomDigest(options['checksums'],
+                                   options['md5'] and 'md5' not in hashes,
+                                   options['sha1'] and 'sha1' not in hashes,
+                                   options['crc32'] and 'crc32' not in hashes)
+                started = time.perf_counter()
+                with memoryview(rom) as view:
+                    digest.update(view)
+                add_timing('checksum', time.perf_counter() - started)
+                header_bytes = bytes(digest.header)
+            else:
+                header_bytes = rom[:HEADER_SIZE]
+    
+    record = build_rom_record(filename, os.path.basename(path), header_bytes, digest, hashes)
+    return finalize_results([record], options['all_roms'])
+
+
+def parse_local_file(path, filename, options):
+    """Parse one file from a local mirror; safe to run in a worker process"""
+    if path.lower().endswith(LOCAL_ARCHIVE_EXTENSIONS):
+        return parse_archive_file(path, filename, options, remove=False)
+    return parse_rom_file(path, filename, options)
+
+
+def run_local_mirror(entries, on_result, options, workers=None, metrics=None, window=None):
+    """Parse every file of a local mirror across a process pool
+    
+    At most window files are queued or being parsed at once (see
+    submit_as_discovered).
+    """
+    workers = workers or os.cpu_count() or 1
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=use_dat,
+                                                      initargs=(rom_dat,))
+    completions = queue.Queue()
+    
+    def finished(entry, future):
+        if future.cancelled():
+            return
+        try:
+            result, timing = future.result()
+            timing.outcome = 'done'
+        except Exception as e:
+            logger.error(f"Error processing {entry['filename']}: {e}")
+            result, timing = None, ArchiveTiming()
+        if metrics is not None:
+            metrics.observe(timing)
+        completions.put((entry, result))
+    
+    def submit(entry):
+        future = executor.submit(timed, parse_local_file, entry['url'], entry['filename'], options)
+        future.add_done_callback(functools.partial(finished, entry))
+    
+    try:
+        submit_as_discovered(entries, submit, completions, on_result,
+                             window or workers * SUBMIT_WINDOW_PER_WORKER)
+    finally:
+        # On interruption drop queued files instead of finishing the scan
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def process_files_with_progress(zip_files, max_workers=8, calculate_checksums=True, 
+                                calculate_md5=False, process_all_roms=False, journal=None, trust_cache=False,
+                                range_headers=True, calculate_sha1=False, calculate_crc32=False,
+                                engine='threads', parse_workers=None, sink=None, metrics=None, controller=None,
+                                spool_size=None, window=None, thumbnails=None):
+    """Process ZIP files in parallel with progress reporting
+    
+    zip_files is a list, or a ListingFeed whose archives start processing as
+    the directory listings are parsed. Records are returned as a list, or
+    written to sink (a StreamingOutput) as they finish when one is given, in
+    which case the returned list is empty. Per-archive timings are added to
+    metrics (a RunMetrics) when one is given. With a controller (a
+    ConcurrencyController) the number of concurrent downloads adapts between
+    its minimum and maximum instead of staying at max_workers.
+    
+    Memory and temporary disk use are bounded by the number of archives held
+    at once, which depends only on the worker counts: each is kept in memory
+    up to spool_size bytes and in a temporary file beyond that. window caps
+    the archives queued for the workers (default: SUBMIT_WINDOW_PER_WORKER
+    per worker).
+    
+    Each record gets the fields parsed from its No-Intro filename (see
+    rom_filename.py) and, with thumbnails (a BoxArtIndex), its box art URL
+    or None in a 'thumbnail' field.
+    """
+    results = []
+    discovering = isinstance(zip_files, ListingFeed)
+    if controller is not None:
+        # Enough workers for the controller's ceiling; it decides how many are downloading
+        max_workers = controller.maximum
+    total_files = 0 if discovering else len(zip_files)
+    completed = 0
+    
+    if engine != 'local':
+        spool_size = SPOOL_SIZE if spool_size is None else spool_size
+        held = max_workers
+        if engine == 'pipeline':
+            # Downloads, the parse queue, and each parser's own copy
+            parsers = parse_workers or os.cpu_count() or 1
+            held = max_workers + parsers * 3
+        print(f"At most {held} archives held at once: up to {round(held * spool_size / 2**20, 1):g} MiB in memory, "
+              f"larger archives in temporary files under {tempfile.gettempdir()}")
+    
+    # Print initial message with cancel instructions
+    if discovering:
+        logger.info("Starting to process files as they are listed. Press Ctrl+C to cancel at any time.")
+        print(f"\n{'='*70}")
+        print(" Processing ROM files as they are listed. Press Ctrl+C at any time to cancel.")
+        print(f"{'='*70}\n")
+    else:
+        logger.info(f"Starting to process {total_files} files. Press Ctrl+C to cancel at any time.")
+        print(f"\n{'='*70}")
+        print(f" Processing {total_files} ROM files. Press Ctrl+C at any time to cancel.")
+        print(f"{'='*70}\n")
+    
+    start_time = time.time()
+    last_update_time = start_time
+    update_interval = 2  # Update progress every 2 seconds
+    
+    def handle_result(result):
+        nonlocal completed, last_update_time, total_files
+        completed += 1
+        
+        # The total keeps growing until every listing has been parsed
+        still_listing = discovering and not zip_files.done
+        if discovering:
+            total_files = zip_files.count
+        
+        # Report progress more frequently based on time rather than just count
+        current_time = time.time()
+        if (current_time - last_update_time >= update_interval) or (completed == total_files and not still_listing):
+            last_update_time = current_time
+            elapsed = current_time - start_time
+            percent = completed / total_files * 100
+            
+            # Calculate ETA
+            if still_listing:
+                eta_str = "ETA: still listing..."
+            elif completed > 0:
+                avg_time_per_file = elapsed / completed
+                eta = avg_time_per_file * (total_files - completed)
+                eta_str = f"ETA: {int(eta // 60):02d}:{int(eta % 60):02d}"
+            else:
+                eta_str = "ETA: calculating..."
+            
+            # Format progress bar
+            bar_length = 40
+            filled_length = int(bar_length * completed // total_files)
+            bar = '█' * filled_length + '░' * (bar_length - filled_length)
+            
+            # Print progress on a new line
+            print(f"\r[{bar}] {completed}/{total_files} ({percent:.1f}%) - {eta_str}", end='', flush=True)
+        
+        if result:
+            records = result if isinstance(result, list) else [result]
+            # Copies, so records the journal hands out stay as parsed
+            records = [dict(record, **filename_fields(record)) for record in records]
+            if thumbnails is not None:
+                for record in records:
+                    record['thumbnail'] = thumbnails.resolve(record)
+            if sink is not None:
+                for record in records:
+                    sink.write(record)
+            else:
+                results.extend(records)
+    
+    stage_stats = None
+    
+    try:
+        if engine == 'local':
+            run_local_mirror(
+                zip_files,
+                lambda entry, result: handle_result(result),
+                archive_options(calculate_checksums, calculate_md5, process_all_roms, calculate_sha1, calculate_crc32),
+                workers=parse_workers,
+                metrics=metrics,
+                window=window
+            )
+        elif engine == 'pipeline':
+            stage_stats = run_pipeline(
+                zip_files,
+                lambda zip_info, result: handle_result(result),
+                archive_options(calculate_checksums, calculate_md5, process_all_roms, calculate_sha1, calculate_crc32),
+                download_workers=max_workers,
+                parse_workers=parse_workers,
+                journal=journal,
+                trust_cache=trust_cache,
+                range_headers=range_headers,
+                metrics=metrics,
+                controller=controller,
+                spool_size=spool_size,
+                window=window
+            )
+        elif engine == 'async':
+            # Range reads are not used here; pooled connections are the saving
+            asyncio.run(run_async_engine(
+                zip_files,
+                lambda zip_info, result: handle_result(result),
+                max_workers=max_workers,
+                metrics=metrics,
+                calculate_checksum=calculate_checksums,
+                calculate_md5=calculate_md5,
+                process_all_roms=process_all_roms,
+                journal=journal,
+                trust_cache=trust_cache,
+                calculate_sha1=calculate_sha1,
+                calculate_crc32=calculate_crc32,
+                controller=controller,
+                spool_size=spool_size
+            ))
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+            completions = queue.Queue()
+            
+            def finished(zip_info, future):
+                if future.cancelled():
+                    return
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"\nError processing {zip_info['filename']}: {e}")
+                    result = None
+                completions.put((zip_info, result))
+            
+            def submit(zip_info):
+                future = executor.submit(
+                    run_measured,
+                    metrics,
+                    process_zip_file, 
+                    zip_info, 
+                    calculate_checksum=calculate_checksums,
+                    calculate_md5=calculate_md5,
+                    process_all_roms=process_all_roms,
+                    journal=journal,
+                    trust_cache=trust_cache,
+                    range_headers=range_headers,
+                    calculate_sha1=calculate_sha1,
+                    calculate_crc32=calculate_crc32,
+                    controller=controller,
+                    spool_size=spool_size
+                )
+                future.add_done_callback(functools.partial(finished, zip_info))
+            
+            try:
+                # Submit archives as they are discovered and process results as they complete
+                submit_as_discovered(zip_files, submit, completions, lambda zip_info, result: handle_result(result),
+                                     window or max_workers * SUBMIT_WINDOW_PER_WORKER)
+            finally:
+                # On interruption drop queued archives instead of finishing the crawl
+                executor.shutdown(wait=True, cancel_futures=True)
+    
+    except KeyboardInterrupt:
+        print("\n\nProcess interrupted by user! Writing partial results...")
+        logger.warning("\nInterrupted by user. Writing partial results...")
+        if sink is not None:
+            sink.interrupted = True
+        return results
+    
+    # Print final newline to ensure next log message starts on a new line
+    print("\n")
+    
+    if controller is not None:
+        print(f"Adaptive concurrency finished at {int(controller.limit)} downloads "
+              f"(peak {int(controller.peak)}, range {controller.minimum}-{controller.maximum})\n")
+    
+    if stage_stats:
+        # Show which stage is the bottleneck
+        wall_time = time.time() - start_time
+        print(f"Pipeline utilization over {wall_time:.1f}s:")
+        for stats in stage_stats:
+            print(stats.summary(wall_time))
+        print()
+    
+    return results
+
+
+def write_database(output, output_path, write_delta=True, compile=False, skip_unchanged=False, preference=None):
+    """Merge a StreamingOutput into output_path and write the files derived from it
+    
+    With skip_unchanged, an output_path that already holds the same records
+    is not rewritten, and neither is its changeset; output.unchanged says so.
+    With preference (a VariantPreference), records are clustered into games.
+    """
+    # Merge the sidecar into a sorted JSON file (sorted by filename and ROM filename for
+    # deterministic output) and swap it into place atomically
+    print(f"\nWriting {output.count} records to {output_path}")
+    changeset_path = os.path.splitext(output_path)[0] + '.delta.json'
+    changes = {}
+    
+    def describe_changes(temp_path):
+        # Runs before the swap, so the bot finds the changeset as soon as
+        # the new database appears
+        changes['changeset'] = write_changeset(output_path, temp_path, changeset_path)
+    
+    total = output.merge(before_replace=describe_changes if write_delta else None, skip_unchanged=skip_unchanged,
+                         preference=preference)
+    
+    if output.unchanged:
+        print(f"\nNo changes, {output_path} left as it was")
+    else:
+        print(f"\nDone! ROM data written to {output_path}")
+    
+    if changes.get('changeset'):
+        changeset = changes['changeset']
+        print(f"Changeset written to {changeset_path}: {len(changeset['added'])} added, "
+              f"{len(changeset['changed'])} changed, {len(changeset['removed'])} removed")
+    
+    compiled_path = os.path.splitext(output_path)[0] + '.bin'
+    if compile and not (output.unchanged and os.path.exists(compiled_path)):
+        compile_database_from_json(output_path, compiled_path)
+        print(f"Compiled database written to {compiled_path}")
+    
+    # Print some stats
+    print("\nDatabase Statistics:")
+    print(f"  Total ROMs: {total}")
+    for ext, count in output.extensions.items():
+        print(f"  {ext} files: {count}")
+    return total
+
+
+def variant_preference(args):
+    """The VariantPreference for clustering records, or None with --no-clusters"""
+    if args.no_clusters:
+        return None
+    return VariantPreference(args.region_priority, args.revision_priority)
+
+
+# Problems printed by the merge subcommand before it summarises the rest
+MERGE_PROBLEMS_SHOWN = 20
+
+
+def run_merge(args):
+    """Combine the outputs of a sharded crawl (the merge subcommand)"""
+    print(f"Merging {len(args.shards)} shard outputs into {args.output}")
+    output = StreamingOutput(args.output).open()
+    problems = merge_shards(args.shards, output)
+    
+    if problems:
+        output.close()
+        os.unlink(output.sidecar_path)
+        for problem in problems[:MERGE_PROBLEMS_SHOWN]:
+            logger.error(problem)
+        if len(problems) > MERGE_PROBLEMS_SHOWN:
+            logger.error(f"...and {len(problems) - MERGE_PROBLEMS_SHOWN} more")
+        print(f"\nNot writing {args.output}: the shards don't add up to a complete crawl")
+        return 1
+    
+    write_database(output, args.output, write_delta=not args.no_delta, compile=args.compile,
+                   preference=variant_preference(args))
+    return 0
+
+
+# How long --notify waits for the bot to answer on its update socket
+NOTIFY_TIMEOUT = 30
+
+
+class BotNotifier:
+    """Tells a running bot that a new database is in place (--notify)
+    
+    "unix:PATH" is the socket the bot listens on when ROM_UPDATE_SOCKET is
+    set: it is sent one JSON line and answers with another once it has
+    reloaded. "pid:N" and "pidfile:PATH" send the bot SIGUSR2 instead; the
+    pidfile is read each time, so a restarted bot is still found.
+    """
+    
+    def __init__(self, kind, target):
+        self.kind = kind
+        self.target = target
+    
+    @classmethod
+    def parse(cls, text):
+        """Parse unix:PATH, pid:N or pidfile:PATH, for argparse"""
+        kind, _, target = text.partition(':')
+        if kind not in ('unix', 'pid', 'pidfile') or not target:
+            raise argparse.ArgumentTypeError(f"expected unix:PATH, pid:N or pidfile:PATH, not '{text}'")
+        if kind == 'pid' and not target.isdigit():
+            raise argparse.ArgumentTypeError(f"expected a process ID after pid:, not '{target}'")
+        if kind != 'unix' and not hasattr(signal, 'SIGUSR2'):
+            raise argparse.ArgumentTypeError("signals aren't available on this platform, use unix:PATH")
+        return cls(kind, target)
+    
+    def __str__(self):
+        return f"{self.kind}:{self.target}"
+    
+    def notify(self, output_path, sha256, count):
+        """Send the notification, returning the bot's reply for a socket
+        
+        Raises OSError or ValueError when the bot can't be reached.
+        """
+        if self.kind == 'unix':
+            message = {'event': 'updated', 'path': os.path.abspath(output_path), 'sha256': sha256, 'count': count}
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(NOTIFY_TIMEOUT)
+                sock.connect(self.target)
+                sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+                with sock.makefile('r', encoding='utf-8') as reply:
+                    line = reply.readline()
+            if not line:
+                raise OSError("the bot closed the connection without answering")
+            return json.loads(line)
+        
+        if self.kind == 'pidfile':
+            with open(self.target, 'r') as f:
+                pid = int(f.read().strip())
+        else:
+            pid = int(self.target)
+        os.kill(pid, signal.SIGUSR2)
+        return None
+
+
+def notify_bot(notifiers, output_path, count):
+    """Tell each --notify target that output_path was replaced"""
+    sha256 = file_sha256(output_path)
+    for notifier in notifiers:
+        try:
+            reply = notifier.notify(output_path, sha256, count)
+        except (OSError, ValueError) as e:
+            # The bot still notices the new file by polling it
+            logger.warning(f"Couldn't notify the bot at {notifier}: {e}")
+            continue
+        if reply is None:
+            logger.info(f"Sent the bot at {notifier} a reload signal")
+        elif not reply.get('ok'):
+            logger.warning(f"The bot at {notifier} failed to reload: {reply.get('error')}")
+        elif reply.get('sha256') != sha256:
+            logger.warning(f"The bot at {notifier} reloaded, but not this database (it has {reply.get('sha256')})")
+        else:
+            logger.info(f"The bot at {notifier} reloaded {reply.get('count')} ROMs")
+
+
+def run_crawl(args, urls, journal, thumbnails, daemon=False):
+    """Run one crawl as configured by args and write the database
+    
+    Returns the StreamingOutput the records went to. In daemon mode nothing
+    is written when the crawl was interrupted (KeyboardInterrupt is raised
+    again) or a directory listing failed to load (None is returned), since
+    either would leave ROMs out of the database; an unchanged database is
+    not rewritten.
+    """
+    engine = args.engine
+    if args.source:
+        # Walk the local mirror instead of fetching directory listings
+        print(f"\nScanning local mirror {args.source}...")
+        zip_files = scan_local_mirror(args.source, skip_bios=not args.include_bios)
+        print(f"\nFound {len(zip_files)} total ROM files\n")
+        engine = 'local'
+    elif args.retry_failed:
+        # Re-run only failed archives; everything else comes from the journal
+        zip_files = journal.known()
+        print(f"\nRetrying {len(journal.failed())} failed archives from {journal.path}\n")
+        if args.shard:
+            # The journal only has this shard's archives; the listing the
+            # shards are compared on is the one from the original crawl
+            try:
+                with open(args.output + '.manifest', 'r', encoding='utf-8') as f:
+                    args.shard.listing = json.load(f).get('listing')
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"No shard manifest to take the listing from, merge will flag this shard: {e}")
+    else:
+        # Directory listings are fetched concurrently and parsed as they
+        # arrive; archives start downloading as soon as they are listed
+        print("\nFetching directory listings (archives are processed as they are found)")
+        zip_files = ListingFeed(urls, skip_bios=not args.include_bios,
+                                select=args.shard.select if args.shard else None)
+    
+    if args.shard and not isinstance(zip_files, ListingFeed):
+        zip_files = [zip_info for zip_info in zip_files if args.shard.select(zip_info)]
+    if args.shard:
+        print(f"Crawling shard {args.shard}: the archives whose name hashes to it, into {args.output}\n")
+    
+    if journal and journal.handle is None:
+        journal.open()
+    
+    # Per-archive connect/first byte/transfer/unzip/checksum timings
+    metrics = RunMetrics(args.metrics_json, args.metrics_textfile, args.metrics_interval)
+    
+    # Politeness towards the mirror: a per-host request rate and, with
+    # --adaptive, a download limit that follows its latency and errors
+    host_limits.configure(args.rate_limit, args.burst)
+    mirror_pool.configure(int(args.segment_threshold * 2**20), args.segment_connections)
+    # --download-workers only sizes the pipeline engine's download stage
+    workers = args.threads
+    if engine == 'pipeline' and args.download_workers:
+        workers = args.download_workers
+    controller = None
+    if args.adaptive and engine != 'local':
+        controller = ConcurrencyController(workers, maximum=args.max_threads)
+    
+    # Stream records to disk as they finish; Ctrl+C raises KeyboardInterrupt,
+    # which process_files_with_progress turns into a partial result
+    output = StreamingOutput(args.output, checkpoint_interval=args.checkpoint_interval).open()
+    
+    # Process ZIP files in parallel with progress reporting
+    print("Processing ZIP files (press Ctrl+C at any time to cancel and save partial results)...")
+    results = process_files_with_progress(
+        zip_files, 
+        max_workers=workers,
+        calculate_checksums=not args.no_checksums,
+        calculate_md5=args.calculate_md5,
+        process_all_roms=args.process_all_roms,
+        journal=journal,
+        trust_cache=args.retry_failed,
+        range_headers=not args.no_range_requests,
+        calculate_sha1=args.calculate_sha1,
+        calculate_crc32=args.calculate_crc32,
+        engine=engine,
+        parse_workers=args.parse_workers,
+        sink=output,
+        metrics=metrics,
+        controller=controller,
+        spool_size=int(args.spool_size * 2**20),
+        window=args.max_in_flight,
+        thumbnails=thumbnails
+    )
+    
+    if isinstance(zip_files, ListingFeed):
+        print(f"Found {zip_files.count} total ZIP files")
+    
+    if daemon and (output.interrupted or getattr(zip_files, 'failed', None)):
+        output.close()
+        os.unlink(output.sidecar_path)
+        if output.interrupted:
+            raise KeyboardInterrupt
+        logger.warning(f"Couldn't list {', '.join(zip_files.failed)}, keeping the current {args.output}")
+        return None
+    
+    # A shard's changeset and clusters would only cover its own partial
+    # output; the merged database gets them instead
+    write_database(output, args.output, write_delta=not args.no_delta and not args.shard,
+                   compile=args.compile, skip_unchanged=daemon,
+                   preference=None if args.shard else variant_preference(args))
+    if args.notify and not output.unchanged and not output.interrupted:
+        notify_bot(args.notify, args.output, output.count)
+    
+    if args.shard:
+        # Written after the output, and tied to it by its SHA-256, so a
+        # crash in between is caught by merge rather than trusted
+        failed = None
+        if journal:
+            failed = sorted(e['filename'] for e in journal.failed()
+                            if os.path.splitext(e['filename'])[0] in args.shard.listed
+                            and args.shard.owns(e['filename']))
+        manifest = args.shard.manifest(file_sha256(args.output), output.count,
+                                       not output.interrupted, failed)
+        write_atomically(args.output + '.manifest', json.dumps(manifest, indent=2))
+        print(f"\nShard {args.shard}: {args.shard.assigned} of {manifest['listing']['count']} listed archives. "
+              f"Once every shard is done, combine them with:")
+        print(f"  python3 scripts/fetch_gb_roms.py merge rom-list.*-of-{args.shard.count}.json")
+    
+    # Show whether the run was network-bound, CPU-bound or slowed by retries
+    print("\nWhere the time went:")
+    for line in metrics.report():
+        print(line)
+    metrics.write()
+    for path in (args.metrics_json, args.metrics_textfile):
+        if path:
+            print(f"Metrics written to {path}")
+    return output
+
+
+def run_daemon(args, urls, journal, thumbnails):
+    """Crawl every --interval seconds, replacing the database when it changes (--daemon)
+    
+    Everything loaded at start-up is kept between cycles: the journal's
+    records, so only archives the listings show as new or changed are
+    fetched, and the DAT and box art listings. A cycle that finds nothing
+    new leaves the database and the bot alone. SIGTERM or Ctrl+C stops the
+    daemon without writing a partial database, and SIGHUP starts the next
+    cycle at once.
+    """
+    wake = threading.Event()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: wake.set())
+    
+    logger.info(f"Refreshing {args.output} every {args.interval:g}s")
+    try:
+        while True:
+            wake.clear()
+            started = time.monotonic()
+            try:
+                output = run_crawl(args, urls, journal, thumbnails, daemon=True)
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                logger.error(f"Refresh failed, keeping the current {args.output}: {e}")
+                output = None
+            
+            if journal and journal.appended:
+                journal.compact()
+            
+            elapsed = time.monotonic() - started
+            if output is not None:
+                outcome = 'no changes' if output.unchanged else f"{output.count} records written"
+                logger.info(f"Refresh finished in {elapsed:.1f}s: {outcome}")
+            delay = max(0.0, args.interval - elapsed)
+            logger.info(f"Next refresh in {delay:.0f}s (send SIGHUP to start it now)")
+            wake.wait(delay)
+    
+    except KeyboardInterrupt:
+        print("\nStopping, the current database is left in place")
+    
+    finally:
+        if journal:
+            journal.compact()
+    return 0
+
+
+def load_config(config_file):
+    """Load configuration from a JSON file"""
+    try:
+        with open(config_file, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading config file {config_file}: {e}")
+        return None
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Fetch and parse Game Boy ROM headers from No-Intro archives')
+    
+    parser.add_argument('--output', '-o', type=str,
+                        help='Output JSON file (default: rom-list.json, or rom-list.K-of-N.json with --shard)')
+    
+    parser.add_argument('--shard', type=Shard.parse, metavar='K/N',
+                        help='Only crawl the Kth of N slices of the archive list, for combining with merge')
+    
+    parser.add_argument('--threads', '-t', type=int, default=8,
+                        help='Number of concurrent download threads (default: 8)')
+    
+    parser.add_argument('--engine', choices=['threads', 'async', 'pipeline'], default='threads',
+                        help='Processing engine: a thread pool, asyncio with pooled keep-alive connections, '
+                             'or download threads feeding a parser process pool (default: threads)')
+    
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Adapt the number of concurrent downloads to the mirror, starting at --threads')
+    
+    parser.add_argument('--max-threads', type=int, default=32,
+                        help='Upper bound on concurrent downloads with --adaptive (default: 32)')
+    
+    parser.add_argument('--rate-limit', type=float,
+                        help='Maximum requests per second to each mirror host (default: unlimited)')
+    
+    parser.add_argument('--burst', type=int,
+                        help='Requests allowed back to back before --rate-limit applies (default: the rate, at least 1)')
+    
+    parser.add_argument('--download-workers', type=int,
+                        help='Download threads for --engine pipeline (default: --threads)')
+    
+    parser.add_argument('--parse-workers', type=int,
+                        help='Parser processes for --engine pipeline and --source (default: CPU count)')
+    
+    parser.add_argument('--spool-size', type=float, default=SPOOL_SIZE / 2**20,
+                        help='Keep downloaded archives up to this many MiB in memory; larger ones go to a '
+                             f'temporary file (default: {SPOOL_SIZE // 2**20}, 0 to always use disk)')
+    
+    parser.add_argument('--segment-threshold', type=float, default=SEGMENT_THRESHOLD / 2**20,
+                        help='Download archives of at least this many MiB in parallel Range segments, spread over '
+                             f'their mirrors (default: {SEGMENT_THRESHOLD // 2**20}, 0 to turn off)')
+    
+    parser.add_argument('--segment-connections', type=int, default=SEGMENT_CONNECTIONS,
+                        help=f'Segments of one archive downloaded at once (default: {SEGMENT_CONNECTIONS})')
+    
+    parser.add_argument('--max-in-flight', type=int,
+                        help='Archives queued or in progress at once with the threads and pipeline engines and --source '
+                             f'(default: {SUBMIT_WINDOW_PER_WORKER} per worker)')
+    
+    parser.add_argument('--no-checksums', action='store_true',
+                        help='Skip header checksum verification')
+    
+    parser.add_argument('--calculate-md5', action='store_true',
+                        help='Calculate MD5 hashes for each ROM (increases processing time)')
+    
+    parser.add_argument('--calculate-sha1', action='store_true',
+                        help='Calculate SHA-1 hashes for each ROM, as listed in No-Intro DATs')
+    
+    parser.add_argument('--calculate-crc32', action='store_true',
+                        help='Calculate CRC32 checksums for each ROM, as listed in No-Intro DATs')
+    
+    parser.add_argument('--dat', type=str, action='append',
+                        help='No-Intro DAT (XML, or the .zip it ships in) to take MD5/SHA-1 from and check ROMs against; '
+                             'implies --calculate-crc32 and may be given more than once')
+    
+    parser.add_argument('--thumbnails', type=str, metavar='DIR|github',
+                        help='Store each ROM\'s box art URL (or null) as "thumbnail", checked against local checkouts of '
+                             'the libretro-thumbnails repositories in DIR, or "github" to list them through the GitHub API')
+    
+    parser.add_argument('--no-range-requests', action='store_true',
+                        help='Always download whole archives, even when only ROM headers are needed')
+    
+    parser.add_argument('--process-all-roms', action='store_true',
+                        help='Process all ROMs in multi-ROM ZIP files (not just the first one)')
+    
+    parser.add_argument('--include-bios', action='store_true',
+                        help='Include BIOS files in processing')
+    
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='Enable verbose logging')
+    
+    parser.add_argument('--no-private', action='store_true',
+                        help='Skip private collections')
+    
+    parser.add_argument('--config', '-c', type=str,
+                        help='Path to config JSON file with custom URLs; each entry of "urls" is a collection\'s '
+                             'URL or a list of equivalent mirrors for it')
+    
+    parser.add_argument('--source', type=str,
+                        help='Read .zip archives and bare .gb/.gbc ROMs from a local mirror instead of the network')
+    
+    parser.add_argument('--compile', action='store_true',
+                        help='Also write a compiled database with a search index next to the output (e.g. rom-list.bin)')
+    
+    parser.add_argument('--no-delta', action='store_true',
+                        help='Don\'t write the changeset against the previous output (e.g. rom-list.delta.json) '
+                             'that lets the bot patch its index instead of reloading')
+    
+    parser.add_argument('--region-priority', type=VariantPreference.parse_regions,
+                        default=list(DEFAULT_REGION_PRIORITY),
+                        help='Regions to prefer when picking the variant shown for each game, most preferred first '
+                             f"(default: {','.join(DEFAULT_REGION_PRIORITY)})")
+    
+    parser.add_argument('--revision-priority', choices=REVISION_PRIORITIES, default='latest',
+                        help='Prefer the latest or the earliest revision of a game (default: latest)')
+    
+    parser.add_argument('--no-clusters', action='store_true',
+                        help='Don\'t group records into games (the clusterId and variantRank fields)')
+    
+    parser.add_argument('--checkpoint-interval', type=float, default=30,
+                        help='Seconds between fsync\'d checkpoints of streamed records (default: 30)')
+    
+    parser.add_argument('--metrics-json', type=str,
+                        help='Write per-stage timing and byte histograms for the run as JSON to this file')
+    
+    parser.add_argument('--metrics-textfile', type=str,
+                        help='Write the same metrics in Prometheus text format (e.g. for node_exporter\'s textfile collector)')
+    
+    parser.add_argument('--metrics-interval', type=float,
+                        help='Also rewrite the metrics files during the run, at most every this many seconds')
+    
+    parser.add_argument('--journal', type=str,
+                        help='Crawl journal used to skip unchanged archives (default: <output>.journal)')
+    
+    parser.add_argument('--no-journal', action='store_true',
+                        help='Ignore the crawl journal and download every archive')
+    
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='Only re-run archives the journal recorded as failed, reusing everything else')
+    
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running and crawl again every --interval seconds, fetching only new or changed '
+                             'archives and replacing the output only when it changes')
+    
+    parser.add_argument('--interval', type=float, default=3600,
+                        help='Seconds between the starts of crawls with --daemon (default: 3600)')
+    
+    parser.add_argument('--notify', type=BotNotifier.parse, action='append', metavar='TARGET',
+                        help='Tell the bot when the output is replaced: unix:PATH for its ROM_UPDATE_SOCKET, or '
+                             'pid:N or pidfile:PATH to send it SIGUSR2 (may be given more than once)')
+    
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    merge_parser = subparsers.add_parser('merge', help='Combine the outputs of a --shard K/N crawl',
+                                         description='Combine the outputs of a --shard K/N crawl into one '
+                                                     'database, checking for missing and duplicate records')
+    
+    merge_parser.add_argument('shards', nargs='+',
+                              help='Shard outputs, each with the .manifest written next to it')
+    
+    # SUPPRESS keeps these from resetting the same options given before "merge"
+    merge_parser.add_argument('--output', '-o', type=str, default=argparse.SUPPRESS,
+                              help='Output JSON file (default: rom-list.json)')
+    
+    merge_parser.add_argument('--compile', action='store_true', default=argparse.SUPPRESS,
+                              help='Also write the compiled database next to the output')
+    
+    merge_parser.add_argument('--no-delta', action='store_true', default=argparse.SUPPRESS,
+                              help='Don\'t write the changeset against the previous output')
+    
+    merge_parser.add_argument('--region-priority', type=VariantPreference.parse_regions, default=argparse.SUPPRESS,
+                              help='Regions to prefer for the variant shown for each game')
+    
+    merge_parser.add_argument('--revision-priority', choices=REVISION_PRIORITIES, default=argparse.SUPPRESS,
+                              help='Prefer the latest or the earliest revision of a game')
+    
+    merge_parser.add_argument('--no-clusters', action='store_true', default=argparse.SUPPRESS,
+                              help='Don\'t group records into games')
+    
+    return parser.parse_args()
+
+
+def main():
+    """Main function to coordinate the fetching and processing of ROM data"""
+    # Parse command line arguments
+    args = parse_arguments()
+    
+    # Set logging level based on verbosity
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    
+    # Print banner
+    print("\n================================")
+    print("  GB ROM Database Builder")
+    print("================================\n")
+    
+    if args.output is None:
+        args.output = f"rom-list.{args.shard.index}-of-{args.shard.count}.json" if args.shard else 'rom-list.json'
+    
+    if args.command == 'merge':
+        try:
+            return run_merge(args)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error merging shards: {e}")
+            return 1
+    
+    if args.daemon and (args.shard or args.retry_failed or args.no_journal):
+        logger.error("--daemon relies on the crawl journal and cannot be used with --shard, --retry-failed "
+                     "or --no-journal")
+        return 1
+    
+    # Define URLs to fetch based on arguments or config file
+    if args.config:
+        config = load_config(args.config)
+        if config and 'urls' in config:
+            # A collection is a URL or a list of equivalent mirrors
+            urls = config['urls']
+            logger.info(f"Loaded {len(urls)} collections from config file, "
+                        f"{sum(1 if isinstance(url, str) else len(url) for url in urls)} URLs in all")
+        else:
+            logger.error("Invalid config file or missing 'urls' key")
+            return
+    else:
+        # Default URLs
+        base_urls = [
+            "https://myrient.erista.me/files/No-Intro/Nintendo%20-%20Game%20Boy/",
+            "https://myrient.erista.me/files/No-Intro/Nintendo%20-%20Game%20Boy%20Color/"
+        ]
+        
+        private_urls = [
+            "https://myrient.erista.me/files/No-Intro/Nintendo%20-%20Game%20Boy%20(Private)/",
+            "https://myrient.erista.me/files/No-Intro/Nintendo%20-%20Game%20Boy%20Color%20(Private)/"
+        ]
+        
+        urls = base_urls if args.no_private else base_urls + private_urls
+    
+    if args.dat:
+        # Hashes come from the DAT where it lists a ROM, and CRC32s from the
+        # ZIP central directory, which also lets the journal match by CRC
+        try:
+            use_dat(RomDat.load(args.dat))
+        except (OSError, ValueError, zipfile.BadZipFile, xml.etree.ElementTree.ParseError) as e:
+            logger.error(f"Error loading DAT: {e}")
+            return
+        args.calculate_crc32 = True
+    
+    # Box art is looked up once here instead of by the bot for every result
+    thumbnails = None
+    if args.thumbnails:
+        try:
+            thumbnails = BoxArtIndex.load(args.thumbnails)
+        except (OSError, ValueError, KeyError) as e:
+            # Records without the field make the bot look box art up itself
+            logger.warning(f"Error listing box art, leaving thumbnails out: {e}")
+    
+    # Open the crawl journal so unchanged archives can be skipped; a local
+    # mirror is cheap enough to re-read in full
+    journal = None
+    if args.source:
+        if args.retry_failed:
+            logger.error("--retry-failed cannot be used with --source")
+            return
+    elif not args.no_journal:
+        journal = CrawlJournal(args.journal or args.output + '.journal').load()
+    elif args.retry_failed:
+        logger.error("--retry-failed requires the crawl journal")
+        return
+    
+    if args.daemon:
+        return run_daemon(args, urls, journal, thumbnails)
+    
+    try:
+        run_crawl(args, urls, journal, thumbnails)
+    
+    except KeyboardInterrupt:
+        print("\nProcess interrupted by user")
+        # Results will be written from the process_files_with_progress function
+    
+    except Exception as e:
         logger.error(f"Unexpected error: {e}")
         print(f"\nError: {e}")
+    
+    finally:
+        if journal:
+            journal.compact()
 
 
 if __name__ == "__main__":
     # Import additional modules
     import sys
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+"""1G1R clustering: one game, one preferred ROM
+
+rom-list.json has a record for every regional release, revision, prototype
+and beta of a game. cluster_records() groups them into games and ranks the
+variants of each, so the bot can search one entry per game and list the
+rest on request. Two records are the same game when:
+
+- their names are the same once every tag but serial numbers is dropped,
+  compared after normalizeGameTitle() ("Tetris DX (World)", "Tetris DX
+  (Japan) (Rev 1)"), and both need a Game Boy Color or neither does, or
+- they hold the same ROM under different names: same header title, ROM
+  size and valid global checksum ("Bart no Survival Camp (Japan)" and
+  "Bart Simpson's Escape from Camp Deadly (USA, Europe)")
+
+Each record gets two fields:
+
+    clusterId    stable ID of its game, a hash of the game's first title
+    variantRank  0 for the variant to show for the game, then 1, 2, ...
+
+and the variant shown for a game whose records go by more than one title
+also gets:
+
+    clusterTitles  every title of the game, so the bot can search them all
+
+Variants are ranked good dumps first, then retail releases before
+prototypes, betas, demos and the like, then by VariantPreference's region
+priority, then by revision (latest first by default), then alternates
+last, valid checksums first and by filename.
+
+    python3 scripts/rom_clusters.py rom-list.json --region-priority Europe,World,USA
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from rom_database import JS_WHITESPACE, COMMA_ARTICLE, normalize_game_title
+from rom_filename import parse_filename
+
+# Regions preferred for the variant shown, most preferred first
+DEFAULT_REGION_PRIORITY = ('USA', 'World', 'Europe', 'Australia', 'Canada', 'UK', 'Japan')
+
+# Flags that make a variant rank after every retail release of the game
+NON_RELEASE_FLAGS = frozenset(('Proto', 'Beta', 'Demo', 'Sample', 'Kiosk', 'Debug', 'Pirate'))
+
+REVISION_PRIORITIES = ('latest', 'earliest')
+# Revisions compare as this many dot-separated parts, "v1.2.3" being the longest in use
+REVISION_PARTS = 4
+
+TAG = re.compile(r'\([^()]*\)|\[[^\[\]]*\]')
+# Catalog numbers that tell apart carts sold under one name ("4 in 1 (Europe) (4B-001, Sachen-Commin)")
+SERIAL = re.compile(r'\b[0-9]*[A-Z]+[0-9]*-[0-9]{3,4}\b')
+REVISION_PREFIX = re.compile(r'^(?:Rev |v)')
+REVISION_PART = re.compile(r'[0-9]+|[A-Za-z]')
+
+
+def game_title(filename):
+    """normalizeGameTitle() of a filename with every tag but serial numbers removed
+
+    extractBaseTitle() only drops the last tag, which keeps "(USA)" in
+    "Tetris (USA) (Rev 1)"; this drops them all so the regional releases of
+    a game share a title. Serial numbers in tags are kept after the title,
+    as they are all that tells apart the multicarts sold under one name.
+    """
+    filename = filename or ''
+    serials = [serial for tag in TAG.findall(filename) for serial in SERIAL.findall(tag)]
+    base = ' '.join(TAG.sub(' ', filename).split())
+    match = COMMA_ARTICLE.match(base)
+    if match:
+        base = f"{match.group(2)} {match.group(1)}" + (f" - {match.group(3)}" if match.group(3) else '')
+    if serials:
+        base = ' '.join([base.strip(JS_WHITESPACE)] + serials)
+    return normalize_game_title(base.strip(JS_WHITESPACE)) or normalize_game_title(filename)
+
+
+def record_title(record):
+    """game_title() of the ROM's own name, or of the archive's when there is none
+
+    The ROM name is the one to trust: databases from older crawls cut
+    archive names at the first dot ("E.T", "J").
+    """
+    rom_filename = record.get('rom_filename')
+    if rom_filename:
+        return game_title(os.path.splitext(rom_filename)[0])
+    return game_title(record.get('filename'))
+
+
+def needs_cgb(record):
+    """Whether the ROM only runs on a Game Boy Color
+
+    A CGB-only release and a DMG one that share a name ("Aladdin (USA)") are
+    different games.
+    """
+    return record.get('cgbFlag') == 'CGB Only'
+
+
+def rom_signature(record):
+    """What identifies the same ROM under another name, or None when the header can't tell"""
+    title = (record.get('title') or '').strip()
+    if not title or not record.get('globalChecksumValid'):
+        return None
+    return title, record.get('romSize'), record.get('globalChecksum')
+
+
+def revision_key(revision):
+    """Revision as a tuple that sorts oldest first; no revision is the oldest
+
+    "Rev 1" < "Rev 2" < "Rev A"; "v1.0" < "v1.1" < "v1.10".
+    """
+    if not revision:
+        return (-1,) * REVISION_PARTS
+    parts = [int(part, 36) for part in REVISION_PART.findall(REVISION_PREFIX.sub('', revision))]
+    parts = parts[:REVISION_PARTS]
+    return tuple(parts) + (-1,) * (REVISION_PARTS - len(parts))
+
+
+class VariantPreference:
+    """Which variant of a game to show: region and revision priority"""
+
+    def __init__(self, regions=DEFAULT_REGION_PRIORITY, revision='latest'):
+        if revision not in REVISION_PRIORITIES:
+            raise ValueError(f"revision priority must be one of {', '.join(REVISION_PRIORITIES)}, not {revision}")
+        self.regions = {}
+        for region in regions:
+            self.regions.setdefault(region.lower(), len(self.regions))
+        self.revision = revision
+
+    @staticmethod
+    def parse_regions(text):
+        """Parse a comma-separated region list, for argparse"""
+        regions = [region.strip() for region in text.split(',') if region.strip()]
+        if not regions:
+            raise argparse.ArgumentTypeError("expected regions such as USA,World,Europe")
+        return regions
+
+    def region_rank(self, regions):
+        """Position of the best of regions in the priority list; unlisted and untagged come last"""
+        if not regions:
+            return len(self.regions) + 1
+        return min(self.regions.get(region.lower(), len(self.regions)) for region in regions)
+
+    def sort_key(self, record):
+        """Sort key over the variants of one game, the one to show first"""
+        if 'flags' in record:
+            regions, revision, flags = record.get('regions'), record.get('revision'), record['flags']
+        else:
+            # Records from before fetch_gb_roms.py parsed filenames
+            fields = parse_filename(record.get('filename'), record.get('region'))
+            regions, revision, flags = fields['regions'], fields['revision'], fields['flags']
+
+        revision = revision_key(revision)
+        if self.revision == 'latest':
+            revision = tuple(-part for part in revision)
+        return (
+            'Bad Dump' in flags,
+            any(flag in NON_RELEASE_FLAGS for flag in flags),
+            self.region_rank(regions),
+            revision,
+            'Alt' in flags,
+            not record.get('globalChecksumValid', True),
+            record.get('filename') or '',
+            record.get('rom_filename') or ''
+        )
+
+
+class ClusterBuilder:
+    """Groups records into games as they are added, then ranks each game's variants
+
+    Only a title, a signature and a sort key are kept per record, so a
+    database can be clustered while its records are streamed.
+    """
+
+    def __init__(self, preference=None):
+        self.preference = preference or VariantPreference()
+        self.parent = []
+        self.titles = []
+        self.cgb_only = []
+        self.sort_keys = []
+        # First row seen with each title and each ROM signature
+        self.rows_by_key = {}
+
+    def _find(self, row):
+        while self.parent[row] != row:
+            self.parent[row] = self.parent[self.parent[row]]
+            row = self.parent[row]
+        return row
+
+    def _union(self, row, other):
+        root, other_root = self._find(row), self._find(other)
+        if root != other_root:
+            self.parent[max(root, other_root)] = min(root, other_root)
+
+    def add(self, record):
+        """Add a record and return its row number"""
+        row = len(self.parent)
+        title = record_title(record)
+        cgb_only = needs_cgb(record)
+        self.parent.append(row)
+        self.titles.append(title)
+        self.cgb_only.append(cgb_only)
+        self.sort_keys.append(self.preference.sort_key(record))
+
+        for key in (('title', (title, cgb_only)), ('rom', rom_signature(record))):
+            if key[1] is None:
+                continue
+            first = self.rows_by_key.setdefault(key, row)
+            if first != row:
+                self._union(row, first)
+        return row
+
+    def assign(self):
+        """Return (clusterId, variantRank, clusterTitles) for every row, in the order they were added
+
+        A cluster's ID hashes the alphabetically first title among its
+        records, with a marker for CGB-only games, so it stays the same as
+        long as that title does. clusterTitles lists a game's distinct
+        titles on its rank 0 row when there is more than one, and is None
+        otherwise.
+        """
+        members = {}
+        for row in range(len(self.parent)):
+            members.setdefault(self._find(row), []).append(row)
+
+        assigned = [None] * len(self.parent)
+        for rows in members.values():
+            titles = sorted({self.titles[row] for row in rows})
+            key = titles[0] + ('\0CGB Only' if self.cgb_only[rows[0]] else '')
+            cluster_id = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+            for rank, row in enumerate(sorted(rows, key=self.sort_keys.__getitem__)):
+                assigned[row] = (cluster_id, rank, titles if rank == 0 and len(titles) > 1 else None)
+        return assigned
+
+
+def set_cluster_fields(record, assigned):
+    """Store one row of ClusterBuilder.assign() on its record, replacing what it had"""
+    record['clusterId'], record['variantRank'], titles = assigned
+    if titles is None:
+        record.pop('clusterTitles', None)
+    else:
+        record['clusterTitles'] = titles
+
+
+def cluster_records(records, preference=None):
+    """Set clusterId, variantRank and clusterTitles on every record in a list"""
+    builder = ClusterBuilder(preference)
+    for record in records:
+        builder.add(record)
+    for record, assigned in zip(records, builder.assign()):
+        set_cluster_fields(record, assigned)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Group a ROM database into games and pick the variant shown for each')
+    parser.add_argument('database', help='rom-list.json to cluster')
+    parser.add_argument('--region-priority', type=VariantPreference.parse_regions,
+                        default=list(DEFAULT_REGION_PRIORITY),
+                        help=f"Regions to prefer, most preferred first (default: {','.join(DEFAULT_REGION_PRIORITY)})")
+    parser.add_argument('--revision-priority', choices=REVISION_PRIORITIES, default='latest',
+                        help='Prefer the latest or the earliest revision (default: latest)')
+    parser.add_argument('--output', '-o', type=str,
+                        help='Write the database with clusterId and variantRank set to this file')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Largest games to list (default: 10)')
+    args = parser.parse_args()
+
+    with open(args.database, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    cluster_records(records, VariantPreference(args.region_priority, args.revision_priority))
+
+    games = {}
+    for record in records:
+        games.setdefault(record['clusterId'], []).append(record)
+    print(f"{len(records)} ROMs in {len(games)} games")
+    for variants in sorted(games.values(), key=len, reverse=True)[:args.top]:
+        variants.sort(key=lambda record: record['variantRank'])
+        print(f"  {len(variants):3d}  {variants[0]['filename']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=2)
+        print(f"Written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+"""Compiled ROM database written alongside rom-list.json
+
+rom-list.bin holds the same records as rom-list.json in a compact columnar
+layout, together with the base titles and normalized titles the bot would
+otherwise recompute on every load, and a token/trigram inverted index over
+the normalized titles.
+
+Layout (all integers little-endian):
+
+    magic "GBROMDB1" | uint32 header length | header JSON | sections
+
+The header describes every section by absolute byte offset:
+
+    strings   uint32 offsets[count + 1], then the UTF-8 string data
+    columns   one per record field; 'str' and 'json' are uint32 string ids,
+              'int' is int32, 'bool' is uint8 (0/1); missing values are
+              0xFFFFFFFF, -2**31 and 255 respectively
+    tokens,   entries of (uint32 string id, uint32 postings start,
+    trigrams  uint32 postings count) sorted by key, then uint32 row ids
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+
+MAGIC = b'GBROMDB1'
+FORMAT_VERSION = 1
+
+MISSING_STRING = 0xFFFFFFFF
+MISSING_INT = -2 ** 31
+MISSING_BOOL = 255
+
+# Sentinel for fields a record doesn't have
+MISSING = object()
+
+# Fields computed from each record at compile time
+DERIVED_COLUMNS = ('baseTitle', 'normalizedTitle')
+
+# Whitespace stripped by JavaScript's String.prototype.trim()
+JS_WHITESPACE = (' \t\n\v\f\r\u00a0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006'
+                 '\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000\ufeff')
+
+ROM_EXTENSION = re.compile(r'\.[gG][bBcCxX]?$')
+TRAILING_PARENS = re.compile(r'\s*\([^)]*\)\s*$')
+COMMA_ARTICLE = re.compile(r'^(.*),\s*(The|A|An)\s*(?:-\s*(.*))?$', re.IGNORECASE)
+ABBREVIATION_PERIOD = re.compile(r'\b(dr|mr|mrs|ms|prof|inc|ltd|co|corp|llc)\.')
+NON_TITLE_CHARS = re.compile(r'[^a-z0-9. ]')
+WHITESPACE_RUN = re.compile(r'\s+')
+
+
+def extract_base_title(filename):
+    """Port of extractBaseTitle() in loadRomData.js"""
+    if not filename:
+        return 'Unknown Game'
+
+    # Remove extension, then one trailing parentheses group
+    base = ROM_EXTENSION.sub('', filename, count=1)
+    base = TRAILING_PARENS.sub('', base, count=1)
+
+    # Handle comma-article patterns ("Legend of Zelda, The - ...")
+    match = COMMA_ARTICLE.match(base)
+    if match:
+        if match.group(3):
+            return f"{match.group(2)} {match.group(1)} - {match.group(3)}"
+        return f"{match.group(2)} {match.group(1)}"
+
+    return base.strip(JS_WHITESPACE)
+
+
+def normalize_game_title(title):
+    """Port of normalizeGameTitle() in loadRomData.js"""
+    if not title:
+        return ''
+
+    title = title.lower()
+    # Preserve periods in common abbreviations
+    title = ABBREVIATION_PERIOD.sub(r'\1', title)
+    # Replace other punctuation with spaces
+    title = NON_TITLE_CHARS.sub(' ', title)
+    title = WHITESPACE_RUN.sub(' ', title)
+    return title.strip(JS_WHITESPACE)
+
+
+def title_tokens(normalized_title):
+    """Distinct whitespace-separated tokens of a normalized title"""
+    return sorted(set(token for token in normalized_title.split(' ') if token))
+
+
+def title_trigrams(normalized_title):
+    """Distinct trigrams of a normalized title, padded so short words still index"""
+    if not normalized_title:
+        return []
+    padded = f" {normalized_title} "
+    return sorted(set(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+class StringTable:
+    """Deduplicated string table"""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def add(self, value):
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def encode(self):
+        data = [s.encode('utf-8') for s in self.strings]
+        offsets = [0]
+        for item in data:
+            offsets.append(offsets[-1] + len(item))
+        return struct.pack(f'<{len(offsets)}L', *offsets) + b''.join(data)
+
+
+def column_type(values):
+    """Pick the narrowest column type that can hold every present value"""
+    present = [v for v in values if v is not MISSING]
+    if present and all(isinstance(v, bool) for v in present):
+        return 'bool'
+    if present and all(isinstance(v, int) and not isinstance(v, bool) and MISSING_INT < v < 2 ** 31
+                       for v in present):
+        return 'int'
+    if all(isinstance(v, str) for v in present):
+        return 'str'
+    return 'json'
+
+
+def build_postings(keys_per_row, strings):
+    """Encode an inverted index as sorted entries followed by postings"""
+    postings = {}
+    for row, keys in enumerate(keys_per_row):
+        for key in keys:
+            postings.setdefault(key, []).append(row)
+
+    entries = []
+    rows = []
+    for key in sorted(postings):
+        entries.append((strings.add(key), len(rows), len(postings[key])))
+        rows.extend(postings[key])
+
+    entry_bytes = b''.join(struct.pack('<3L', *entry) for entry in entries)
+    return entry_bytes, struct.pack(f'<{len(rows)}L', *rows), len(entries), len(rows)
+
+
+def compile_database(records, output_path, source_sha256=None, source_size=None, source_mtime_ns=None):
+    """Write records and their search index to a compiled database file
+
+    The source's size and modification time let the bot trust the file
+    without hashing rom-list.json on every start.
+    """
+    strings = StringTable()
+
+    # Columns in order of first appearance, so records rebuild with the same key order
+    names = []
+    for record in records:
+        for name in record:
+            if name not in names and name not in DERIVED_COLUMNS:
+                names.append(name)
+
+    base_titles = [extract_base_title(record.get('filename')) for record in records]
+    normalized_titles = [normalize_game_title(base) for base in base_titles]
+
+    columns = [(name, [record.get(name, MISSING) for record in records], False) for name in names]
+    columns.append(('baseTitle', base_titles, True))
+    columns.append(('normalizedTitle', normalized_titles, True))
+
+    sections = []
+    column_headers = []
+    for name, values, derived in columns:
+        kind = column_type(values)
+        if kind == 'bool':
+            data = bytes(MISSING_BOOL if v is MISSING else int(v) for v in values)
+        elif kind == 'int':
+            data = struct.pack(f'<{len(values)}l', *(MISSING_INT if v is MISSING else v for v in values))
+        elif kind == 'str':
+            data = struct.pack(f'<{len(values)}L', *(MISSING_STRING if v is MISSING else strings.add(v)
+                                                     for v in values))
+        else:
+            data = struct.pack(f'<{len(values)}L', *(MISSING_STRING if v is MISSING
+                                                     else strings.add(json.dumps(v)) for v in values))
+        header = {'name': name, 'type': kind}
+        if derived:
+            header['derived'] = True
+        column_headers.append(header)
+        sections.append((header, data))
+
+    token_entries, token_rows, token_count, token_postings = build_postings(
+        [title_tokens(t) for t in normalized_titles], strings)
+    trigram_entries, trigram_rows, trigram_count, trigram_postings = build_postings(
+        [title_trigrams(t) for t in normalized_titles], strings)
+
+    index_headers = {
+        'tokens': {'count': token_count, 'postingsCount': token_postings},
+        'trigrams': {'count': trigram_count, 'postingsCount': trigram_postings}
+    }
+    sections.append((index_headers['tokens'], token_entries))
+    sections.append(({'postings': 'tokens'}, token_rows))
+    sections.append((index_headers['trigrams'], trigram_entries))
+    sections.append(({'postings': 'trigrams'}, trigram_rows))
+
+    string_header = {'count': len(strings.strings)}
+    sections.append((string_header, strings.encode()))
+
+    header = {
+        'version': FORMAT_VERSION,
+        'count': len(records),
+        # A string, as nanoseconds since the epoch are beyond JavaScript's exact integers
+        'source': {'sha256': source_sha256, 'size': source_size,
+                   'mtimeNs': None if source_mtime_ns is None else str(source_mtime_ns)},
+        'columns': column_headers,
+        'strings': string_header,
+        'tokens': index_headers['tokens'],
+        'trigrams': index_headers['trigrams']
+    }
+
+    # Offsets depend on the header's own length, so lay out until it settles
+    header_bytes = b''
+    while True:
+        offset = align(len(MAGIC) + 4 + len(header_bytes))
+        for section, data in sections:
+            if 'postings' in section:
+                index_headers[section['postings']]['postingsOffset'] = offset
+            else:
+                section['offset'] = offset
+            offset = align(offset + len(data))
+        encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        settled = len(encoded) == len(header_bytes)
+        header_bytes = encoded
+        if settled:
+            break
+
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<L', len(header_bytes)))
+        f.write(header_bytes)
+        for _, data in sections:
+            f.write(b'\0' * (align(f.tell()) - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, output_path)
+
+
+def align(offset, boundary=4):
+    return (offset + boundary - 1) // boundary * boundary
+
+
+def compile_database_from_json(json_path, output_path):
+    """Compile rom-list.json, recording its hash so stale artifacts are detected"""
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+        mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+    records = json.loads(raw)
+    compile_database(records, output_path, hashlib.sha256(raw).hexdigest(), len(raw), mtime_ns)
+    return len(records)
+
+
+class CompiledDatabase:
+    """Reader for rom-list.bin"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a compiled ROM database")
+        (header_length,) = struct.unpack_from('<L', self.data, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self.data[start:start + header_length])
+        if self.header['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled database version {self.header['version']}")
+        self.count = self.header['count']
+
+        strings = self.header['strings']
+        count = strings['count']
+        offsets = struct.unpack_from(f'<{count + 1}L', self.data, strings['offset'])
+        base = strings['offset'] + 4 * (count + 1)
+        self.strings = [self.data[base + offsets[i]:base + offsets[i + 1]].decode('utf-8') for i in range(count)]
+
+    def column(self, name):
+        """Return one column as a list, with None for missing values"""
+        for column in self.header['columns']:
+            if column['name'] == name:
+                return self._decode_column(column)
+        raise KeyError(name)
+
+    def _decode_column(self, column, missing=None):
+        offset, kind, n = column['offset'], column['type'], self.count
+        if kind == 'bool':
+            return [missing if v == MISSING_BOOL else bool(v) for v in self.data[offset:offset + n]]
+        if kind == 'int':
+            return [missing if v == MISSING_INT else v for v in struct.unpack_from(f'<{n}l', self.data, offset)]
+        ids = struct.unpack_from(f'<{n}L', self.data, offset)
+        if kind == 'str':
+            return [missing if i == MISSING_STRING else self.strings[i] for i in ids]
+        return [missing if i == MISSING_STRING else json.loads(self.strings[i]) for i in ids]
+
+    def records(self):
+        """Rebuild the rom-list.json records (without derived columns)
+
+        Fields stored as JSON null, such as a "thumbnail" with no box art,
+        come back as None; only fields a record didn't have are left out.
+        """
+        columns = [(c['name'], self._decode_column(c, MISSING)) for c in self.header['columns']
+                   if not c.get('derived')]
+        records = []
+        for row in range(self.count):
+            record = {}
+            for name, values in columns:
+                value = values[row]
+                if value is not MISSING:
+                    record[name] = value
+            records.append(record)
+        return records
+
+    def index(self, name):
+        """Return the 'tokens' or 'trigrams' inverted index as {key: [row, ...]}"""
+        section = self.header[name]
+        entries = struct.unpack_from(f"<{section['count'] * 3}L", self.data, section['offset'])
+        rows = struct.unpack_from(f"<{section['postingsCount']}L", self.data, section['postingsOffset'])
+        return {
+            self.strings[entries[i]]: list(rows[entries[i + 1]:entries[i + 1] + entries[i + 2]])
+            for i in range(0, len(entries), 3)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile rom-list.json into rom-list.bin')
+    parser.add_argument('input', nargs='?', default='rom-list.json',
+                        help='ROM list JSON file (default: rom-list.json)')
+    parser.add_argument('--output', '-o', type=str,
+                        help='Compiled database path (default: input with a .bin extension)')
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + '.bin'
+    count = compile_database_from_json(args.input, output)
+    print(f"Compiled {count} records to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+"""No-Intro filename parsing, done once when the database is built
+
+A No-Intro name is a title followed by parenthesized and bracketed tags:
+"Pokemon - Red Version (USA, Europe) (SGB Enhanced)". parse_filename()
+splits it with one compiled tokenizer, classifies each distinct tag once
+(the same few hundred tags recur across the whole set), and returns the
+fields the bot would otherwise work out with regexes for every result it
+shows:
+
+    baseTitle      extractBaseTitle() in loadRomData.js
+    displayTitle   cleanTitle(baseTitle) in utils/titles.js, the embed title
+    displayRegion  the embed's Region field, getDisplayRegion() in utils/titles.js
+    regionFlag     the flagMap key pickRegionEmoji() in utils/regions.js picks
+    regions        region names from the region tag, e.g. ["USA", "Europe"]
+    languages      language codes, e.g. ["En", "Fr", "De"]
+    revision       "Rev 1", "v1.1", or None
+    flags          status tags: Proto, Beta, Demo, Sample, Unl, Pirate, ...
+    sgbEnhanced    whether the name has an SGB Enhanced tag
+
+The first four reproduce the JavaScript helpers exactly, quirks included;
+scripts/check-filename-fields.js compares them on a whole rom-list.json.
+
+    python3 scripts/rom_filename.py "Tetris DX (World) (Rev 1) (SGB Enhanced)"
+"""
+
+import argparse
+import functools
+import json
+import re
+
+from rom_database import JS_WHITESPACE, extract_base_title
+
+# Region names No-Intro uses, by lowercased name
+NO_INTRO_REGIONS = {name.lower(): name for name in (
+    'World', 'USA', 'Europe', 'Japan', 'Asia', 'Australia', 'Brazil', 'Canada', 'China', 'Denmark', 'Finland',
+    'France', 'Germany', 'Greece', 'Hong Kong', 'India', 'Israel', 'Italy', 'Korea', 'Latin America', 'Mexico',
+    'Netherlands', 'New Zealand', 'Norway', 'Poland', 'Portugal', 'Russia', 'Scandinavia', 'South Africa',
+    'Spain', 'Sweden', 'Switzerland', 'Taiwan', 'Turkey', 'UK', 'United Kingdom', 'Unknown'
+)}
+
+LANGUAGE_CODE = re.compile(r'^[A-Z][a-z](?:-[A-Z][A-Za-z]+)?$', re.ASCII)
+REVISION_TAG = re.compile(r'^(?:Rev [0-9A-Z.]+|v\d+(?:\.\d+)*[a-z]?)$', re.ASCII)
+SGB_TAGS = ('SGB Enhanced', 'CGB+SGB Enhanced')
+
+# Status tags and the flag each one sets
+FLAG_TAGS = (
+    (re.compile(r'^(?:Possible )?Proto(?: \d+)?$'), 'Proto'),
+    (re.compile(r'^Beta(?: \d+)?$'), 'Beta'),
+    (re.compile(r'^Demo(?: \d+)?$'), 'Demo'),
+    (re.compile(r'^Sample(?: \d+)?$'), 'Sample'),
+    (re.compile(r'^Unl$'), 'Unl'),
+    (re.compile(r'^Pirate$'), 'Pirate'),
+    (re.compile(r'^Aftermarket$'), 'Aftermarket'),
+    (re.compile(r'^Kiosk$'), 'Kiosk'),
+    (re.compile(r'^Debug$'), 'Debug'),
+    (re.compile(r'^Alt(?: \d+)?$'), 'Alt'),
+    (re.compile(r'^b$'), 'Bad Dump')
+)
+
+# One pass over the name: every (...) and [...] tag
+TAG = re.compile(r'\(([^()]*)\)|\[([^\[\]]*)\]')
+
+# --- Ports of the bot's helpers; keep in step with utils/titles.js and utils/regions.js ---
+
+REGION_TOKENS = frozenset((
+    'usa', 'europe', 'japan', 'australia', 'spain', 'france', 'germany', 'uk', 'italy', 'taiwan', 'korea',
+    'china', 'brazil', 'sweden', 'netherlands', 'belgium', 'denmark', 'finland', 'norway', 'portugal',
+    'russia', 'poland', 'czech', 'hungary', 'greece', 'turkey', 'israel', 'south africa', 'mexico', 'canada',
+    'world'
+))
+SGB_TOKENS = ('sgb enhanced', 'super game boy', 'sgb')
+ALLOWED_PARENS = (
+    re.compile(r'^rev\b', re.IGNORECASE | re.ASCII),
+    re.compile(r'^v\d+(\.\d+)*$', re.IGNORECASE | re.ASCII),
+    re.compile(r'^prototype$', re.IGNORECASE),
+    re.compile(r'^beta$', re.IGNORECASE)
+)
+COUNTRY_LIST = ('usa', 'europe', 'spain', 'france', 'germany', 'australia', 'japan', 'taiwan')
+EUROPEAN_REGIONS = ('europe', 'spain', 'france', 'germany', 'italy', 'uk', 'netherlands', 'belgium', 'sweden')
+FLAG_MAP_KEYS = ('usa', 'europe', 'spain', 'france', 'germany', 'australia', 'japan', 'taiwan', 'world',
+                 'unlicensed', 'pirate')
+
+JS_TAG = re.compile(r'\(([^)]+)\)')
+TRAILING_TAG = re.compile(r'\s*\(([^)]+)\)\s*$')
+TAG_SEPARATOR = re.compile(r'[,/]')
+
+
+def js_trim(text):
+    return text.strip(JS_WHITESPACE)
+
+
+def is_removable_tag(match):
+    """Whether cleanTitle() drops a "(...)" match: region-only and SGB tags"""
+    content = js_trim(match[1:-1].lower())
+    tokens = [js_trim(token) for token in TAG_SEPARATOR.split(content)]
+    return all(token in REGION_TOKENS for token in tokens) or content in SGB_TOKENS
+
+
+def clean_title(title):
+    """Port of cleanTitle() in utils/titles.js"""
+    matches = [match.group(0) for match in JS_TAG.finditer(title)]
+    cleaned = title
+    for match in matches:
+        if is_removable_tag(match):
+            cleaned = js_trim(cleaned.replace(match, '', 1))
+
+    # Strip any remaining trailing tags but revisions, versions, prototypes and betas
+    while True:
+        trailing = TRAILING_TAG.search(cleaned)
+        if not trailing:
+            break
+        inside = js_trim(trailing.group(1))
+        if any(pattern.search(inside) for pattern in ALLOWED_PARENS):
+            break
+        cleaned = js_trim(TRAILING_TAG.sub('', cleaned, count=1))
+    return cleaned
+
+
+def extract_region_tokens(filename):
+    """Port of extractRegionTokens() in utils/titles.js"""
+    return [token for content in JS_TAG.findall(filename)
+            for token in (js_trim(part) for part in TAG_SEPARATOR.split(content.lower()))
+            if token in REGION_TOKENS]
+
+
+def display_region(filename, region):
+    """Port of getDisplayRegion() in utils/titles.js"""
+    if region is not None and region.lower() == 'non-japanese':
+        tokens = extract_region_tokens(filename)
+        if tokens:
+            return ', '.join(tokens).upper()
+    return region
+
+
+def region_flag(filename, region):
+    """Port of pickRegionEmoji() in utils/regions.js, returning the flagMap key"""
+    filename = filename or ''
+    region = (region or '').lower()
+
+    if '(Unl)' in filename or region == 'unlicensed':
+        return 'unlicensed'
+    if '(Pirate)' in filename or region == 'pirate':
+        return 'pirate'
+    if (region == 'world' or '(World)' in filename or '(USA, Europe)' in filename
+            or '(Europe, USA)' in filename):
+        return 'world'
+    if region in FLAG_MAP_KEYS:
+        return region
+
+    tokens = [js_trim(content).lower() for content in JS_TAG.findall(filename)]
+    matches = [token for token in tokens if token in COUNTRY_LIST]
+    if len(matches) > 1 and all(token in EUROPEAN_REGIONS for token in matches):
+        return 'europe'
+    if len(matches) == 1:
+        return matches[0]
+    return 'world'
+
+
+@functools.lru_cache(maxsize=None)
+def classify_tag(tag):
+    """Return (kind, value) for the text inside one tag"""
+    parts = [part.strip() for part in tag.split(',')]
+    if all(part.lower() in NO_INTRO_REGIONS for part in parts):
+        return 'regions', tuple(NO_INTRO_REGIONS[part.lower()] for part in parts)
+    if all(LANGUAGE_CODE.match(part) for part in parts):
+        return 'languages', tuple(parts)
+    if REVISION_TAG.match(tag):
+        return 'revision', tag
+    if any(part in SGB_TAGS for part in parts):
+        return 'sgb', True
+    for pattern, flag in FLAG_TAGS:
+        if pattern.match(tag):
+            return 'flag', flag
+    return 'other', tag
+
+
+def parse_filename(filename, region=None):
+    """Structured fields for a No-Intro filename; region is the record's header region"""
+    filename = filename or ''
+    regions = languages = revision = None
+    flags = []
+    sgb_enhanced = False
+    for match in TAG.finditer(filename):
+        tag = match.group(1) if match.group(1) is not None else match.group(2)
+        kind, value = classify_tag(tag.strip())
+        if kind == 'regions' and regions is None:
+            regions = list(value)
+        elif kind == 'languages' and languages is None:
+            languages = list(value)
+        elif kind == 'revision' and revision is None:
+            revision = value
+        elif kind == 'sgb':
+            sgb_enhanced = True
+        elif kind == 'flag' and value not in flags:
+            flags.append(value)
+
+    base_title = extract_base_title(filename)
+    return {
+        'baseTitle': base_title,
+        'displayTitle': clean_title(base_title),
+        'displayRegion': display_region(filename, region),
+        'regionFlag': region_flag(filename, region),
+        'regions': regions or [],
+        'languages': languages or [],
+        'revision': revision,
+        'flags': flags,
+        'sgbEnhanced': sgb_enhanced
+    }
+
+
+def filename_fields(record):
+    """parse_filename() for a ROM record"""
+    return parse_filename(record.get('filename'), record.get('region'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse No-Intro filenames into the fields rom-list.json carries')
+    parser.add_argument('filenames', nargs='+', help='Archive names, e.g. "Tetris (World) (Rev 1)"')
+    parser.add_argument('--region', type=str, help='Header region to assume (e.g. non-japanese)')
+    args = parser.parse_args()
+
+    print(json.dumps([dict(filename=name, **parse_filename(name, args.region)) for name in args.filenames],
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
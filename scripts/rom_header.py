@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+
+"""Game Boy cartridge header decoder
+
+Every ROM carries a 0x50-byte header at 0x100-0x14F: entry point, Nintendo
+logo, title, manufacturer code, CGB/SGB flags, licensee codes, cartridge
+type, ROM/RAM sizes, destination, version and checksums. RomHeader decodes
+all of it with one struct.unpack_from, and decode_headers() decodes a batch
+of buffers in one pass over a packed block.
+
+Lookups are tables indexed by the raw byte, built once at import, including
+the feature flags of each cartridge type. Unknown codes decode to
+"Unknown (0xNN)" like fetch_gb_roms.py has always written them.
+
+Run it on ROM files to see their headers as JSON:
+
+    python3 scripts/rom_header.py game.gb [game.gbc ...]
+"""
+
+import argparse
+import collections
+import json
+import re
+import struct
+
+# Bytes of a ROM needed to decode its header
+HEADER_SIZE = 0x150
+HEADER_START = 0x100
+
+# Entry point, logo, title, manufacturer code, CGB flag, new licensee code,
+# SGB flag, cartridge type, ROM size, RAM size, destination, old licensee
+# code, version, header checksum and the big-endian global checksum
+HEADER_STRUCT = struct.Struct('>4s48s11s4sB2sBBBBBBBBH')
+
+# Bytes summed by the header checksum, relative to HEADER_START
+CHECKSUM_START = 0x34
+CHECKSUM_END = 0x4D
+
+# The logo the boot ROM compares against 0x104-0x133
+NINTENDO_LOGO = bytes.fromhex(
+    'CEED6666CC0D000B03730083000C000D0008111F8889000E'
+    'DCCC6EE6DDDDD999BBBB67636E0EECCCDDDC999FBBB9333E'
+)
+
+# Old licensee code meaning the new two-character code at 0x144 applies
+USE_NEW_LICENSEE = 0x33
+
+CGB_FLAGS = {
+    0x00: "DMG",                # No CGB functionality
+    0x80: "DMG+CGB",            # Supports both CGB and DMG
+    0xC0: "CGB Only"            # CGB only
+}
+
+SGB_FLAGS = {
+    0x00: "No",                 # No SGB functionality
+    0x03: "Yes"                 # SGB functionality
+}
+
+CARTRIDGE_TYPES = {
+    0x00: "ROM Only",
+    0x01: "MBC1",
+    0x02: "MBC1+RAM",
+    0x03: "MBC1+RAM+Battery",
+    0x05: "MBC2",
+    0x06: "MBC2+Battery",
+    0x08: "ROM+RAM",
+    0x09: "ROM+RAM+Battery",
+    0x0B: "MMM01",
+    0x0C: "MMM01+RAM",
+    0x0D: "MMM01+RAM+Battery",
+    0x0F: "MBC3+Timer+Battery",
+    0x10: "MBC3+Timer+RAM+Battery",
+    0x11: "MBC3",
+    0x12: "MBC3+RAM",
+    0x13: "MBC3+RAM+Battery",
+    0x19: "MBC5",
+    0x1A: "MBC5+RAM",
+    0x1B: "MBC5+RAM+Battery",
+    0x1C: "MBC5+Rumble",
+    0x1D: "MBC5+Rumble+RAM",
+    0x1E: "MBC5+Rumble+RAM+Battery",
+    0x20: "MBC6",
+    0x22: "MBC7+Sensor+Rumble+RAM+Battery",
+    0xFC: "Pocket Camera",
+    0xFD: "BANDAI TAMA5",
+    0xFE: "HuC3",
+    0xFF: "HuC1+RAM+Battery"
+}
+
+ROM_SIZES = {
+    0x00: "32 KiB",
+    0x01: "64 KiB",
+    0x02: "128 KiB",
+    0x03: "256 KiB",
+    0x04: "512 KiB",
+    0x05: "1 MiB",
+    0x06: "2 MiB",
+    0x07: "4 MiB",
+    0x08: "8 MiB",
+    0x52: "1.1 MiB",
+    0x53: "1.2 MiB",
+    0x54: "1.5 MiB"
+}
+
+# Bytes each ROM size code stands for: 32 KiB doubled per step, then 72, 80 and 96 banks of 16 KiB
+ROM_SIZE_BYTES = {code: 32 * 1024 << code for code in range(0x09)}
+ROM_SIZE_BYTES.update({0x52: 72 * 16 * 1024, 0x53: 80 * 16 * 1024, 0x54: 96 * 16 * 1024})
+
+RAM_SIZES = {
+    0x00: "None",
+    0x01: "2 KiB",
+    0x02: "8 KiB",
+    0x03: "32 KiB",
+    0x04: "128 KiB",
+    0x05: "64 KiB"
+}
+
+DESTINATION_CODES = {
+    0x00: "Japanese",
+    0x01: "non-japanese"
+}
+
+# Publishers by the two-character code at 0x144, used when the old
+# licensee code is 0x33
+NEW_LICENSEES = {
+    "00": "None",
+    "01": "Nintendo Research & Development 1",
+    "08": "Capcom",
+    "13": "EA (Electronic Arts)",
+    "18": "Hudson Soft",
+    "19": "B-AI",
+    "20": "KSS",
+    "22": "Planning Office WADA",
+    "24": "PCM Complete",
+    "25": "San-X",
+    "28": "Kemco",
+    "29": "SETA Corporation",
+    "30": "Viacom",
+    "31": "Nintendo",
+    "32": "Bandai",
+    "33": "Ocean Software/Acclaim Entertainment",
+    "34": "Konami",
+    "35": "HectorSoft",
+    "37": "Taito",
+    "38": "Hudson Soft",
+    "39": "Banpresto",
+    "41": "Ubi Soft",
+    "42": "Atlus",
+    "44": "Malibu Interactive",
+    "46": "Angel",
+    "47": "Bullet-Proof Software",
+    "49": "Irem",
+    "50": "Absolute",
+    "51": "Acclaim Entertainment",
+    "52": "Activision",
+    "53": "Sammy USA Corporation",
+    "54": "Konami",
+    "55": "Hi Tech Expressions",
+    "56": "LJN",
+    "57": "Matchbox",
+    "58": "Mattel",
+    "59": "Milton Bradley Company",
+    "60": "Titus Interactive",
+    "61": "Virgin Games Ltd.",
+    "64": "Lucasfilm Games",
+    "67": "Ocean Software",
+    "69": "EA (Electronic Arts)",
+    "70": "Infogrames",
+    "71": "Interplay Entertainment",
+    "72": "Broderbund",
+    "73": "Sculptured Software",
+    "75": "The Sales Curve Limited",
+    "78": "THQ",
+    "79": "Accolade",
+    "80": "Misawa Entertainment",
+    "83": "lozc",
+    "86": "Tokuma Shoten",
+    "87": "Tsukuda Original",
+    "91": "Chunsoft Co.",
+    "92": "Video System",
+    "93": "Ocean Software/Acclaim Entertainment",
+    "95": "Varie",
+    "96": "Yonezawa/s'pal",
+    "97": "Kaneko",
+    "99": "Pack-In-Video",
+    "9H": "Bottom Up",
+    "A4": "Konami (Yu-Gi-Oh!)",
+    "BL": "MTO",
+    "DK": "Kodansha"
+}
+
+
+def byte_table(names):
+    """Expand a code -> name dict into a 256-entry tuple indexed by the byte"""
+    return tuple(names.get(code, f"Unknown (0x{code:02X})") for code in range(256))
+
+
+def cartridge_features(code):
+    """(mapper, has RAM, battery, timer, rumble) for a cartridge type byte"""
+    mapper_type = CARTRIDGE_TYPES.get(code, f"Unknown (0x{code:02X})")
+    return (
+        mapper_type.split('+')[0].strip(),
+        "RAM" in mapper_type or code in (0x05, 0x06),  # MBC2 has internal RAM
+        "Battery" in mapper_type,
+        "Timer" in mapper_type,
+        "Rumble" in mapper_type
+    )
+
+
+CGB_LABELS = byte_table(CGB_FLAGS)
+SGB_LABELS = byte_table(SGB_FLAGS)
+ROM_SIZE_LABELS = byte_table(ROM_SIZES)
+RAM_SIZE_LABELS = byte_table(RAM_SIZES)
+DESTINATION_LABELS = byte_table(DESTINATION_CODES)
+CARTRIDGE_FEATURES = tuple(cartridge_features(code) for code in range(256))
+
+
+MANUFACTURER_CODE = re.compile(rb'[A-Z0-9]{4}')
+
+
+# Raw fields in HEADER_STRUCT order
+HEADER_FIELDS = ('entry_point', 'logo', 'title_bytes', 'manufacturer_bytes', 'cgb_flag', 'new_licensee_bytes',
+                 'sgb_flag', 'cartridge_type', 'rom_size', 'ram_size', 'destination_code', 'old_licensee_code',
+                 'version', 'header_checksum', 'global_checksum')
+
+
+class RomHeader(collections.namedtuple('RomHeaderFields', HEADER_FIELDS)):
+    """The decoded 0x50-byte header of one ROM
+
+    A tuple of the raw unpacked fields (with __slots__ = (), so no per-object
+    dict). Labels, feature flags, text and checks are derived from them
+    through the tables above when asked for, so decoding costs one unpack
+    and one tuple.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        """Decode the header of the ROM starting at data[offset], which needs HEADER_SIZE bytes"""
+        try:
+            return cls._make(HEADER_STRUCT.unpack_from(data, offset + HEADER_START))
+        except struct.error:
+            raise ValueError(f"need {HEADER_SIZE} bytes for a ROM header")
+
+    @property
+    def title(self):
+        """The title fetch_gb_roms.py has always written: 11 bytes, NULs stripped"""
+        return self.title_bytes.decode('ascii', errors='replace').strip('\x00')
+
+    @property
+    def manufacturer_code(self):
+        """Four uppercase characters on later cartridges; None where the bytes are more title"""
+        if MANUFACTURER_CODE.fullmatch(self.manufacturer_bytes):
+            return self.manufacturer_bytes.decode('ascii')
+        return None
+
+    @property
+    def new_licensee_code(self):
+        return self.new_licensee_bytes.decode('ascii', errors='replace')
+
+    @property
+    def computed_header_checksum(self):
+        """The header checksum worked out from the bytes it covers, 0x134-0x14C"""
+        # x = x - byte - 1 over the 25 bytes is -(sum + 25) modulo 256. They
+        # are the title through the version: three byte strings, the CGB
+        # flag, and the seven single-byte fields from the SGB flag on
+        total = sum(self[2]) + sum(self[3]) + self[4] + sum(self[5]) + sum(self[6:13])
+        return -(total + CHECKSUM_END - CHECKSUM_START) & 0xFF
+
+    @property
+    def cgb_support(self):
+        return CGB_LABELS[self.cgb_flag]
+
+    @property
+    def sgb_support(self):
+        return SGB_LABELS[self.sgb_flag]
+
+    @property
+    def region(self):
+        return DESTINATION_LABELS[self.destination_code]
+
+    @property
+    def rom_size_label(self):
+        return ROM_SIZE_LABELS[self.rom_size]
+
+    @property
+    def ram_size_label(self):
+        return RAM_SIZE_LABELS[self.ram_size]
+
+    @property
+    def mapper(self):
+        return CARTRIDGE_FEATURES[self.cartridge_type][0]
+
+    @property
+    def has_ram(self):
+        return CARTRIDGE_FEATURES[self.cartridge_type][1]
+
+    @property
+    def has_battery(self):
+        return CARTRIDGE_FEATURES[self.cartridge_type][2]
+
+    @property
+    def has_timer(self):
+        return CARTRIDGE_FEATURES[self.cartridge_type][3]
+
+    @property
+    def has_rumble(self):
+        return CARTRIDGE_FEATURES[self.cartridge_type][4]
+
+    @property
+    def licensee(self):
+        """Publisher from the new licensee code, or None when the old code is in use or unlisted"""
+        if self.old_licensee_code != USE_NEW_LICENSEE:
+            return None
+        return NEW_LICENSEES.get(self.new_licensee_code)
+
+    @property
+    def logo_valid(self):
+        """Whether the logo matches, which a DMG boot ROM requires before it will run the game"""
+        return self.logo == NINTENDO_LOGO
+
+    @property
+    def header_checksum_valid(self):
+        return self.computed_header_checksum == self.header_checksum
+
+    def to_dict(self):
+        """Every decoded field, named the way rom-list.json names its fields"""
+        return {
+            "title": self.title,
+            "manufacturerCode": self.manufacturer_code,
+            "cgbFlag": self.cgb_support,
+            "sgbFlag": self.sgb_support,
+            "region": self.region,
+            "version": self.version,
+            "romSize": self.rom_size_label,
+            "ramSize": self.ram_size_label,
+            "cartridgeType": self.cartridge_type,
+            "mapper": self.mapper,
+            "hasRam": self.has_ram,
+            "hasBattery": self.has_battery,
+            "hasTimer": self.has_timer,
+            "hasRumble": self.has_rumble,
+            "oldLicenseeCode": self.old_licensee_code,
+            "newLicenseeCode": self.new_licensee_code,
+            "licensee": self.licensee,
+            "entryPoint": self.entry_point.hex(),
+            "logoValid": self.logo_valid,
+            "headerChecksum": self.header_checksum,
+            "headerChecksumValid": self.header_checksum_valid,
+            "globalChecksum": self.global_checksum
+        }
+
+
+def decode_headers(buffers):
+    """Decode a batch of ROM starts (each at least HEADER_SIZE bytes) into RomHeaders
+
+    The 0x50-byte headers are sliced into one block and unpacked with
+    Struct.iter_unpack, saving a bounds check and a call per ROM over
+    RomHeader.from_bytes. A buffer that is too short raises ValueError.
+    """
+    slices = [data[HEADER_START:HEADER_SIZE] for data in buffers]
+    block = b''.join(slices)
+    if len(block) != len(slices) * HEADER_STRUCT.size:
+        short = next(len(piece) for piece in slices if len(piece) != HEADER_STRUCT.size)
+        raise ValueError(f"need {HEADER_SIZE} bytes for a ROM header, got {HEADER_START + short}")
+    return list(map(RomHeader._make, HEADER_STRUCT.iter_unpack(block)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode Game Boy ROM headers')
+    parser.add_argument('roms', nargs='+', help='.gb/.gbc files')
+    args = parser.parse_args()
+
+    decoded = []
+    for path in args.roms:
+        entry = {'file': path}
+        try:
+            with open(path, 'rb') as f:
+                entry.update(RomHeader.from_bytes(f.read(HEADER_SIZE)).to_dict())
+        except (OSError, ValueError) as e:
+            entry['error'] = str(e)
+        decoded.append(entry)
+    print(json.dumps(decoded, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+
+"""ROM search index and query service over rom-list.json
+
+The bot's default search scans every record with Fuse.js. This module keeps
+an inverted index instead: trigram and token posting lists over the three
+text keys the bot searches (normalized title, filename and header title),
+and one bitset per filter value (region, cgbFlag, sgbFlag, mapper and the
+has* feature flags), held as Python ints so combining filters is a single
+AND. A query only scores the records that share enough trigrams with it and
+pass the filters, and returns the top k by score.
+
+When rom-list.bin is up to date, its normalized titles and title posting
+lists are used as they are. Scores follow the Fuse.js convention the bot
+sorts by: 0 is a perfect match and larger is worse. A leading '=' asks for an
+exact (case-insensitive) match, like Fuse.js extended search.
+
+    python3 scripts/rom_search.py query "links awakening" --region europe
+    python3 scripts/rom_search.py serve --port 8765
+    python3 scripts/rom_search.py serve --socket /run/gb-rom-search.sock
+
+The service answers GET /search?q=...&limit=...&region=...&cgb=...&sgb=true
+(and battery, timer, rumble, ram, mapper) and GET /stats, keeps an LRU cache
+of recent results, and reloads the index when rom-list.json changes.
+"""
+
+import argparse
+import collections
+import hashlib
+import heapq
+import http.server
+import json
+import logging
+import math
+import os
+import re
+import signal
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+
+from rom_database import (CompiledDatabase, extract_base_title, normalize_game_title, title_tokens,
+                          title_trigrams)
+
+logger = logging.getLogger('rom_search')
+
+# Text keys and weights, as in FUSE_OPTIONS in loadRomData.js
+FIELD_WEIGHTS = (('normalizedTitle', 0.8), ('filename', 0.5), ('title', 0.2))
+
+# Share of the query's trigrams a key must contain for the record to match
+MIN_COVERAGE = 0.5
+
+DEFAULT_LIMIT = 25
+MAX_LIMIT = 1000
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_PORT = 8765
+WATCH_INTERVAL = 5
+
+# Filter values, as offered by the /dmgdb command options
+CGB_FILTERS = {'gb': 'DMG', 'cgb': 'CGB Only', 'both': 'DMG+CGB'}
+FEATURE_FILTERS = {'battery': 'hasBattery', 'timer': 'hasTimer', 'rumble': 'hasRumble', 'ram': 'hasRam'}
+REGION_FILTERS = ('usa', 'europe', 'japan', 'world', 'unlicensed', 'pirate')
+EUROPEAN_REGIONS = ('europe', 'spain', 'france', 'germany', 'italy', 'uk', 'netherlands', 'belgium', 'sweden')
+
+FILENAME_TAG = re.compile(r'\(([^)]+)\)')
+TAG_SEPARATOR = re.compile(r'[,/]')
+
+# Set bit positions of every byte value, for walking a bitset a byte at a time
+BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+
+def bitset(rows, count):
+    """Bitset (an int) with the given row numbers set"""
+    bits = bytearray((count + 7) // 8)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def iter_bits(mask):
+    """Row numbers set in a bitset, in ascending order"""
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    for i, byte in enumerate(data):
+        if byte:
+            base = i * 8
+            for bit in BYTE_BITS[byte]:
+                yield base + bit
+
+
+def filename_tags(filename):
+    """Lowercased tokens of a filename's parenthesized tags ("(USA, Europe)" -> usa, europe)"""
+    return [token for tag in FILENAME_TAG.findall(filename.lower())
+            for token in (part.strip() for part in TAG_SEPARATOR.split(tag.strip())) if token]
+
+
+def region_matches(record, region, tokens=None):
+    """Port of the region filter in handlers/search.js; tokens are the filename's tags if known"""
+    rom_region = (record.get('region') or '').lower()
+    filename = (record.get('filename') or '').lower()
+    if tokens is None:
+        tokens = filename_tags(filename)
+
+    if region == 'unlicensed':
+        return rom_region == 'unlicensed' or '(unl)' in filename
+    if region == 'pirate':
+        return rom_region == 'pirate' or '(pirate)' in filename
+    if region == 'world':
+        return len(tokens) > 1 or 'world' in tokens
+    if region in tokens:
+        return True
+    if region == 'europe':
+        return any(token in EUROPEAN_REGIONS for token in tokens)
+    return rom_region == region
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    lowered = str(value).lower()
+    if lowered in ('true', '1', 'yes'):
+        return True
+    if lowered in ('false', '0', 'no'):
+        return False
+    raise ValueError(f"Expected true or false, got {value!r}")
+
+
+class SearchField:
+    """Trigram and token posting lists for one text key"""
+
+    def __init__(self, name, weight, trigrams, tokens, trigram_counts):
+        self.name = name
+        self.weight = weight
+        self.trigrams = trigrams
+        self.tokens = tokens
+        self.trigram_counts = trigram_counts
+
+    @classmethod
+    def build(cls, name, weight, texts):
+        trigrams = {}
+        tokens = {}
+        trigram_counts = []
+        for row, text in enumerate(texts):
+            keys = title_trigrams(text)
+            trigram_counts.append(len(keys))
+            for key in keys:
+                trigrams.setdefault(key, []).append(row)
+            for key in title_tokens(text):
+                tokens.setdefault(key, []).append(row)
+        return cls(name, weight, trigrams, tokens, trigram_counts)
+
+    @classmethod
+    def from_postings(cls, name, weight, trigrams, tokens, count):
+        """Use posting lists that were already built, e.g. by rom_database.py"""
+        trigram_counts = [0] * count
+        for rows in trigrams.values():
+            for row in rows:
+                trigram_counts[row] += 1
+        return cls(name, weight, trigrams, tokens, trigram_counts)
+
+    def count_hits(self, keys, postings):
+        hits = collections.Counter()
+        for key in keys:
+            rows = postings.get(key)
+            if rows:
+                hits.update(rows)
+        return hits
+
+
+class SearchIndex:
+    """Inverted index and filter bitsets over a list of ROM records"""
+
+    def __init__(self, records, sha256=None, normalized_titles=None, title_postings=None):
+        self.records = records
+        self.sha256 = sha256
+        self.count = len(records)
+        self.all_rows = (1 << self.count) - 1
+
+        if normalized_titles is None:
+            normalized_titles = [normalize_game_title(extract_base_title(r.get('filename'))) for r in records]
+        self.normalized_titles = normalized_titles
+
+        texts = {
+            'normalizedTitle': normalized_titles,
+            'filename': [normalize_game_title(r.get('filename') or '') for r in records],
+            'title': [normalize_game_title(r.get('title') or '') for r in records]
+        }
+        self.fields = []
+        for name, weight in FIELD_WEIGHTS:
+            if name == 'normalizedTitle' and title_postings is not None:
+                trigrams, tokens = title_postings
+                self.fields.append(SearchField.from_postings(name, weight, trigrams, tokens, self.count))
+            else:
+                self.fields.append(SearchField.build(name, weight, texts[name]))
+        self.total_weight = sum(field.weight for field in self.fields)
+
+        # "=text" looks up the lowercased value of any key
+        self.exact = {}
+        for row, record in enumerate(records):
+            for value in {normalized_titles[row], (record.get('filename') or '').lower(),
+                          (record.get('title') or '').lower()}:
+                if value:
+                    self.exact.setdefault(value, []).append(row)
+
+        self.masks = {}
+        self.masks['cgb'] = self._value_masks(lambda r: r.get('cgbFlag'))
+        self.masks['mapper'] = self._value_masks(lambda r: r.get('mapper'))
+        self.masks['sgb'] = {True: bitset((i for i, r in enumerate(records) if r.get('sgbFlag') == 'Yes'),
+                                          self.count)}
+        for name, key in FEATURE_FILTERS.items():
+            self.masks[name] = {True: bitset((i for i, r in enumerate(records) if r.get(key)), self.count)}
+        self.masks['region'] = {}
+        self.tags = [filename_tags(r.get('filename') or '') for r in records]
+        self.mask_lock = threading.Lock()
+        for region in REGION_FILTERS:
+            self.region_mask(region)
+
+    def _value_masks(self, value_of):
+        rows = {}
+        for row, record in enumerate(self.records):
+            rows.setdefault(value_of(record), []).append(row)
+        return {value: bitset(value_rows, self.count) for value, value_rows in rows.items()}
+
+    def region_mask(self, region):
+        """Bitset of records passing the bot's region filter, built on first use for other regions"""
+        mask = self.masks['region'].get(region)
+        if mask is None:
+            mask = bitset((i for i, r in enumerate(self.records) if region_matches(r, region, self.tags[i])),
+                          self.count)
+            with self.mask_lock:
+                self.masks['region'][region] = mask
+        return mask
+
+    def filter_mask(self, filters):
+        """AND together the bitsets for a dict of filters; 'any' and None are ignored"""
+        mask = self.all_rows
+        for name, value in (filters or {}).items():
+            if value is None or value == 'any':
+                continue
+            if name == 'region':
+                mask &= self.region_mask(str(value).lower())
+            elif name == 'cgb':
+                if value not in CGB_FILTERS:
+                    raise ValueError(f"Unknown cgb filter {value!r}")
+                mask &= self.masks['cgb'].get(CGB_FILTERS[value], 0)
+            elif name == 'mapper':
+                if value == 'Unknown':
+                    for mapper, mapper_mask in self.masks['mapper'].items():
+                        if not (mapper or '').startswith('Unknown'):
+                            mask &= ~mapper_mask
+                else:
+                    mask &= self.masks['mapper'].get(value, 0)
+            elif name == 'sgb' or name in FEATURE_FILTERS:
+                flag_mask = self.masks[name][True]
+                mask &= flag_mask if parse_bool(value) else ~flag_mask
+            else:
+                raise ValueError(f"Unknown filter {name!r}")
+        return mask & self.all_rows
+
+    def search(self, query, filters=None, limit=DEFAULT_LIMIT):
+        """Return (match count, [(score, row), ...] best first, at most limit long)"""
+        mask = self.filter_mask(filters)
+        text = (query or '').strip()
+
+        if text.startswith('='):
+            rows = self.exact.get(text[1:].strip().lower(), ())
+            matches = [(0.0, row) for row in rows if mask >> row & 1]
+            return len(matches), matches[:limit]
+
+        normalized = normalize_game_title(text)
+        query_trigrams = title_trigrams(normalized)
+        if not query_trigrams:
+            return 0, []
+        query_tokens = title_tokens(normalized)
+        needed = max(1, math.ceil(len(query_trigrams) * MIN_COVERAGE))
+
+        field_hits = []
+        candidates = set()
+        for field in self.fields:
+            hits = field.count_hits(query_trigrams, field.trigrams)
+            candidates.update(row for row, n in hits.items() if n >= needed)
+            field_hits.append(hits)
+        if mask != self.all_rows:
+            candidates = iter_bits(bitset(candidates, self.count) & mask)
+
+        candidates = list(candidates)
+        if not candidates:
+            return 0, []
+
+        scores = dict.fromkeys(candidates, 0.0)
+        query_count = len(query_trigrams)
+        token_count = len(query_tokens)
+        for field, hits in zip(self.fields, field_hits):
+            token_hits = field.count_hits(query_tokens, field.tokens)
+            trigram_counts = field.trigram_counts
+            for row in candidates:
+                matched = hits.get(row)
+                if not matched:
+                    continue
+                coverage = matched / query_count
+                dice = 2 * matched / (query_count + trigram_counts[row])
+                relevance = 0.75 * coverage * (0.8 + 0.2 * dice) + 0.25 * token_hits.get(row, 0) / token_count
+                scores[row] += field.weight * relevance
+
+        total = self.total_weight
+        ranked = [(round(1 - relevance / total, 6), row) for row, relevance in scores.items()]
+        return len(ranked), heapq.nsmallest(limit, ranked)
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_index(json_path, compiled_path=None):
+    """Build a SearchIndex for rom-list.json, reusing rom-list.bin when it was built from it"""
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    sha256 = hashlib.sha256(raw).hexdigest()
+    records = json.loads(raw)
+
+    if compiled_path is None:
+        compiled_path = os.path.splitext(json_path)[0] + '.bin'
+    normalized_titles = title_postings = None
+    if os.path.exists(compiled_path):
+        try:
+            database = CompiledDatabase(compiled_path)
+            if database.header['source'].get('sha256') == sha256:
+                normalized_titles = database.column('normalizedTitle')
+                title_postings = (database.index('trigrams'), database.index('tokens'))
+            else:
+                logger.info(f"{compiled_path} is out of date, indexing {json_path} directly")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read {compiled_path}, indexing {json_path} directly: {e}")
+
+    return SearchIndex(records, sha256, normalized_titles, title_postings)
+
+
+class QueryCache:
+    """Thread-safe LRU cache of search results"""
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'capacity': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+class SearchService:
+    """A SearchIndex for rom-list.json that is swapped out when the file changes"""
+
+    def __init__(self, json_path, compiled_path=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.json_path = json_path
+        self.compiled_path = compiled_path
+        self.cache = QueryCache(cache_size)
+        self.reload_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.index = None
+        self.file_state = None
+        self.loaded_at = None
+        self.reload()
+
+    def _stat(self):
+        st = os.stat(self.json_path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def reload(self, force=True):
+        """Rebuild the index; searches keep using the old one until the swap"""
+        with self.reload_lock:
+            state = self._stat()
+            if not force and state == self.file_state:
+                return False
+            if not force and file_sha256(self.json_path) == self.index.sha256:
+                self.file_state = state
+                return False
+            start = time.perf_counter()
+            index = load_index(self.json_path, self.compiled_path)
+            self.index, self.file_state, self.loaded_at = index, state, time.time()
+            self.cache.clear()
+            logger.info(f"Indexed {index.count} ROMs from {self.json_path} in "
+                        f"{(time.perf_counter() - start) * 1000:.0f} ms")
+            return True
+
+    def watch(self, interval=WATCH_INTERVAL):
+        """Poll rom-list.json in a background thread and reload when it changes"""
+        def run():
+            while not self.stopping.wait(interval):
+                try:
+                    self.reload(force=False)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Reloading {self.json_path} failed, keeping the previous index: {e}")
+
+        thread = threading.Thread(target=run, name='rom-search-watch', daemon=True)
+        thread.start()
+        return thread
+
+    def search(self, query, filters=None, limit=DEFAULT_LIMIT):
+        index = self.index
+        key = (index.sha256, query, tuple(sorted((filters or {}).items())), limit)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+        count, matches = index.search(query, filters, limit)
+        response = {
+            'sha256': index.sha256,
+            'count': count,
+            'results': [
+                {
+                    'row': row,
+                    'score': score,
+                    'filename': index.records[row].get('filename'),
+                    'rom_filename': index.records[row].get('rom_filename')
+                }
+                for score, row in matches
+            ]
+        }
+        self.cache.put(key, response)
+        return dict(response, cached=False)
+
+    def stats(self):
+        index = self.index
+        return {
+            'count': index.count,
+            'sha256': index.sha256,
+            'loadedAt': self.loaded_at,
+            'cache': self.cache.stats()
+        }
+
+
+class SearchRequestHandler(http.server.BaseHTTPRequestHandler):
+    """GET /search and /stats as JSON"""
+
+    server_version = 'gb-rom-search'
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # Headers and body go out in separate writes; without TCP_NODELAY each
+        # response waits on the client's delayed ACK (Unix sockets have no Nagle)
+        self.disable_nagle_algorithm = isinstance(self.client_address, tuple)
+        super().setup()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        service = self.server.service
+
+        if url.path == '/stats':
+            return self.send_json(200, service.stats())
+        if url.path != '/search':
+            return self.send_json(404, {'error': f"Unknown path {url.path}"})
+
+        try:
+            query = params.pop('q', '')
+            limit = min(int(params.pop('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+            if limit < 1:
+                raise ValueError('limit must be at least 1')
+            start = time.perf_counter()
+            response = service.search(query, params, limit)
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+        response['tookMs'] = round((time.perf_counter() - start) * 1000, 3)
+        self.send_json(200, response)
+
+    def send_json(self, status, body):
+        data = json.dumps(body, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class SearchHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        self.service = service
+        super().__init__(address, SearchRequestHandler)
+
+
+class UnixSearchServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service):
+        self.service = service
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, SearchRequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def add_filter_arguments(parser):
+    parser.add_argument('--region', type=str, help='Region filter, as in /dmgdb (usa, europe, japan, world, ...)')
+    parser.add_argument('--cgb', choices=sorted(CGB_FILTERS), help='CGB support filter')
+    parser.add_argument('--mapper', type=str, help="Mapper filter (e.g. MBC5, or Unknown)")
+    for name in ('sgb',) + tuple(FEATURE_FILTERS):
+        parser.add_argument(f'--{name}', type=parse_bool, metavar='true|false', help=f"Filter on {name}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Search rom-list.json through a trigram index')
+    parser.add_argument('--database', '-d', type=str, default='rom-list.json',
+                        help='ROM list JSON file (default: rom-list.json)')
+    parser.add_argument('--compiled', type=str,
+                        help='Compiled database to take title postings from (default: --database with .bin)')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Log every request')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    query = commands.add_parser('query', help='Run one search and print the results')
+    query.add_argument('query', type=str, help='Search text; prefix with = for an exact match')
+    query.add_argument('--limit', '-n', type=int, default=10, help='Number of results (default: 10)')
+    add_filter_arguments(query)
+
+    serve = commands.add_parser('serve', help='Answer searches over HTTP on a TCP port or Unix socket')
+    serve.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    serve.add_argument('--port', '-p', type=int, default=DEFAULT_PORT,
+                       help=f"TCP port to listen on (default: {DEFAULT_PORT})")
+    serve.add_argument('--socket', type=str, help='Listen on this Unix socket instead of a TCP port')
+    serve.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                       help=f"Cached result sets, 0 to disable (default: {DEFAULT_CACHE_SIZE})")
+    serve.add_argument('--watch-interval', type=float, default=WATCH_INTERVAL,
+                       help=f"Seconds between checks for a new rom-list.json, 0 to disable (default: {WATCH_INTERVAL})")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'query':
+        index = load_index(args.database, args.compiled)
+        filters = {name: getattr(args, name) for name in ('region', 'cgb', 'mapper', 'sgb') + tuple(FEATURE_FILTERS)}
+        start = time.perf_counter()
+        count, matches = index.search(args.query, filters, args.limit)
+        took = (time.perf_counter() - start) * 1000
+        for score, row in matches:
+            record = index.records[row]
+            print(f"{score:.3f}  {record.get('filename')}  [{record.get('region')}, {record.get('cgbFlag')}]")
+        print(f"{count} matches in {took:.2f} ms")
+        return 0
+
+    service = SearchService(args.database, args.compiled, args.cache_size)
+    if args.socket:
+        server = UnixSearchServer(args.socket, service)
+        where = args.socket
+    else:
+        server = SearchHTTPServer((args.host, args.port), service)
+        where = f"http://{args.host}:{server.server_address[1]}"
+    if args.watch_interval > 0:
+        service.watch(args.watch_interval)
+
+    # Stop cleanly on SIGTERM too, so the Unix socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info(f"Serving ROM search on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stopping.set()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
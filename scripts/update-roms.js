@@ -12,7 +12,10 @@ async function updateRoms() {
   console.log('Starting ROM update process...\n');
 
   // Spawn the Python process
-  const pythonProcess = spawn('python3', [scriptPath], {
+  // --compile also writes rom-list.bin so the reload can skip JSON parsing, and
+  // --thumbnails resolves box art URLs so the bot doesn't probe for them
+  const thumbnails = process.env.ROM_THUMBNAILS || 'github';
+  const pythonProcess = spawn('python3', [scriptPath, '--compile', '--thumbnails', thumbnails], {
     stdio: 'inherit', // This will pipe stdout/stderr to the parent process
     cwd: path.join(__dirname, '..'), // Run from project root to ensure correct paths
   });
@@ -27,6 +30,8 @@ async function updateRoms() {
         const result = loadRomData();
         if (result.success) {
           console.log('ROM data reloaded successfully!');
+          // A running bot applies rom-list.delta.json itself, without a restart
+          console.log('A running bot will pick up the changes within a few seconds.');
           resolve(true);
         } else {
           console.error('Failed to reload ROM data');
@@ -0,0 +1,136 @@
+"""AsyncConnectionPool (--engine async) against the local mock mirror from bench_crawl.py
+
+    python3 -m unittest discover -s tests
+"""
+
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+from urllib.error import HTTPError
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import bench_crawl  # noqa: E402
+import fetch_gb_roms  # noqa: E402
+
+
+class RedirectingHandler(bench_crawl.MockArchiveHandler):
+    """Answers /moved/<path> with a 302 to /<path> that carries a body of its own"""
+
+    def do_GET(self):
+        if not self.path.startswith('/moved/'):
+            return super().do_GET()
+        body = b'<html>Moved to the real archive</html>'
+        self.send_response(302)
+        self.send_header('Location', self.path[len('/moved'):])
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RedirectingServer(bench_crawl.MockArchiveServer):
+    handler_class = RedirectingHandler
+
+
+class QuietServer(bench_crawl.MockArchiveServer):
+    """Doesn't print the broken pipe of a handler whose client already gave up"""
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class AsyncConnectionPoolTest(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory(prefix='gb-pool-test-')
+        cls.root = cls.temp_dir.name
+        bench_crawl.generate_corpus(cls.root, 2, seed=1)
+        collection = bench_crawl.COLLECTIONS[0]
+        name = sorted(n for n in os.listdir(os.path.join(cls.root, collection)) if n.endswith('.zip'))[0]
+        cls.archive_path = quote(f"{collection}/{name}")
+        with open(os.path.join(cls.root, collection, name), 'rb') as f:
+            cls.archive = f.read()
+        # 64 KiB that takes about a second to arrive at 64 KiB/s
+        cls.slow_data = os.urandom(64 * 1024)
+        with open(os.path.join(cls.root, 'slow.bin'), 'wb') as f:
+            f.write(cls.slow_data)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def url(self, server, path):
+        host, port = server.server_address
+        return f"http://{host}:{port}/{path}"
+
+    async def test_downloads_into_sink_over_one_connection(self):
+        pool = fetch_gb_roms.AsyncConnectionPool(max_per_host=1, timeout=5)
+        with bench_crawl.MockArchiveServer(self.root) as server:
+            try:
+                for _ in range(2):
+                    sink = io.BytesIO()
+                    status, _, _, body = await pool.request(self.url(server, self.archive_path), sink=sink)
+                    self.assertEqual(status, 200)
+                    self.assertEqual(body, b'')
+                    self.assertEqual(sink.getvalue(), self.archive)
+                self.assertEqual(sum(len(idle) for idle in pool.idle.values()), 1)
+            finally:
+                await pool.close()
+
+    async def test_redirect_body_is_not_written_to_sink(self):
+        pool = fetch_gb_roms.AsyncConnectionPool(timeout=5)
+        with RedirectingServer(self.root) as server:
+            try:
+                sink = io.BytesIO()
+                status, _, _, _ = await pool.request(self.url(server, 'moved/' + self.archive_path), sink=sink)
+            finally:
+                await pool.close()
+        self.assertEqual(status, 200)
+        self.assertEqual(sink.getvalue(), self.archive)
+        with zipfile.ZipFile(sink) as archive:
+            self.assertIsNone(archive.testzip())
+
+    async def test_error_body_is_not_written_to_sink(self):
+        pool = fetch_gb_roms.AsyncConnectionPool(timeout=5)
+        with bench_crawl.MockArchiveServer(self.root) as server:
+            try:
+                sink = io.BytesIO()
+                with self.assertRaises(HTTPError) as raised:
+                    await pool.request(self.url(server, 'missing.zip'), sink=sink)
+            finally:
+                await pool.close()
+        self.assertEqual(raised.exception.code, 404)
+        self.assertEqual(sink.getvalue(), b'')
+
+    async def test_slow_transfer_may_outlast_the_timeout(self):
+        pool = fetch_gb_roms.AsyncConnectionPool(timeout=0.6)
+        with bench_crawl.MockArchiveServer(self.root, bandwidth=64 * 1024) as server:
+            try:
+                sink = io.BytesIO()
+                started = asyncio.get_running_loop().time()
+                await pool.request(self.url(server, 'slow.bin'), sink=sink)
+                elapsed = asyncio.get_running_loop().time() - started
+            finally:
+                await pool.close()
+        self.assertGreater(elapsed, 0.6)
+        self.assertEqual(sink.getvalue(), self.slow_data)
+
+    async def test_stalled_response_times_out(self):
+        pool = fetch_gb_roms.AsyncConnectionPool(timeout=0.1)
+        with QuietServer(self.root, latency=0.5) as server:
+            try:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await pool.request(self.url(server, self.archive_path), sink=io.BytesIO())
+            finally:
+                await pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
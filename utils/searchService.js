@@ -0,0 +1,64 @@
+// utils/searchService.js
+const http = require('http');
+
+// Give up on the service quickly; the caller falls back to Fuse.js
+const REQUEST_TIMEOUT = 500;
+
+/**
+ * Parse the ROM_SEARCH_SERVICE setting
+ * @param {string} service - "http://host:port" or "unix:/path/to/socket"
+ * @returns {Object|null} http.request options for the service, or null if not set
+ */
+function parseServiceAddress(service) {
+  if (!service) return null;
+  if (service.startsWith('unix:')) {
+    return { socketPath: service.slice('unix:'.length) };
+  }
+  const url = new URL(service);
+  return { hostname: url.hostname, port: url.port || 80 };
+}
+
+/**
+ * Run a search on scripts/rom_search.py serve
+ * @param {Object} address - Result of parseServiceAddress()
+ * @param {string} query - Search text
+ * @param {Object} filters - Filter values by name (region, cgb, sgb, battery, timer, rumble, mapper)
+ * @param {number} limit - Maximum number of results
+ * @returns {Promise<Object>} The service's response: { sha256, count, results: [{ row, score }] }
+ */
+function querySearchService(address, query, filters, limit) {
+  const params = new URLSearchParams({ q: query, limit: String(limit) });
+  Object.entries(filters).forEach(([name, value]) => {
+    if (value !== null && value !== undefined && value !== 'any') params.set(name, String(value));
+  });
+
+  return new Promise((resolve, reject) => {
+    const request = http.get(
+      { ...address, path: `/search?${params}`, timeout: REQUEST_TIMEOUT },
+      response => {
+        const chunks = [];
+        response.on('data', chunk => chunks.push(chunk));
+        response.on('end', () => {
+          try {
+            const body = JSON.parse(Buffer.concat(chunks).toString('utf8'));
+            if (response.statusCode !== 200) {
+              reject(new Error(body.error || `Search service returned ${response.statusCode}`));
+            } else {
+              resolve(body);
+            }
+          } catch (error) {
+            reject(error);
+          }
+        });
+        response.on('error', reject);
+      }
+    );
+    request.on('timeout', () => request.destroy(new Error('Search service timed out')));
+    request.on('error', reject);
+  });
+}
+
+module.exports = {
+  parseServiceAddress,
+  querySearchService,
+};
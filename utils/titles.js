@@ -0,0 +1,135 @@
+// utils/titles.js
+// Filename parsing for embeds. fetch_gb_roms.py stores the results in each
+// record (scripts/rom_filename.py), so these only run for older databases
+// and for scripts/check-filename-fields.js; keep the two in step.
+
+// Region tokens for parsing
+const REGION_TOKENS = [
+  'usa',
+  'europe',
+  'japan',
+  'australia',
+  'spain',
+  'france',
+  'germany',
+  'uk',
+  'italy',
+  'taiwan',
+  'korea',
+  'china',
+  'brazil',
+  'sweden',
+  'netherlands',
+  'belgium',
+  'denmark',
+  'finland',
+  'norway',
+  'portugal',
+  'russia',
+  'poland',
+  'czech',
+  'hungary',
+  'greece',
+  'turkey',
+  'israel',
+  'south africa',
+  'mexico',
+  'canada',
+  'world',
+];
+
+// SGB tokens for parsing
+const SGB_TOKENS = ['sgb enhanced', 'super game boy', 'sgb'];
+
+// Allowed parenthetical content patterns
+const ALLOWED_PARENS = [
+  /^rev\b/i, // e.g. "Rev 2" or "Revision 2"
+  /^v\d+(\.\d+)*$/i, // e.g. "v1.1", "v2"
+  /^prototype$/i,
+  /^beta$/i, // if desired
+];
+
+/**
+ * Extract region tokens from a filename
+ * @param {string} filename - The filename to parse
+ * @returns {string[]} Array of region tokens found
+ */
+function extractRegionTokens(filename) {
+  const matches = filename.match(/\(([^)]+)\)/g) || [];
+  return matches
+    .map(match => match.slice(1, -1).toLowerCase())
+    .flatMap(region => region.split(/[,/]/).map(r => r.trim()))
+    .filter(token => REGION_TOKENS.includes(token));
+}
+
+/**
+ * Clean title by removing region, SGB, and other non-essential tags
+ * @param {string} title - The title to clean
+ * @returns {string} Cleaned title
+ */
+function cleanTitle(title) {
+  // Find all parenthetical expressions
+  const matches = title.match(/\(([^)]+)\)/g) || [];
+
+  // Filter out region-only and SGB-only parentheses
+  const nonRemovableMatches = matches.filter(match => {
+    const content = match.slice(1, -1).toLowerCase().trim();
+    const tokens = content.split(/[,/]/).map(t => t.trim());
+
+    // Keep if it's not a region-only tag
+    const isRegionOnly = tokens.every(token => REGION_TOKENS.includes(token));
+    if (!isRegionOnly) {
+      // Keep if it's not an SGB tag
+      const isSGBTag = SGB_TOKENS.includes(content);
+      if (!isSGBTag) {
+        return true;
+      }
+    }
+    return false;
+  });
+
+  // Replace removable parentheses with empty string
+  let cleaned = title;
+  matches.forEach(match => {
+    if (!nonRemovableMatches.includes(match)) {
+      cleaned = cleaned.replace(match, '').trim();
+    }
+  });
+
+  // Strip any remaining trailing non-essential parentheses
+  let t = cleaned;
+  while (/\s*\(([^)]+)\)\s*$/.test(t)) {
+    const inside = t.match(/\s*\(([^)]+)\)\s*$/)[1].trim();
+    if (ALLOWED_PARENS.some(rx => rx.test(inside))) break;
+    t = t.replace(/\s*\(([^)]+)\)\s*$/, '').trim();
+  }
+  cleaned = t;
+
+  return cleaned;
+}
+
+/**
+ * Region shown in a ROM's embed: the filename's region tags for non-Japanese
+ * ROMs, otherwise the header region
+ * @param {Object} rom - The ROM object
+ * @returns {string} Region to display
+ */
+function getDisplayRegion(rom) {
+  let displayRegion = rom.region;
+  if (rom.region.toLowerCase() === 'non-japanese') {
+    const tokens = extractRegionTokens(rom.filename);
+    if (tokens.length > 0) {
+      displayRegion = tokens.join(', ').toUpperCase();
+    }
+  }
+  return displayRegion;
+}
+
+module.exports = {
+  REGION_TOKENS,
+  SGB_TOKENS,
+  ALLOWED_PARENS,
+  extractRegionTokens,
+  cleanTitle,
+  getDisplayRegion,
+};
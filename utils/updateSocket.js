@@ -0,0 +1,49 @@
+// utils/updateSocket.js
+const fs = require('fs');
+const net = require('net');
+
+/**
+ * Listen for database update notifications from fetch_gb_roms.py --notify unix:PATH
+ *
+ * Each connection sends one JSON line ({ event, path, sha256, count }) and is
+ * answered with one once onUpdate has run: { ok, count, sha256 } or { ok, error }.
+ * @param {string} socketPath - Path of the Unix socket to create
+ * @param {Function} onUpdate - Called with the message; returns the ROM data now in use
+ * @returns {net.Server} The listening server
+ */
+function startUpdateSocket(socketPath, onUpdate) {
+  // A socket left behind by an earlier run would make listen() fail
+  if (fs.existsSync(socketPath) && fs.statSync(socketPath).isSocket()) {
+    fs.unlinkSync(socketPath);
+  }
+
+  const server = net.createServer(connection => {
+    let buffer = '';
+    connection.setEncoding('utf8');
+    connection.on('data', chunk => {
+      buffer += chunk;
+      const newline = buffer.indexOf('\n');
+      if (newline === -1) return;
+
+      let reply;
+      try {
+        const result = onUpdate(JSON.parse(buffer.slice(0, newline)));
+        reply = result.success
+          ? { ok: true, count: result.roms.length, sha256: result.sha256 }
+          : { ok: false, error: 'Failed to reload ROM data' };
+      } catch (error) {
+        reply = { ok: false, error: error.message };
+      }
+      connection.end(`${JSON.stringify(reply)}\n`);
+    });
+    connection.on('error', error => console.error('ROM update socket connection error:', error));
+  });
+
+  server.on('error', error => console.error(`ROM update socket ${socketPath} error:`, error));
+  server.listen(socketPath, () => console.log(`Listening for ROM database updates on ${socketPath}`));
+  return server;
+}
+
+module.exports = {
+  startUpdateSocket,
+};